@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Array based construction of the directional rule/entity adjacency graph.
+"""
+
+from typing import List
+
+import numpy as np
+
+from PyARMViz.RuleSet import as_rule_set
+
+#Node type names, indexed by the values of AdjacencyCSR.node_types
+NODE_TYPES = ("Association_Rule", "Entity")
+RULE_NODE = 0
+ENTITY_NODE = 1
+
+
+class AdjacencyCSR(object):
+    """
+    The adjacency graph of a rule collection in compressed sparse row form.
+
+    Nodes 0 to rule_count - 1 are the rules (in order), the following nodes
+    are the entities used by the rules (in vocabulary code order). Every
+    antecedent entity has an edge to its rule, and every rule has an edge to
+    its consequent entities. The out edges of node n are indices[indptr[n]:indptr[n + 1]],
+    with weights (the Normalized_Lift of the rule) in the same positions.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, node_labels: List,
+                 node_types: np.ndarray, node_weights: np.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.node_labels = node_labels
+        self.node_types = node_types
+        self.node_weights = node_weights
+
+    @property
+    def node_count(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.indices)
+
+    @property
+    def sources(self) -> np.ndarray:
+        '''
+            The source node of every edge, aligned with indices
+        '''
+        return np.repeat(np.arange(self.node_count), np.diff(self.indptr))
+
+    @property
+    def targets(self) -> np.ndarray:
+        return self.indices
+
+    def to_networkx(self):
+        '''
+            Builds the equivalent NetworkX DiGraph in bulk, with the node Weight/type and edge
+            Normalized_Lift attributes of the adjacency graph
+        '''
+        import networkx as nx
+
+        labels = self.node_labels
+        graph = nx.DiGraph()
+        graph.add_nodes_from(
+            (label, {'Weight': weight, 'type': NODE_TYPES[node_type]})
+            for label, weight, node_type in zip(labels, self.node_weights.tolist(), self.node_types.tolist())
+        )
+        graph.add_edges_from(
+            (labels[source], labels[target], {'Normalized_Lift': weight})
+            for source, target, weight in zip(self.sources.tolist(), self.indices.tolist(), self.weights.tolist())
+        )
+        return graph
+
+    def __repr__(self):
+        return "AdjacencyCSR({} nodes, {} edges)".format(self.node_count, self.edge_count)
+
+
+def _scaled_weights(values: np.ndarray) -> np.ndarray:
+    '''
+        int(value * 10) of every value, undefined (NaN or infinite) values weigh 0
+    '''
+    weights = np.zeros(len(values), dtype=np.int64)
+    finite = np.isfinite(values)
+    weights[finite] = (values[finite] * 10).astype(np.int64)
+    return weights
+
+
+def adjacency_graph_csr(rules) -> AdjacencyCSR:
+    '''
+        Builds the adjacency graph of a list of Rules or a RuleSet as an AdjacencyCSR, without
+        creating a NetworkX graph
+
+        Only the items used by the rules become entity nodes, so a RuleSet sharing a larger
+        vocabulary (a slice, filtered subset or chunk) gives the same graph as its rules in a list
+
+        Rule nodes are weighted by int(confidence * 10), entity nodes by 1, and edges by the
+        Normalized_Lift int(lift * 10) of their rule, undefined metrics weigh 0
+    '''
+    rule_set = as_rule_set(rules)
+    rule_count = len(rule_set)
+    #Entity node of every used item code, in vocabulary code order
+    item_codes = np.unique(np.r_[rule_set.lhs_indices, rule_set.rhs_indices]).astype(np.int64)
+    item_count = len(item_codes)
+    node_count = rule_count + item_count
+
+    rule_ids = np.arange(rule_count, dtype=np.int64)
+    normalized_lift = _scaled_weights(rule_set.lift)
+    lhs_rules = np.repeat(rule_ids, rule_set.lhs_lengths)
+    rhs_rules = np.repeat(rule_ids, rule_set.rhs_lengths)
+    lhs_nodes = np.searchsorted(item_codes, rule_set.lhs_indices) + rule_count
+    rhs_nodes = np.searchsorted(item_codes, rule_set.rhs_indices) + rule_count
+
+    #Antecedent entity -> rule, then rule -> consequent entity
+    sources = np.concatenate([lhs_nodes, rhs_rules])
+    targets = np.concatenate([lhs_rules, rhs_nodes])
+    weights = np.concatenate([normalized_lift[lhs_rules], normalized_lift[rhs_rules]])
+
+    #Repeated items in an itemset collapse into one edge, edges are sorted by source then target
+    keys, first = np.unique(sources * node_count + targets, return_index=True)
+    sources, targets, weights = keys // node_count, keys % node_count, weights[first]
+    indptr = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=node_count), out=indptr[1:])
+
+    node_labels = list(range(rule_count)) + rule_set.vocabulary.decode(item_codes.tolist())
+    node_types = np.concatenate([np.full(rule_count, RULE_NODE, dtype=np.int8), np.full(item_count, ENTITY_NODE, dtype=np.int8)])
+    node_weights = np.concatenate([_scaled_weights(rule_set.confidence), np.ones(item_count, dtype=np.int64)])
+    return AdjacencyCSR(indptr, targets, weights, node_labels, node_types, node_weights)
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Heuristic search for entity orderings that minimize the line crossings of
+parallel coordinate plots.
+"""
+
+import logging
+import math
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from PyARMViz.Profiling import stage
+
+
+def encode_axis_pairs(rules: List, unique_entities: List, axis_count: int) -> List:
+    '''
+        Encodes the entities each rule connects between consecutive axis pairs as indices into
+        unique_entities
+
+        Returns a list with a (source codes, destination codes) pair of arrays per axis pair
+    '''
+    codes = {entity: index for index, entity in enumerate(unique_entities)}
+
+    axis_columns = []
+    for axis_index in range(0, axis_count - 1):
+        axis_columns.append(np.fromiter((codes[rule.lhs[axis_index]] for rule in rules), dtype=np.int64, count=len(rules)))
+    #The final axis holds the consequent
+    axis_columns.append(np.fromiter((codes[rule.rhs[0]] for rule in rules), dtype=np.int64, count=len(rules)))
+    return list(zip(axis_columns[:-1], axis_columns[1:]))
+
+
+def count_crossings(axis_pairs: List, positions: np.ndarray) -> int:
+    '''
+        Counts the crossings of encoded rules (see encode_axis_pairs) for an axis configuration
+        given as the position of every entity code
+
+        A pair of rules crosses between two axis when one rises and the other falls, so the
+        crossings of an axis pair are the number of rising rules times the number of falling ones
+    '''
+    cross_count = 0
+    for src_codes, dst_codes in axis_pairs:
+        delta = positions[src_codes] - positions[dst_codes]
+        cross_count += int(np.count_nonzero(delta < 0)) * int(np.count_nonzero(delta > 0))
+    return cross_count
+
+
+class OrderingResult(object):
+    """
+    The outcome of an ordering search.
+
+    order is the best entity order found (as indices into the entity list),
+    crossings its crossing count, and history a list of
+    (evaluation, elapsed seconds, crossings, strategy) tuples recorded every
+    time the best crossing count improved.
+    """
+
+    def __init__(self, order: np.ndarray, crossings: int, history: List, evaluations: int, elapsed: float):
+        self.order = order
+        self.crossings = crossings
+        self.history = history
+        self.evaluations = evaluations
+        self.elapsed = elapsed
+
+    @property
+    def initial_crossings(self) -> int:
+        return self.history[0][2]
+
+    def __repr__(self):
+        return "OrderingResult({} -> {} crossings in {} evaluations, {:.3f}s)".format(
+            self.initial_crossings, self.crossings, self.evaluations, self.elapsed
+        )
+
+
+class OrderingSearch(object):
+    """
+    The state shared by the strategies of a single search: the encoded rules,
+    the best order found so far, the random generator and the budget.
+
+    Strategies call evaluate() for every candidate order and stop once
+    exhausted() or stalled() returns True.
+    """
+
+    def __init__(self, axis_pairs: List, entity_count: int, initial_order: np.ndarray, rng: np.random.Generator,
+                 max_iterations: int, time_limit: float, patience: int):
+        self.axis_pairs = axis_pairs
+        self.entity_count = entity_count
+        self.rng = rng
+        self.max_iterations = max_iterations
+        self.time_limit = time_limit
+        self.patience = patience
+        self.strategy = None
+        self.evaluations = 0
+        self.history = []
+        self._start = time.perf_counter()
+        self._since_improvement = 0
+        self.best_order = np.asarray(initial_order, dtype=np.int64)
+        self.best_crossings = None
+        self.evaluate(self.best_order)
+
+    def positions(self, order: np.ndarray) -> np.ndarray:
+        '''
+            Inverts an order into the position of every entity code
+        '''
+        positions = np.empty(self.entity_count, dtype=np.int64)
+        positions[order] = np.arange(self.entity_count)
+        return positions
+
+    def evaluate(self, order: np.ndarray) -> int:
+        '''
+            Counts the crossings of an order, and records it if it improves on the best so far
+        '''
+        with stage("count_crossings", self.entity_count):
+            crossings = count_crossings(self.axis_pairs, self.positions(order))
+        self.evaluations += 1
+        if self.best_crossings is None or crossings < self.best_crossings:
+            self.best_crossings = crossings
+            self.best_order = np.array(order, dtype=np.int64)
+            self._since_improvement = 0
+            self.history.append((self.evaluations, self.elapsed(), crossings, self.strategy))
+        else:
+            self._since_improvement += 1
+        return crossings
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def exhausted(self) -> bool:
+        '''
+            True once the iteration or time budget is spent, or no crossings are left to remove
+        '''
+        if self.best_crossings == 0 or self.evaluations >= self.max_iterations:
+            return True
+        return self.time_limit is not None and self.elapsed() >= self.time_limit
+
+    def stalled(self) -> bool:
+        '''
+            True once the last patience evaluations did not improve the best crossing count
+        '''
+        return self._since_improvement >= self.patience
+
+    def start_strategy(self, name: str):
+        self.strategy = name
+        self._since_improvement = 0
+
+
+def _neighbour_positions(search: OrderingSearch, positions: np.ndarray):
+    '''
+        Lists (entity, neighbour position) pairs for both ends of every rule segment
+    '''
+    entities = []
+    neighbours = []
+    for src_codes, dst_codes in search.axis_pairs:
+        entities.extend((src_codes, dst_codes))
+        neighbours.extend((positions[dst_codes], positions[src_codes]))
+    if not entities:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(entities), np.concatenate(neighbours)
+
+
+def _sweep(search: OrderingSearch, reducer: Callable):
+    '''
+        Repeatedly reorders entities by a statistic (reducer) of their neighbours' positions
+        until the order stops changing or improving
+    '''
+    order = search.best_order.copy()
+    seen = set()
+    while not search.exhausted() and not search.stalled():
+        positions = search.positions(order)
+        entities, neighbours = _neighbour_positions(search, positions)
+        keys = positions.astype(np.float64)
+        has_neighbours = np.bincount(entities, minlength=search.entity_count) > 0
+        keys[has_neighbours] = reducer(entities, neighbours, search.entity_count)[has_neighbours]
+        #Current positions break ties, keeping the sort stable between sweeps
+        order = np.lexsort((positions, keys))
+        signature = order.tobytes()
+        if signature in seen:
+            break
+        seen.add(signature)
+        search.evaluate(order)
+
+
+def _barycenters(entities: np.ndarray, neighbours: np.ndarray, entity_count: int) -> np.ndarray:
+    sums = np.bincount(entities, weights=neighbours, minlength=entity_count)
+    counts = np.bincount(entities, minlength=entity_count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+def _medians(entities: np.ndarray, neighbours: np.ndarray, entity_count: int) -> np.ndarray:
+    medians = np.zeros(entity_count)
+    if len(entities) == 0:
+        return medians
+    sorted_pairs = np.lexsort((neighbours, entities))
+    sorted_neighbours = neighbours[sorted_pairs]
+    counts = np.bincount(entities, minlength=entity_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present = counts > 0
+    lower = starts[present] + (counts[present] - 1) // 2
+    upper = starts[present] + counts[present] // 2
+    medians[present] = (sorted_neighbours[lower] + sorted_neighbours[upper]) / 2
+    return medians
+
+
+def barycenter_strategy(search: OrderingSearch):
+    '''
+        Barycenter sweeps, each entity moves to the mean position of the entities it connects to
+    '''
+    _sweep(search, _barycenters)
+
+
+def median_strategy(search: OrderingSearch):
+    '''
+        Median sweeps, each entity moves to the median position of the entities it connects to
+    '''
+    _sweep(search, _medians)
+
+
+def swap_strategy(search: OrderingSearch):
+    '''
+        Local improvement, keeps every adjacent transposition that reduces the crossings and
+        repeats full passes until a pass brings no improvement
+    '''
+    order = search.best_order.copy()
+    current = search.best_crossings
+    improved = True
+    while improved and not search.exhausted():
+        improved = False
+        for index in range(search.entity_count - 1):
+            if search.exhausted():
+                break
+            order[index], order[index + 1] = order[index + 1], order[index]
+            crossings = search.evaluate(order)
+            if crossings < current:
+                current = crossings
+                improved = True
+            else:
+                order[index], order[index + 1] = order[index + 1], order[index]
+
+
+def annealing_strategy(search: OrderingSearch, cooling: float = 0.995):
+    '''
+        Simulated annealing over random pair swaps, starting from the best order found so far
+    '''
+    if search.entity_count < 2:
+        return
+    order = search.best_order.copy()
+    current = search.best_crossings
+    temperature = max(1.0, 0.05 * current)
+    while not search.exhausted() and not search.stalled():
+        first, second = search.rng.choice(search.entity_count, size=2, replace=False)
+        order[first], order[second] = order[second], order[first]
+        crossings = search.evaluate(order)
+        delta = crossings - current
+        if delta <= 0 or search.rng.random() < math.exp(-delta / temperature):
+            current = crossings
+        else:
+            order[first], order[second] = order[second], order[first]
+        temperature *= cooling
+
+
+def random_strategy(search: OrderingSearch):
+    '''
+        Random permutation sampling, the original optimizer behavior
+    '''
+    while not search.exhausted() and not search.stalled():
+        search.evaluate(search.rng.permutation(search.entity_count))
+
+
+#Registry of the strategies available by name, see register_ordering_strategy
+ORDERING_STRATEGIES = {
+    'barycenter': barycenter_strategy,
+    'median': median_strategy,
+    'swap': swap_strategy,
+    'annealing': annealing_strategy,
+    'random': random_strategy,
+}
+
+
+def register_ordering_strategy(name: str, strategy: Callable):
+    '''
+        Makes a strategy available to AxisOrderingEngine by name. A strategy is a callable that
+        accepts an OrderingSearch and calls its evaluate method for every order it considers
+    '''
+    ORDERING_STRATEGIES[name] = strategy
+
+
+class AxisOrderingEngine(object):
+    """
+    Searches for the entity order of a parallel coordinate plot that minimizes
+    crossings by chaining heuristic strategies, each starting from the best
+    order found by the previous ones.
+
+    The whole search shares one budget of max_iterations evaluations and an
+    optional time_limit in seconds, and each strategy stops early once
+    patience consecutive evaluations brought no improvement.
+    """
+
+    def __init__(
+        self,
+        strategies=('barycenter', 'median', 'swap', 'annealing'),
+        max_iterations: int = 1000,
+        time_limit: float = None,
+        patience: int = 100,
+        seed: int = 0,
+    ):
+        """
+        Parameters
+        ----------
+        strategies : sequence
+            Names from ORDERING_STRATEGIES or strategy callables, run in order.
+        max_iterations : int
+            Maximum number of orders evaluated over the whole search.
+        time_limit : float
+            Optional maximum duration of the search in seconds.
+        patience : int
+            Evaluations without improvement after which a strategy stops.
+        seed : int
+            Seed of the random generator used by the stochastic strategies.
+        """
+        for strategy in strategies:
+            if not callable(strategy) and strategy not in ORDERING_STRATEGIES:
+                raise ValueError("Unknown ordering strategy {}".format(strategy))
+        self.strategies = tuple(strategies)
+        self.max_iterations = max_iterations
+        self.time_limit = time_limit
+        self.patience = patience
+        self.seed = seed
+
+    def optimize(self, axis_pairs: List, entity_count: int, initial_order=None, seed=None) -> OrderingResult:
+        '''
+            Searches for the entity order with the fewest crossings for rules encoded with
+            encode_axis_pairs, starting from initial_order (the identity order by default)
+            
+            seed (anything numpy.random.default_rng accepts) replaces the engine seed for this
+            search only, so independent searches can be given their own reproducible streams
+        '''
+        if initial_order is None:
+            initial_order = np.arange(entity_count)
+        search = OrderingSearch(
+            axis_pairs, entity_count, initial_order, np.random.default_rng(self.seed if seed is None else seed),
+            self.max_iterations, self.time_limit, self.patience,
+        )
+        for strategy in self.strategies:
+            if search.exhausted():
+                break
+            if callable(strategy):
+                search.start_strategy(getattr(strategy, '__name__', 'custom'))
+                strategy(search)
+            else:
+                search.start_strategy(strategy)
+                ORDERING_STRATEGIES[strategy](search)
+            logging.info("Ordering strategy %s reached %s crossings after %s evaluations", search.strategy, search.best_crossings, search.evaluations)
+
+        return OrderingResult(search.best_order, search.best_crossings, search.history, search.evaluations, search.elapsed())
+
+    def order_entities(self, rules: List, unique_entities: List, axis_count: int) -> OrderingResult:
+        '''
+            Convenience wrapper encoding the rules before running optimize
+        '''
+        axis_pairs = encode_axis_pairs(rules, unique_entities, axis_count)
+        return self.optimize(axis_pairs, len(unique_entities))
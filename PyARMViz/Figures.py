@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Figure assembly and labels shared by the adjacency plots of PyARMViz.PyARMViz
+and the incrementally updated figures of PyARMViz.Incremental.
+"""
+
+import plotly.graph_objects as go
+
+
+def itemset_label(items) -> str:
+    '''
+        The axis label of an itemset, str() of its items as a tuple as in the hover text of
+        metadata_scatter_plot
+    '''
+    return str(tuple(items))
+
+
+def adjacency_graph_figure(edge_x, edge_y, node_x, node_y, node_text, node_degrees):
+    '''
+        Assembles the adjacency graph figure from the edge line coordinates (source, destination,
+        gap for every edge) and the node coordinates, hover texts and degrees
+    '''
+    edge_trace = go.Scatter(
+        x=edge_x, y=edge_y,
+        line=dict(width=0.5, color='#888'),
+        hoverinfo='none',
+        mode='lines')
+
+    node_trace = go.Scatter(
+        x=node_x, y=node_y,
+        mode='markers',
+        hoverinfo='text',
+        text=node_text,
+        marker=dict(
+            showscale=True,
+            # colorscale options
+            #'Greys' | 'YlGnBu' | 'Greens' | 'YlOrRd' | 'Bluered' | 'RdBu' |
+            #'Reds' | 'Blues' | 'Picnic' | 'Rainbow' | 'Portland' | 'Jet' |
+            #'Hot' | 'Blackbody' | 'Earth' | 'Electric' | 'Viridis' |
+            colorscale='YlGnBu',
+            reversescale=True,
+            color=node_degrees,
+            size=10,
+            colorbar=dict(
+                thickness=15,
+                title=dict(text='Node Connections', side='right'),
+                xanchor='left',
+            ),
+            line_width=2))
+    return go.Figure(data=[edge_trace, node_trace],
+         layout=go.Layout(
+            title=dict(text='<br>Network graph made with Python', font=dict(size=16)),
+            showlegend=False,
+            hovermode='closest',
+            margin=dict(b=20,l=5,r=5,t=40),
+            annotations=[ dict(
+                text="Python code: <a href='https://plotly.com/ipython-notebooks/network-graphs/'> https://plotly.com/ipython-notebooks/network-graphs/</a>",
+                showarrow=False,
+                xref="paper", yref="paper",
+                x=0.005, y=-0.002 ) ],
+            xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+            yaxis=dict(showgrid=False, zeroline=False, showticklabels=False))
+            )
+
+
+def adjacency_scatter_figure(x_axis, y_axis, strength):
+    '''
+        Assembles the adjacency scatter figure from the consequent and antecedent labels and the
+        marker size of every rule
+    '''
+    #Generate distance matrix view
+    fig = go.Figure()
+
+    fig.add_trace(go.Scatter(
+        x=x_axis,
+        y=y_axis,
+        mode="markers",
+        marker = {'size':strength},
+        name='Association rules',
+    ))
+    return fig
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vectorized filtering of rule collections by metric thresholds and items,
+top-K selection, and pruning of redundant rules.
+
+Every function accepts a list of Rules or a RuleSet. The filters return a
+RuleSet sharing the vocabulary of the input, which can be passed straight to
+the plot functions.
+"""
+
+import numpy as np
+
+from PyARMViz.RuleSet import RuleSet, as_rule_set
+
+#Quantities that can be thresholded besides the metrics of RuleSet.metric_names
+_LENGTH_COLUMNS = ("lhs_length", "rhs_length")
+
+
+def _column(rule_set: RuleSet, name: str) -> np.ndarray:
+    if name in RuleSet.metric_names:
+        return getattr(rule_set, name)
+    if name in _LENGTH_COLUMNS:
+        return getattr(rule_set, name + "s")
+    raise ValueError("Unknown rule metric {}, expected one of {}".format(name, RuleSet.metric_names + _LENGTH_COLUMNS))
+
+
+def threshold_mask(rules, **thresholds) -> np.ndarray:
+    '''
+        Boolean mask of the rules passing every threshold, given as min_<metric> or
+        max_<metric> keyword arguments (bounds are inclusive), where metric is one of
+        RuleSet.metric_names, lhs_length or rhs_length
+
+        Rules with an undefined (NaN) metric fail any threshold on that metric
+
+        >>> from PyARMViz.Rule import Rule
+        >>> rules = [Rule(('a',), ('b',), 40, 50, 60, 100), Rule(('a', 'c'), ('b',), 10, 20, 60, 100)]
+        >>> threshold_mask(rules, min_confidence=0.6, max_lhs_length=1)
+        array([ True, False])
+    '''
+    rule_set = as_rule_set(rules)
+    mask = np.ones(len(rule_set), dtype=bool)
+    for name, bound in thresholds.items():
+        if bound is None:
+            continue
+        if name.startswith("min_"):
+            mask &= _column(rule_set, name[4:]) >= bound
+        elif name.startswith("max_"):
+            mask &= _column(rule_set, name[4:]) <= bound
+        else:
+            raise ValueError("Thresholds must be named min_<metric> or max_<metric>, got {}".format(name))
+    return mask
+
+
+def item_mask(rules, items, side: str = "either", match: str = "any") -> np.ndarray:
+    '''
+        Boolean mask of the rules involving the given items on the lhs, the rhs or either side,
+        requiring any or all of them (items unknown to the rules never match)
+    '''
+    rule_set = as_rule_set(rules)
+    codes = [rule_set.vocabulary.get(item) for item in items]
+    if match == "all" and None in codes:
+        return np.zeros(len(rule_set), dtype=bool)
+    codes = np.array(sorted(set(code for code in codes if code is not None)), dtype=np.int64)
+
+    sides = {"lhs": ((rule_set.lhs_indptr, rule_set.lhs_indices),),
+             "rhs": ((rule_set.rhs_indptr, rule_set.rhs_indices),)}
+    sides["either"] = sides["lhs"] + sides["rhs"]
+    if side not in sides:
+        raise ValueError("side must be one of lhs, rhs or either")
+
+    #Per rule bitmask of the matched items, from the row id of every matching item position
+    found = np.zeros((len(rule_set), len(codes)), dtype=bool)
+    for indptr, indices in sides[side]:
+        if len(codes) == 0:
+            continue
+        rows = np.repeat(np.arange(len(rule_set)), np.diff(indptr))
+        positions = np.minimum(np.searchsorted(codes, indices), len(codes) - 1)
+        hits = codes[positions] == indices
+        found[rows[hits], positions[hits]] = True
+    if match == "any":
+        return found.any(axis=1)
+    if match == "all":
+        return found.all(axis=1)
+    raise ValueError("match must be any or all")
+
+
+def filter_rules(rules, items=None, side: str = "either", match: str = "any", **thresholds) -> RuleSet:
+    '''
+        The rules passing the thresholds (see threshold_mask) and, if items are given, involving
+        them (see item_mask)
+    '''
+    rule_set = as_rule_set(rules)
+    mask = threshold_mask(rule_set, **thresholds)
+    if items is not None:
+        mask &= item_mask(rule_set, items, side, match)
+    return rule_set.take(mask)
+
+
+def top_k(rules, k: int, metric: str = "lift", ascending: bool = False) -> RuleSet:
+    '''
+        The k rules with the highest (or lowest if ascending) value of metric, in order, rules
+        with an undefined metric come last. Ties keep their original order
+    '''
+    rule_set = as_rule_set(rules)
+    values = _column(rule_set, metric).astype(np.float64)
+    keys = values if ascending else -values
+    keys = np.where(np.isnan(keys), np.inf, keys)
+    k = max(0, min(k, len(rule_set)))
+    if k == 0:
+        return rule_set.take(np.zeros(0, dtype=np.int64))
+    #Partition so only the rules up to the k-th key are sorted, then break ties by position
+    threshold = keys[np.argpartition(keys, k - 1)[k - 1]]
+    candidates = np.flatnonzero(keys <= threshold)
+    order = candidates[np.lexsort((candidates, keys[candidates]))][:k]
+    return rule_set.take(order)
+
+
+def canonical_itemsets(indptr: np.ndarray, indices: np.ndarray):
+    '''
+        Sorts the item codes within every itemset of a CSR encoded list and drops repeated
+        codes, returns the new (indptr, indices) pair
+    '''
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    indices = np.asarray(indices)
+    same_row = rows[1:] == rows[:-1]
+    if not (same_row & (indices[1:] <= indices[:-1])).any():
+        return np.asarray(indptr, dtype=np.int64), indices
+    order = np.lexsort((indices, rows))
+    rows, indices = rows[order], indices[order]
+    keep = np.ones(len(indices), dtype=bool)
+    keep[1:] = (rows[1:] != rows[:-1]) | (indices[1:] != indices[:-1])
+    rows, indices = rows[keep], indices[keep]
+    new_indptr = np.zeros(len(indptr), dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(indptr) - 1), out=new_indptr[1:])
+    return new_indptr, indices
+
+
+def padded_itemsets(indptr: np.ndarray, indices: np.ndarray, width: int = None) -> np.ndarray:
+    '''
+        The canonical (sorted, deduplicated) itemsets of a CSR encoded list as the rows of an
+        int32 matrix, padded with -1 to width columns (by default the longest itemset)
+    '''
+    indptr = np.asarray(indptr, dtype=np.int64)
+    lengths = np.diff(indptr)
+    longest = int(lengths.max()) if len(lengths) else 0
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    columns = np.arange(len(indices)) - indptr[rows]
+    #Sorting each row with the padding as the largest value leaves it at the end
+    padding = np.iinfo(np.int32).max
+    matrix = np.full((len(lengths), longest), padding, dtype=np.int32)
+    matrix[rows, columns] = indices
+    matrix.sort(axis=1)
+    repeated = np.zeros(matrix.shape, dtype=bool)
+    repeated[:, 1:] = (matrix[:, 1:] == matrix[:, :-1]) & (matrix[:, 1:] != padding)
+    if repeated.any():
+        matrix[repeated] = padding
+        matrix.sort(axis=1)
+        longest = int((matrix != padding).sum(axis=1).max())
+    matrix[matrix == padding] = -1
+    if width is None:
+        width = longest
+    padded = np.full((len(lengths), width), -1, dtype=np.int32)
+    padded[:, :min(width, longest)] = matrix[:, :min(width, longest)]
+    return padded
+
+
+def _row_keys(matrix: np.ndarray) -> np.ndarray:
+    '''
+        Views every row of a 2D array as a single opaque value, so rows can be sorted, compared
+        and searched as a whole
+    '''
+    matrix = np.ascontiguousarray(matrix)
+    return matrix.view(np.dtype((np.void, matrix.dtype.itemsize * matrix.shape[1]))).ravel()
+
+
+#Fixed odd multipliers of the row hash, one per column (wider rows reuse them with an offset)
+_HASH_MULTIPLIERS = np.random.default_rng(0x5eed).integers(1, 2 ** 63, size=64, dtype=np.uint64) | np.uint64(1)
+
+
+def _row_hashes(matrix: np.ndarray) -> np.ndarray:
+    '''
+        64 bit hash of every row of an integer matrix
+    '''
+    hashes = np.zeros(len(matrix), dtype=np.uint64)
+    for column in range(matrix.shape[1]):
+        multiplier = _HASH_MULTIPLIERS[column % len(_HASH_MULTIPLIERS)] + np.uint64(column // len(_HASH_MULTIPLIERS) * 2)
+        hashes += (matrix[:, column].astype(np.int64) + 1).astype(np.uint64) * multiplier
+        hashes ^= hashes >> np.uint64(29)
+    return hashes
+
+
+class ItemsetIndex(object):
+    """
+    Sorted index of itemsets, each stored under a group (for rules, their
+    consequent) with the best score of the itemsets stored under the same key.
+
+    Every (group, itemset) pair is a fixed width row, indexed by a sorted
+    array of 64 bit row hashes and looked up in bulk with a binary search,
+    then checked against the stored row so a lookup is always exact. If two
+    stored rows share a hash the index falls back to sorting the raw rows.
+    """
+
+    def __init__(self, groups: np.ndarray, itemsets: np.ndarray, scores: np.ndarray):
+        '''
+            groups holds one group id per itemset, itemsets the padded itemset matrix (see
+            padded_itemsets) and scores one score per itemset
+        '''
+        self.width = itemsets.shape[1]
+        rows = np.column_stack([np.asarray(groups, dtype=np.int32), itemsets]).astype(np.int32)
+        scores = np.asarray(scores, dtype=np.float64)
+        hashes = _row_hashes(rows)
+        order = np.argsort(hashes, kind="stable")
+        hashes, rows, scores = hashes[order], rows[order], scores[order]
+        starts = np.flatnonzero(np.r_[True, hashes[1:] != hashes[:-1]]) if len(hashes) else np.zeros(0, dtype=np.int64)
+        same_hash = np.r_[False, hashes[1:] == hashes[:-1]] if len(hashes) else np.zeros(0, dtype=bool)
+        self._hashed = not (same_hash & (rows != np.roll(rows, 1, axis=0)).any(axis=1)).any()
+        if self._hashed:
+            self._keys = hashes[starts]
+            self._rows = rows[starts]
+            self._scores = np.maximum.reduceat(scores, starts) if len(starts) else scores
+        else:
+            self._keys, inverse = np.unique(_row_keys(rows), return_inverse=True)
+            self._scores = np.full(len(self._keys), -np.inf)
+            np.maximum.at(self._scores, inverse.ravel(), scores)
+        #Itemset sizes present, so searches for subsets of other sizes can be skipped
+        self.sizes = set(np.unique((itemsets >= 0).sum(axis=1)).tolist())
+
+    def best_scores(self, groups: np.ndarray, itemsets: np.ndarray) -> np.ndarray:
+        '''
+            The best score stored for every (group, padded itemset) query, -inf where there is none
+        '''
+        padding = np.full((len(itemsets), self.width - itemsets.shape[1]), -1, dtype=np.int32)
+        rows = np.column_stack([np.asarray(groups, dtype=np.int32), itemsets, padding]).astype(np.int32)
+        if len(self._keys) == 0:
+            return np.full(len(rows), -np.inf)
+        queries = _row_hashes(rows) if self._hashed else _row_keys(rows)
+        #Searching in sorted order keeps the binary search within the cache
+        order = np.argsort(queries, kind="stable")
+        positions = np.empty(len(queries), dtype=np.int64)
+        positions[order] = np.searchsorted(self._keys, queries[order])
+        np.minimum(positions, len(self._keys) - 1, out=positions)
+        found = self._keys[positions] == queries
+        if self._hashed:
+            found &= (self._rows[positions] == rows).all(axis=1)
+        return np.where(found, self._scores[positions], -np.inf)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def itemset_groups(itemsets: np.ndarray, return_index: bool = False):
+    '''
+        Numbers the distinct rows of a padded itemset matrix (or any 2D integer array, such as
+        rule keys or plot paths) in order of first appearance, returns the number of every row
+        (and with return_index the first row of every number)
+
+        Rows are grouped by sorting their 64 bit hashes, checked against the rows themselves,
+        falling back to sorting the raw rows if two distinct rows share a hash
+
+        >>> groups, first = itemset_groups(np.array([[3, 1], [0, -1], [3, 1]]), return_index=True)
+        >>> groups.tolist(), first.tolist()
+        ([0, 1, 0], [0, 1])
+    '''
+    hashes = _row_hashes(itemsets)
+    #A stable sort keeps the first appearance of every row at the start of its run
+    order = np.argsort(hashes, kind="stable")
+    sorted_hashes = hashes[order]
+    starts = np.r_[True, sorted_hashes[1:] != sorted_hashes[:-1]] if len(order) else np.zeros(0, dtype=bool)
+    sorted_rows = itemsets[order]
+    if ((sorted_rows[1:] != sorted_rows[:-1]).any(axis=1) & ~starts[1:]).any():
+        _, first, groups = np.unique(_row_keys(itemsets), return_index=True, return_inverse=True)
+        runs = groups.ravel()
+    else:
+        first = order[starts]
+        runs = np.empty(len(order), dtype=np.int64)
+        runs[order] = np.cumsum(starts) - 1
+    #Renumber the groups by their first row
+    first_order = np.argsort(first)
+    renumbered = np.empty(len(first), dtype=np.int64)
+    renumbered[first_order] = np.arange(len(first))
+    groups = renumbered[runs]
+    first = first[first_order]
+    return (groups, first) if return_index else groups
+
+
+def itemset_ids(indptr: np.ndarray, indices: np.ndarray):
+    '''
+        Numbers the distinct itemsets of a CSR encoded list, ignoring item order and repeats,
+        returns the number of every itemset and the position of the first itemset of each number
+    '''
+    return itemset_groups(padded_itemsets(indptr, indices), return_index=True)
+
+
+def redundant_mask(rules, metric: str = "confidence") -> np.ndarray:
+    '''
+        Boolean mask of the redundant rules: rules for which another rule with the same rhs and
+        an lhs that is a proper subset of theirs has an equal or better metric
+
+        Rules with an undefined metric are never redundant nor make other rules redundant
+
+        Every proper subset of every lhs is looked up in an ItemsetIndex of all the (rhs, lhs)
+        pairs, one vectorized search per lhs length and subset pattern
+    '''
+    rule_set = as_rule_set(rules)
+    scores = _column(rule_set, metric).astype(np.float64)
+    lhs = padded_itemsets(rule_set.lhs_indptr, rule_set.lhs_indices)
+    rhs_groups = itemset_groups(padded_itemsets(rule_set.rhs_indptr, rule_set.rhs_indices))
+    defined = ~np.isnan(scores)
+    index = ItemsetIndex(rhs_groups[defined], lhs[defined], scores[defined])
+
+    lengths = (lhs >= 0).sum(axis=1)
+    best = np.full(len(rule_set), -np.inf)
+    for length in np.unique(lengths).tolist():
+        rows = np.flatnonzero(lengths == length)
+        codes = lhs[rows, :length]
+        for pattern in range(2 ** length - 1):
+            selected = [position for position in range(length) if pattern >> position & 1]
+            if len(selected) not in index.sizes:
+                continue
+            found = index.best_scores(rhs_groups[rows], codes[:, selected])
+            np.maximum(best[rows], found, out=found)
+            best[rows] = found
+    return scores <= best
+
+
+def prune_redundant(rules, metric: str = "confidence") -> RuleSet:
+    '''
+        The rules that are not redundant (see redundant_mask), in their original order
+    '''
+    rule_set = as_rule_set(rules)
+    return rule_set.take(~redundant_mask(rule_set, metric))
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming export of the directional rule/entity adjacency graph to GEXF and
+GraphML.
+
+The writers produce the same graph as _adjacency_graph_generator (rule
+nodes weighted by int(confidence * 10), entity nodes weighted by 1, edges
+carrying the Normalized_Lift int(lift * 10) of their rule, undefined metrics
+weighing 0), but write each
+node and edge element as the rules are iterated instead of building a
+NetworkX graph and an XML tree first. Apart from the entity id dictionary
+the memory use does not depend on the number of rules.
+
+Rule nodes get the ids r0, r1, ... and entity nodes e0, e1, ... in order
+of first appearance, the rule index or entity is stored as the node label.
+"""
+
+import gzip
+import logging
+import math
+import shutil
+import tempfile
+from xml.sax.saxutils import escape, quoteattr
+
+_GEXF_HEADER = """<?xml version='1.0' encoding='utf-8'?>
+<gexf xmlns="http://www.gexf.net/1.2draft" version="1.2">
+  <graph defaultedgetype="directed" mode="static">
+    <attributes class="edge" mode="static">
+      <attribute id="0" title="Normalized_Lift" type="long" />
+    </attributes>
+    <attributes class="node" mode="static">
+      <attribute id="1" title="Weight" type="long" />
+      <attribute id="2" title="type" type="string" />
+    </attributes>
+    <nodes>
+"""
+_GEXF_NODE = """      <node id="{}" label={}>
+        <attvalues>
+          <attvalue for="1" value="{}" />
+          <attvalue for="2" value="{}" />
+        </attvalues>
+      </node>
+"""
+_GEXF_EDGE = """      <edge source="{}" target="{}" id="{}">
+        <attvalues>
+          <attvalue for="0" value="{}" />
+        </attvalues>
+      </edge>
+"""
+
+_GRAPHML_HEADER = """<?xml version='1.0' encoding='utf-8'?>
+<graphml xmlns="http://graphml.graphdrawing.org/xmlns" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">
+  <key id="d0" for="edge" attr.name="Normalized_Lift" attr.type="long" />
+  <key id="d1" for="node" attr.name="Weight" attr.type="long" />
+  <key id="d2" for="node" attr.name="type" attr.type="string" />
+  <key id="d3" for="node" attr.name="label" attr.type="string" />
+  <graph edgedefault="directed">
+"""
+_GRAPHML_NODE = """    <node id="{}">
+      <data key="d1">{}</data>
+      <data key="d2">{}</data>
+      <data key="d3">{}</data>
+    </node>
+"""
+_GRAPHML_EDGE = """    <edge source="{}" target="{}">
+      <data key="d0">{}</data>
+    </edge>
+"""
+
+GRAPH_FORMATS = ("gexf", "graphml")
+
+
+def _open_output(path: str, compress: bool):
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+def _scaled_weight(value) -> int:
+    '''
+        int(value * 10), undefined (None, NaN or infinite) values weigh 0 as in
+        AdjacencyGraph._scaled_weights
+    '''
+    if value is None or not math.isfinite(value):
+        return 0
+    return int(value*10)
+
+
+def _iter_adjacency(rules):
+    '''
+        Walks the rules once, yielding ('node', id, label, weight, type) for every new node
+        and ('edge', source, target, normalized_lift) for every edge
+    '''
+    entity_ids = {}
+    for index, rule in enumerate(rules):
+        rule_id = "r{}".format(index)
+        normalized_lift = _scaled_weight(rule.lift)
+        yield ("node", rule_id, index, _scaled_weight(rule.confidence), "Association_Rule")
+
+        #Repeated items within an itemset produce a single edge, as in the NetworkX graph
+        linked = set()
+        for side, entities in ((0, rule.lhs), (1, rule.rhs)):
+            for entity in entities:
+                entity_id = entity_ids.get(entity)
+                if entity_id is None:
+                    entity_id = entity_ids[entity] = "e{}".format(len(entity_ids))
+                    yield ("node", entity_id, entity, 1, "Entity")
+                if (side, entity_id) in linked:
+                    continue
+                linked.add((side, entity_id))
+                if side == 0:
+                    yield ("edge", entity_id, rule_id, normalized_lift)
+                else:
+                    yield ("edge", rule_id, entity_id, normalized_lift)
+
+
+def write_adjacency_gexf(rules, output_path: str, compress: bool = False):
+    '''
+        Streams the adjacency graph of an iterable of Rules to a GEXF 1.2 file, gzip compressed
+        if compress is set
+
+        GEXF lists all nodes before the edges, so edges are spooled to a temporary file while
+        the rules are read and appended once the nodes are written
+    '''
+    node_count = edge_count = 0
+    with _open_output(output_path, compress) as output, \
+            tempfile.TemporaryFile("w+", encoding="utf-8") as edge_spool:
+        output.write(_GEXF_HEADER)
+        for element in _iter_adjacency(rules):
+            if element[0] == "node":
+                _, node_id, label, weight, node_type = element
+                output.write(_GEXF_NODE.format(node_id, quoteattr(str(label)), weight, node_type))
+                node_count += 1
+            else:
+                _, source, target, normalized_lift = element
+                edge_spool.write(_GEXF_EDGE.format(source, target, edge_count, normalized_lift))
+                edge_count += 1
+        output.write("    </nodes>\n    <edges>\n")
+        edge_spool.seek(0)
+        shutil.copyfileobj(edge_spool, output)
+        output.write("    </edges>\n  </graph>\n</gexf>\n")
+    logging.debug("Wrote GEXF graph with %s nodes and %s edges to %s", node_count, edge_count, output_path)
+
+
+def write_adjacency_graphml(rules, output_path: str, compress: bool = False):
+    '''
+        Streams the adjacency graph of an iterable of Rules to a GraphML file, gzip compressed
+        if compress is set. The node labels are stored in the label node attribute
+    '''
+    node_count = edge_count = 0
+    with _open_output(output_path, compress) as output:
+        output.write(_GRAPHML_HEADER)
+        for element in _iter_adjacency(rules):
+            if element[0] == "node":
+                _, node_id, label, weight, node_type = element
+                output.write(_GRAPHML_NODE.format(node_id, weight, node_type, escape(str(label))))
+                node_count += 1
+            else:
+                _, source, target, normalized_lift = element
+                output.write(_GRAPHML_EDGE.format(source, target, normalized_lift))
+                edge_count += 1
+        output.write("  </graph>\n</graphml>\n")
+    logging.debug("Wrote GraphML graph with %s nodes and %s edges to %s", node_count, edge_count, output_path)
+
+
+def graph_format_from_path(output_path: str) -> str:
+    '''
+        Guesses the graph format from the file extension, ignoring a trailing .gz
+    '''
+    name = output_path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return "graphml" if name.endswith(".graphml") else "gexf"
+
+
+def write_adjacency_graph(rules, output_path: str, file_format: str = None, compress: bool = False):
+    '''
+        Streams the adjacency graph to output_path as 'gexf' or 'graphml', by default guessed
+        from the file extension
+    '''
+    if file_format is None:
+        file_format = graph_format_from_path(output_path)
+    if file_format == "gexf":
+        write_adjacency_gexf(rules, output_path, compress)
+    elif file_format == "graphml":
+        write_adjacency_graphml(rules, output_path, compress)
+    else:
+        raise ValueError("Unknown graph format {}, expected one of {}".format(file_format, GRAPH_FORMATS))
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incremental upkeep of the adjacency graph, its layout and the adjacency
+figures of a rule collection that changes over time, e.g. for a dashboard
+fed by a mining job that emits new rules every few minutes.
+
+    visualizer = IncrementalVisualizer(rules)
+    graph_figure = visualizer.graph_figure()
+    rule_ids = visualizer.add(new_rules)
+    visualizer.remove(rule_ids[:10])
+    #graph_figure now shows the updated graph
+
+Nodes and edges live in slots of preallocated arrays that are reused once
+freed, so a delta only touches the slots of the rules it adds or removes:
+node positions, labels and edge coordinates of every other slot are kept as
+they are. Handing the arrays to plotly still copies them whole, as plotly
+traces cannot be patched by index.
+"""
+
+import math
+
+import numpy as np
+
+from PyARMViz.AdjacencyGraph import ENTITY_NODE, RULE_NODE
+from PyARMViz.Layout import force_directed_layout, refine_layout
+from PyARMViz.Figures import adjacency_graph_figure, adjacency_scatter_figure, itemset_label
+from PyARMViz.RuleSet import ItemVocabulary, RuleSet
+
+_FREE_NODE = -1
+
+
+class _Slots(object):
+    """
+    Allocates slot numbers, reusing released slots before new ones, and
+    tracks the capacity the slot arrays need.
+    """
+
+    def __init__(self):
+        self.free = []
+        self.used = 0
+
+    def allocate(self, count: int) -> np.ndarray:
+        reused = self.free[len(self.free) - min(count, len(self.free)):]
+        del self.free[len(self.free) - len(reused):]
+        fresh = np.arange(self.used, self.used + count - len(reused), dtype=np.int64)
+        self.used += len(fresh)
+        return np.concatenate([np.array(reused, dtype=np.int64), fresh])
+
+    def release(self, slots: np.ndarray):
+        self.free.extend(slots.tolist())
+
+
+def _grow(array: np.ndarray, capacity: int, fill) -> np.ndarray:
+    '''
+        array extended to at least capacity rows (doubling), the new rows set to fill
+    '''
+    if len(array) >= capacity:
+        return array
+    grown = np.empty((max(capacity, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    grown[len(array):] = fill
+    return grown
+
+
+class IncrementalVisualizer(object):
+    """
+    The adjacency graph (see adjacency_graph_csr), force directed layout and
+    adjacency scatter arrays of a rule collection, updated from deltas of
+    added and removed rules.
+
+    Added rules get new rule nodes, and new entity nodes for items not in the
+    graph yet. They are placed next to the nodes they connect to and refined
+    with refine_layout while every other node keeps its position. Removed
+    rules free their nodes and edges, and entity nodes no rule uses anymore
+    are dropped. The figures returned by graph_figure and scatter_figure are
+    patched in place after every delta.
+    """
+
+    def __init__(self, rules=None, iterations: int = 100, refine_iterations: int = 30, seed: int = 0):
+        '''
+            Starts from the rules (a list of Rules or a RuleSet) if given, laid out with
+            iterations steps of force_directed_layout. Later deltas are refined with
+            refine_iterations steps
+        '''
+        self.vocabulary = ItemVocabulary()
+        self.iterations = iterations
+        self.refine_iterations = refine_iterations
+        self.seed = seed
+        self._generator = np.random.default_rng(seed)
+        self._next_rule_id = 0
+
+        #Node slots: rule nodes are labelled by rule id, entity nodes by item
+        self._node_slots = _Slots()
+        self._node_types = np.zeros(0, dtype=np.int8)
+        self._node_labels = np.zeros(0, dtype=object)
+        self._node_text = np.zeros(0, dtype=object)
+        self._node_codes = np.zeros(0, dtype=np.int64)
+        self._degrees = np.zeros(0, dtype=np.int64)
+        self._positions = np.zeros((0, 2))
+        self._entity_nodes = np.zeros(0, dtype=np.int64)
+
+        #Edge slots, every edge joins a rule node and an entity node
+        self._edge_slots = _Slots()
+        self._sources = np.zeros(0, dtype=np.int64)
+        self._targets = np.zeros(0, dtype=np.int64)
+        #The (source, target, NaN gap) coordinates of every edge slot, as drawn by the edge trace
+        self._edge_x = np.zeros((0, 3))
+        self._edge_y = np.zeros((0, 3))
+
+        #Rule id -> (rule node, edge slots)
+        self._rules = {}
+        #Scatter arrays, indexed by rule node slot
+        self._scatter_x = np.zeros(0, dtype=object)
+        self._scatter_y = np.zeros(0, dtype=object)
+        self._scatter_size = np.zeros(0)
+
+        self._graph_figure = None
+        self._scatter_figure = None
+        if rules is not None:
+            self.add(rules)
+
+    @property
+    def rule_count(self) -> int:
+        return len(self._rules)
+
+    @property
+    def node_count(self) -> int:
+        return self._node_slots.used - len(self._node_slots.free)
+
+    @property
+    def edge_count(self) -> int:
+        return self._edge_slots.used - len(self._edge_slots.free)
+
+    def rule_ids(self) -> np.ndarray:
+        '''
+            The ids of the current rules, in the order they were added
+        '''
+        return np.array(sorted(self._rules), dtype=np.int64)
+
+    def _encode(self, rules) -> RuleSet:
+        '''
+            The rules as a RuleSet over the visualizer vocabulary
+        '''
+        if not isinstance(rules, RuleSet):
+            return RuleSet.from_rules(rules, self.vocabulary)
+        return rules.recode(self.vocabulary)
+
+    def _allocate_nodes(self, count: int, node_type: int, labels, codes) -> np.ndarray:
+        nodes = self._node_slots.allocate(count)
+        capacity = self._node_slots.used
+        self._node_types = _grow(self._node_types, capacity, _FREE_NODE)
+        self._node_labels = _grow(self._node_labels, capacity, None)
+        self._node_text = _grow(self._node_text, capacity, None)
+        self._node_codes = _grow(self._node_codes, capacity, -1)
+        self._degrees = _grow(self._degrees, capacity, 0)
+        self._positions = _grow(self._positions, capacity, np.nan)
+        self._scatter_x = _grow(self._scatter_x, capacity, None)
+        self._scatter_y = _grow(self._scatter_y, capacity, None)
+        self._scatter_size = _grow(self._scatter_size, capacity, 0)
+        self._node_types[nodes] = node_type
+        self._node_labels[nodes] = labels
+        self._node_text[nodes] = [str(label) for label in self._node_labels[nodes].tolist()]
+        self._node_codes[nodes] = codes
+        return nodes
+
+    def _release_nodes(self, nodes: np.ndarray):
+        self._node_types[nodes] = _FREE_NODE
+        self._node_labels[nodes] = None
+        self._node_text[nodes] = None
+        self._node_codes[nodes] = -1
+        self._degrees[nodes] = 0
+        self._positions[nodes] = np.nan
+        self._scatter_x[nodes] = None
+        self._scatter_y[nodes] = None
+        self._scatter_size[nodes] = 0
+        self._node_slots.release(nodes)
+
+    def add(self, rules) -> np.ndarray:
+        '''
+            Adds a list of Rules or a RuleSet to the visualization, returns the ids given to the
+            rules (used to remove them later)
+        '''
+        rule_set = self._encode(rules)
+        rule_count = len(rule_set)
+        rule_ids = np.arange(self._next_rule_id, self._next_rule_id + rule_count, dtype=np.int64)
+        self._next_rule_id += rule_count
+        if rule_count == 0:
+            return rule_ids
+        was_empty = self.node_count == 0
+
+        rule_nodes = self._allocate_nodes(rule_count, RULE_NODE, rule_ids, -1)
+        self._entity_nodes = _grow(self._entity_nodes, len(self.vocabulary), _FREE_NODE)
+        lhs_codes = rule_set.lhs_indices.astype(np.int64)
+        rhs_codes = rule_set.rhs_indices.astype(np.int64)
+        used_codes = np.union1d(lhs_codes, rhs_codes)
+        new_codes = used_codes[self._entity_nodes[used_codes] == _FREE_NODE]
+        entity_nodes = self._allocate_nodes(len(new_codes), ENTITY_NODE, self.vocabulary.decode(new_codes.tolist()), new_codes)
+        self._entity_nodes[new_codes] = entity_nodes
+
+        #Antecedent entity -> rule, then rule -> consequent entity, repeated items collapse
+        sources = np.concatenate([self._entity_nodes[lhs_codes], np.repeat(rule_nodes, rule_set.rhs_lengths)])
+        targets = np.concatenate([np.repeat(rule_nodes, rule_set.lhs_lengths), self._entity_nodes[rhs_codes]])
+        node_capacity = len(self._node_types)
+        keys = np.unique(sources * node_capacity + targets)
+        sources, targets = keys // node_capacity, keys % node_capacity
+        edges = self._edge_slots.allocate(len(keys))
+        self._sources = _grow(self._sources, self._edge_slots.used, 0)
+        self._targets = _grow(self._targets, self._edge_slots.used, 0)
+        self._edge_x = _grow(self._edge_x, self._edge_slots.used, np.nan)
+        self._edge_y = _grow(self._edge_y, self._edge_slots.used, np.nan)
+        self._sources[edges] = sources
+        self._targets[edges] = targets
+        np.add.at(self._degrees, sources, 1)
+        np.add.at(self._degrees, targets, 1)
+
+        #Group the edges by rule, the rule end of an edge is its source or target
+        edge_rules = np.where(self._node_types[sources] == RULE_NODE, sources, targets)
+        sorter = np.argsort(rule_nodes)
+        rule_positions = sorter[np.searchsorted(rule_nodes, edge_rules, sorter=sorter)]
+        order = np.argsort(rule_positions, kind="stable")
+        splits = np.cumsum(np.bincount(rule_positions, minlength=rule_count))[:-1]
+        for rule_id, rule_node, rule_edges in zip(rule_ids.tolist(), rule_nodes.tolist(), np.split(edges[order], splits)):
+            self._rules[rule_id] = (rule_node, rule_edges)
+
+        self._scatter_x[rule_nodes] = [itemset_label(rule_set.rhs(index)) for index in range(rule_count)]
+        self._scatter_y[rule_nodes] = [itemset_label(rule_set.lhs(index)) for index in range(rule_count)]
+        self._scatter_size[rule_nodes] = 20 * rule_set.confidence
+
+        if was_empty:
+            self.relayout()
+        else:
+            #Only the new nodes move, and all of their edges are new
+            self._place(rule_nodes, entity_nodes, sources, targets)
+            self._update_edge_coordinates(edges)
+            self._patch_figures()
+        return rule_ids
+
+    def _place(self, rule_nodes: np.ndarray, entity_nodes: np.ndarray, sources: np.ndarray, targets: np.ndarray):
+        '''
+            Warm starts the new nodes next to their neighbours and refines them with the rest of
+            the layout fixed
+        '''
+        k = 2 * math.sqrt(1.0 / self.node_count)
+        new_nodes = np.concatenate([rule_nodes, entity_nodes])
+        #New rules start at the mean of the entities they already share with the graph, the
+        #new entities then at the mean of their (now placed) rules
+        self._place_at_neighbours(rule_nodes, sources, targets, entity_nodes, k)
+        self._place_at_neighbours(entity_nodes, sources, targets, np.zeros(0, dtype=np.int64), k)
+        refine_layout(self._positions, new_nodes, sources, targets, k=k, iterations=self.refine_iterations)
+
+    def _place_at_neighbours(self, nodes: np.ndarray, sources: np.ndarray, targets: np.ndarray, unplaced: np.ndarray, k: float):
+        '''
+            Puts nodes at the mean position of their neighbours along the given edges, ignoring
+            the unplaced ones, plus a jitter of k, or at random if they have none
+        '''
+        if len(nodes) == 0:
+            return
+        ends = np.concatenate([sources, targets])
+        others = np.concatenate([targets, sources])
+        sorter = np.argsort(nodes)
+        local = np.minimum(np.searchsorted(nodes, ends, sorter=sorter), len(nodes) - 1)
+        mine = (nodes[sorter[local]] == ends) & ~np.isin(others, unplaced)
+        local = sorter[local[mine]]
+        neighbour_positions = self._positions[others[mine]]
+        counts = np.bincount(local, minlength=len(nodes))
+        positions = self._generator.uniform(-1, 1, (len(nodes), 2))
+        has_neighbours = counts > 0
+        for axis in (0, 1):
+            sums = np.bincount(local, weights=neighbour_positions[:, axis], minlength=len(nodes))
+            positions[has_neighbours, axis] = sums[has_neighbours] / counts[has_neighbours]
+        positions[has_neighbours] += self._generator.normal(0, k, (int(has_neighbours.sum()), 2))
+        self._positions[nodes] = positions
+
+    def remove(self, rule_ids):
+        '''
+            Removes the rules with the given ids (returned by add) from the visualization, unknown
+            ids are ignored
+        '''
+        removed = [self._rules.pop(rule_id) for rule_id in np.atleast_1d(rule_ids).tolist() if rule_id in self._rules]
+        if not removed:
+            return
+        rule_nodes = np.array([rule_node for rule_node, _ in removed], dtype=np.int64)
+        edges = np.concatenate([rule_edges for _, rule_edges in removed])
+        sources, targets = self._sources[edges], self._targets[edges]
+        np.subtract.at(self._degrees, sources, 1)
+        np.subtract.at(self._degrees, targets, 1)
+        self._edge_x[edges] = np.nan
+        self._edge_y[edges] = np.nan
+        self._edge_slots.release(edges)
+
+        #Entities left without rules are dropped with the rules
+        ends = np.unique(np.concatenate([sources, targets]))
+        orphans = ends[(self._node_types[ends] == ENTITY_NODE) & (self._degrees[ends] == 0)]
+        self._entity_nodes[self._node_codes[orphans]] = _FREE_NODE
+        self._release_nodes(np.concatenate([rule_nodes, orphans]))
+        self._patch_figures()
+
+    def update(self, added=None, removed=None) -> np.ndarray:
+        '''
+            Applies a delta: removes the rule ids in removed, then adds the added rules and
+            returns their ids
+        '''
+        if removed is not None:
+            self.remove(removed)
+        return self.add(added if added is not None else [])
+
+    def relayout(self, iterations: int = None):
+        '''
+            Lays the whole graph out again, starting from the current positions of the nodes
+            that have one, to undo the drift of many small deltas
+        '''
+        nodes = np.flatnonzero(self._node_types != _FREE_NODE)
+        edges = self._alive_edges()
+        local = np.full(len(self._node_types), -1, dtype=np.int64)
+        local[nodes] = np.arange(len(nodes))
+        initial_positions = self._positions[nodes]
+        unplaced = np.isnan(initial_positions).any(axis=1)
+        if unplaced.all():
+            initial_positions = None
+        else:
+            initial_positions[unplaced] = self._generator.uniform(-1, 1, (int(unplaced.sum()), 2))
+        self._positions[nodes] = force_directed_layout(
+            len(nodes), local[self._sources[edges]], local[self._targets[edges]],
+            iterations=self.iterations if iterations is None else iterations, seed=self.seed, initial_positions=initial_positions,
+        )
+        self._update_edge_coordinates(edges)
+        self._patch_figures()
+
+    def _alive_edges(self) -> np.ndarray:
+        edges = np.ones(self._edge_slots.used, dtype=bool)
+        edges[self._edge_slots.free] = False
+        return np.flatnonzero(edges)
+
+    def _update_edge_coordinates(self, edges: np.ndarray):
+        '''
+            Recomputes the drawn coordinates of the given edge slots from the node positions
+        '''
+        sources, targets = self._sources[edges], self._targets[edges]
+        self._edge_x[edges, 0] = self._positions[sources, 0]
+        self._edge_x[edges, 1] = self._positions[targets, 0]
+        self._edge_y[edges, 0] = self._positions[sources, 1]
+        self._edge_y[edges, 1] = self._positions[targets, 1]
+
+    def _graph_arrays(self):
+        '''
+            The trace arrays of the graph figure, indexed by slot, free slots are NaN/None so
+            plotly skips them. These are views of the slot arrays, nothing is recomputed
+        '''
+        used = self._edge_slots.used
+        edge_x = self._edge_x[:used].ravel()
+        edge_y = self._edge_y[:used].ravel()
+        return edge_x, edge_y, self._positions[:, 0], self._positions[:, 1], self._node_text, self._degrees
+
+    def graph_figure(self):
+        '''
+            The adjacency graph figure (see adjacency_graph_plotly), created on the first call
+            and patched in place after every delta
+        '''
+        if self._graph_figure is None:
+            self._graph_figure = adjacency_graph_figure(*self._graph_arrays())
+        return self._graph_figure
+
+    def scatter_figure(self):
+        '''
+            The adjacency scatter figure (see adjacency_scatter_plot), created on the first call
+            and patched in place after every delta
+        '''
+        if self._scatter_figure is None:
+            self._scatter_figure = adjacency_scatter_figure(self._scatter_x, self._scatter_y, self._scatter_size)
+        return self._scatter_figure
+
+    def _patch_figures(self):
+        '''
+            Hands the slot arrays to the figures. Plotly validates and copies every array it is
+            given, so this step is proportional to the number of slots rather than the delta
+        '''
+        if self._graph_figure is not None:
+            edge_x, edge_y, node_x, node_y, node_text, node_degrees = self._graph_arrays()
+            with self._graph_figure.batch_update():
+                edge_trace, node_trace = self._graph_figure.data
+                edge_trace.x, edge_trace.y = edge_x, edge_y
+                node_trace.x, node_trace.y, node_trace.text = node_x, node_y, node_text
+                node_trace.marker.color = node_degrees
+        if self._scatter_figure is not None:
+            with self._scatter_figure.batch_update():
+                scatter_trace = self._scatter_figure.data[0]
+                scatter_trace.x, scatter_trace.y = self._scatter_x, self._scatter_y
+                scatter_trace.marker.size = self._scatter_size
+
+    def node_positions(self) -> dict:
+        '''
+            The position of every node by label (rule id or item)
+        '''
+        nodes = np.flatnonzero(self._node_types != _FREE_NODE)
+        return dict(zip(self._node_labels[nodes].tolist(), self._positions[nodes].tolist()))
+
+    def edges(self) -> list:
+        '''
+            The (source, target) label pairs of the edges
+        '''
+        edges = self._alive_edges()
+        labels = self._node_labels
+        return list(zip(labels[self._sources[edges]].tolist(), labels[self._targets[edges]].tolist()))
+
+    def __repr__(self):
+        return "IncrementalVisualizer({} rules, {} nodes, {} edges)".format(self.rule_count, self.node_count, self.edge_count)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inverted index from items to the rules they appear in, for fast drilldown
+queries over a rule collection.
+"""
+
+from typing import Iterable
+
+import numpy as np
+
+from PyARMViz.RuleSet import RuleSet, as_rule_set
+
+_SIDES = ("lhs", "rhs", "either")
+
+
+def _postings(indptr: np.ndarray, indices: np.ndarray, item_count: int):
+    '''
+        Inverts a CSR encoded list of itemsets, returns the (indptr, rule_ids) pair holding the
+        sorted ids of the rules containing every item code
+    '''
+    rule_ids = np.repeat(np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr))
+    codes = np.asarray(indices, dtype=np.int64)
+    #A stable sort by item keeps the rule ids of every item in ascending order
+    order = np.argsort(codes, kind="stable")
+    codes, rule_ids = codes[order], rule_ids[order]
+    #An item repeated within a rule is posted once
+    keep = np.ones(len(codes), dtype=bool)
+    keep[1:] = (codes[1:] != codes[:-1]) | (rule_ids[1:] != rule_ids[:-1])
+    codes, rule_ids = codes[keep], rule_ids[keep]
+    postings_indptr = np.zeros(item_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=item_count), out=postings_indptr[1:])
+    return postings_indptr, rule_ids
+
+
+class ItemIndex(object):
+    """
+    Maps every item of a rule collection to the sorted ids (positions) of
+    the rules it appears in, separately for the antecedents and consequents.
+
+    Built once in a few vectorized passes, item queries are then answered by
+    intersecting (all items) or merging (any item) the sorted id arrays
+    instead of scanning the rules.
+    """
+
+    def __init__(self, rules):
+        '''
+            Indexes a list of Rules or a RuleSet
+
+            >>> from PyARMViz.Rule import Rule
+            >>> index = ItemIndex([Rule(('a', 'b'), ('c',), 5, 10, 20, 100), Rule(('c',), ('a',), 5, 20, 10, 100)])
+            >>> index.query(['a'])
+            array([0, 1])
+            >>> index.query(['a', 'c'], side='lhs', match='any')
+            array([0, 1])
+            >>> index.subset(['b'])
+            RuleSet(1 rules, 3 items)
+        '''
+        self.rule_set = as_rule_set(rules)
+        item_count = len(self.rule_set.vocabulary)
+        self._postings = {
+            "lhs": _postings(self.rule_set.lhs_indptr, self.rule_set.lhs_indices, item_count),
+            "rhs": _postings(self.rule_set.rhs_indptr, self.rule_set.rhs_indices, item_count),
+        }
+
+    def rules_with(self, item, side: str = "either") -> np.ndarray:
+        '''
+            The sorted ids of the rules with item in their lhs, rhs or either side
+        '''
+        if side not in _SIDES:
+            raise ValueError("side must be one of {}".format(_SIDES))
+        code = self.rule_set.vocabulary.get(item)
+        if code is None:
+            return np.zeros(0, dtype=np.int64)
+        if side == "either":
+            return np.union1d(self._posting("lhs", code), self._posting("rhs", code))
+        return self._posting(side, code)
+
+    def _posting(self, side: str, code: int) -> np.ndarray:
+        indptr, rule_ids = self._postings[side]
+        return rule_ids[indptr[code]:indptr[code + 1]]
+
+    def query(self, items: Iterable, side: str = "either", match: str = "all") -> np.ndarray:
+        '''
+            The sorted ids of the rules containing all (AND) or any (OR) of the items, on the lhs,
+            the rhs or either side
+        '''
+        postings = [self.rules_with(item, side) for item in items]
+        if match == "all":
+            if not postings:
+                return np.arange(len(self.rule_set), dtype=np.int64)
+            #Intersect the shortest arrays first so the intermediate results stay small
+            postings.sort(key=len)
+            matches = postings[0]
+            for posting in postings[1:]:
+                if len(matches) == 0:
+                    break
+                matches = np.intersect1d(matches, posting, assume_unique=True)
+            return matches
+        if match == "any":
+            if not postings:
+                return np.zeros(0, dtype=np.int64)
+            return np.unique(np.concatenate(postings))
+        raise ValueError("match must be all or any")
+
+    def subset(self, items: Iterable, side: str = "either", match: str = "all") -> RuleSet:
+        '''
+            The matching rules of query as a RuleSet, in their original order, ready for the plot
+            functions
+        '''
+        return self.rule_set.take(self.query(items, side, match))
+
+    def item_counts(self, side: str = "either") -> dict:
+        '''
+            The number of rules every item appears in
+        '''
+        if side not in _SIDES:
+            raise ValueError("side must be one of {}".format(_SIDES))
+        items = self.rule_set.vocabulary.items
+        if side == "either":
+            return {item: len(self.rules_with(item)) for item in items}
+        indptr, _ = self._postings[side]
+        return dict(zip(items, np.diff(indptr).tolist()))
+
+    def __repr__(self):
+        return "ItemIndex({} rules, {} items)".format(len(self.rule_set), len(self.rule_set.vocabulary))
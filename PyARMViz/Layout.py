@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Force directed graph layout on NumPy arrays, with a cache of computed
+layouts keyed by graph fingerprint.
+"""
+
+import hashlib
+import logging
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+
+class LayoutCache(object):
+    """
+    A least recently used cache of node positions keyed by graph fingerprint.
+    """
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, fingerprint: str):
+        positions = self._entries.get(fingerprint)
+        if positions is not None:
+            self._entries.move_to_end(fingerprint)
+        return positions
+
+    def put(self, fingerprint: str, positions: np.ndarray):
+        self._entries[fingerprint] = positions
+        self._entries.move_to_end(fingerprint)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __contains__(self, fingerprint):
+        return fingerprint in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+#Cache shared by the plot functions, see clear_layout_cache
+LAYOUT_CACHE = LayoutCache()
+
+
+def clear_layout_cache():
+    LAYOUT_CACHE.clear()
+
+
+def graph_fingerprint(node_labels, sources: np.ndarray, targets: np.ndarray, **parameters) -> str:
+    '''
+        Hashes the node labels, the edges and the layout parameters into a key identifying
+        a layout
+    '''
+    digest = hashlib.sha1()
+    digest.update(repr(list(node_labels)).encode('utf-8'))
+    digest.update(np.ascontiguousarray(sources, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(targets, dtype=np.int64).tobytes())
+    digest.update(repr(sorted(parameters.items())).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _grid_repulsion(positions: np.ndarray, k: float, grid_size: int) -> np.ndarray:
+    '''
+        Approximates the pairwise repulsion k^2 / d between all nodes on a grid_size x grid_size
+        grid: every node is repelled by the center of mass of every other occupied cell,
+        weighted by the number of nodes in it, as felt at the center of its own cell, and by
+        the center of mass of the other nodes in its own cell
+
+        The cost is quadratic in the number of occupied cells and linear in the nodes
+    '''
+    low = positions.min(axis=0)
+    extent = np.maximum(positions.max(axis=0) - low, 1e-9)
+    cells_xy = np.minimum((positions - low) / extent * grid_size, grid_size - 1).astype(np.int64)
+    cells = cells_xy[:, 0] * grid_size + cells_xy[:, 1]
+
+    cell_count = grid_size * grid_size
+    masses = np.bincount(cells, minlength=cell_count).astype(np.float64)
+    sums = np.stack([
+        np.bincount(cells, weights=positions[:, 0], minlength=cell_count),
+        np.bincount(cells, weights=positions[:, 1], minlength=cell_count),
+    ], axis=1)
+    occupied = np.flatnonzero(masses)
+    masses = masses[occupied]
+    sums = sums[occupied]
+    centers = sums / masses[:, None]
+
+    #Far field between occupied cells, excluding each cell's own mass
+    delta_x = centers[:, 0, None] - centers[None, :, 0]
+    delta_y = centers[:, 1, None] - centers[None, :, 1]
+    weights = masses[None, :] / np.maximum(delta_x * delta_x + delta_y * delta_y, 1e-6)
+    np.fill_diagonal(weights, 0)
+    far_field = np.stack([(delta_x * weights).sum(axis=1), (delta_y * weights).sum(axis=1)], axis=1)
+
+    #Near field from the rest of the node's own cell
+    own_cell = np.searchsorted(occupied, cells)
+    own_mass = masses[own_cell]
+    others = own_mass - 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        own_center = (sums[own_cell] - positions) / others[:, None]
+    near_delta = np.where((others > 0)[:, None], positions - own_center, 0)
+    near_distance_squared = np.maximum((near_delta ** 2).sum(axis=1), 1e-6)
+    near_field = near_delta * (others / near_distance_squared)[:, None]
+
+    return k * k * (far_field[own_cell] + near_field)
+
+
+def force_directed_layout(node_count: int, sources: np.ndarray, targets: np.ndarray, iterations: int = 100, seed: int = 0,
+                          tolerance: float = 1e-4, grid_size: int = None, initial_positions: np.ndarray = None) -> np.ndarray:
+    '''
+        Fruchterman-Reingold style layout on NumPy arrays
+
+        Repulsion is approximated on a grid (see _grid_repulsion), attraction d^2 / k is applied
+        along the edges given as source and target node index arrays. The layout stops after
+        iterations steps, or earlier once the mean node displacement drops below tolerance
+
+        Returns an array of node_count x 2 positions scaled to [-1, 1], like nx.spring_layout
+    '''
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    if node_count == 0:
+        return np.zeros((0, 2))
+    if initial_positions is None:
+        positions = np.random.default_rng(seed).random((node_count, 2))
+    else:
+        positions = np.array(initial_positions, dtype=np.float64)
+    if node_count == 1:
+        return np.zeros((1, 2))
+    if grid_size is None:
+        grid_size = max(2, min(24, int(math.sqrt(node_count) / 2)))
+
+    k = math.sqrt(1.0 / node_count)
+    temperature = 0.1 * max(np.ptp(positions, axis=0).max(), 1e-9)
+    cooling = temperature / (iterations + 1)
+    for iteration in range(iterations):
+        displacement = _grid_repulsion(positions, k, grid_size)
+
+        delta = positions[sources] - positions[targets]
+        distance = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), 1e-9)
+        attraction = delta * (distance / k)[:, None]
+        for axis in (0, 1):
+            displacement[:, axis] -= np.bincount(sources, weights=attraction[:, axis], minlength=node_count)
+            displacement[:, axis] += np.bincount(targets, weights=attraction[:, axis], minlength=node_count)
+
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 1e-9)
+        step = displacement * (np.minimum(length, temperature) / length)[:, None]
+        positions += step
+        temperature -= cooling
+        movement = np.sqrt((step ** 2).sum(axis=1)).mean()
+        if movement < tolerance:
+            logging.debug("Layout converged after %s iterations", iteration + 1)
+            break
+
+    return _rescale(positions)
+
+
+def _rescale(positions: np.ndarray) -> np.ndarray:
+    '''
+        Centers the positions on the origin and scales the largest coordinate to 1
+    '''
+    positions = positions - positions.mean(axis=0)
+    scale = np.abs(positions).max()
+    if scale > 0:
+        positions = positions / scale
+    return positions
+
+
+def cached_force_directed_layout(node_labels, sources: np.ndarray, targets: np.ndarray, cache: LayoutCache = LAYOUT_CACHE, **parameters) -> np.ndarray:
+    '''
+        force_directed_layout that reuses the positions computed earlier for the same graph
+        and parameters, so re-plotting the same rules skips the layout step
+    '''
+    node_labels = list(node_labels)
+    fingerprint = graph_fingerprint(node_labels, sources, targets, **parameters)
+    positions = cache.get(fingerprint) if cache is not None else None
+    if positions is None:
+        positions = force_directed_layout(len(node_labels), sources, targets, **parameters)
+        if cache is not None:
+            cache.put(fingerprint, positions)
+    else:
+        logging.debug("Reusing cached layout %s", fingerprint)
+    return positions
+
+
+def refine_layout(positions: np.ndarray, movable: np.ndarray, sources: np.ndarray, targets: np.ndarray, k: float = None,
+                  iterations: int = 30, tolerance: float = 1e-4) -> np.ndarray:
+    '''
+        Moves only the movable nodes of an existing layout, in place, leaving every other node
+        where it is
+
+        Attraction is applied along the given edges (those touching the movable nodes) and
+        repulsion between the nodes of their neighbourhood (the movable nodes and the other ends
+        of the edges), so the cost depends on the size of that neighbourhood and not on the
+        whole graph. k defaults to the ideal edge length of positions scaled to [-1, 1]
+    '''
+    movable = np.unique(np.asarray(movable, dtype=np.int64))
+    if len(movable) == 0:
+        return positions
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    if k is None:
+        k = 2 * math.sqrt(1.0 / len(positions))
+
+    local = np.union1d(movable, np.concatenate([sources, targets]))
+    local_positions = positions[local]
+    local_movable = np.searchsorted(local, movable)
+    local_sources = np.searchsorted(local, sources)
+    local_targets = np.searchsorted(local, targets)
+    local_count = len(local)
+    grid_size = max(2, min(24, int(math.sqrt(local_count) / 2)))
+
+    temperature = 0.1 * max(np.ptp(local_positions, axis=0).max(), k)
+    cooling = temperature / (iterations + 1)
+    for iteration in range(iterations):
+        displacement = _grid_repulsion(local_positions, k, grid_size) if local_count > 1 else np.zeros((local_count, 2))
+
+        delta = local_positions[local_sources] - local_positions[local_targets]
+        distance = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), 1e-9)
+        attraction = delta * (distance / k)[:, None]
+        for axis in (0, 1):
+            displacement[:, axis] -= np.bincount(local_sources, weights=attraction[:, axis], minlength=local_count)
+            displacement[:, axis] += np.bincount(local_targets, weights=attraction[:, axis], minlength=local_count)
+
+        displacement = displacement[local_movable]
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 1e-9)
+        step = displacement * (np.minimum(length, temperature) / length)[:, None]
+        local_positions[local_movable] += step
+        temperature -= cooling
+        if np.sqrt((step ** 2).sum(axis=1)).mean() < tolerance:
+            break
+
+    positions[movable] = local_positions[local_movable]
+    return positions
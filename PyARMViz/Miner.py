@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Frequent itemset and association rule mining over a vertical bitset
+representation of the transactions.
+"""
+
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List
+
+import numpy as np
+
+from PyARMViz.Rule import Rule
+from PyARMViz.RuleSet import ItemVocabulary
+
+#Lookup table for the fallback popcount on NumPy versions without bitwise_count
+_BYTE_POPCOUNTS = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def popcount_rows(bitmaps: np.ndarray) -> np.ndarray:
+    '''
+        Counts the set bits along the last axis of a uint64 bitmap array
+    '''
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bitmaps).sum(axis=-1, dtype=np.int64)
+    as_bytes = np.ascontiguousarray(bitmaps).view(np.uint8)
+    return _BYTE_POPCOUNTS[as_bytes].sum(axis=-1, dtype=np.int64)
+
+
+class VerticalBitmaps(object):
+    """
+    A vertical representation of a transaction database: one packed uint64
+    bitmap per item, with bit t set when transaction t contains the item.
+    """
+
+    def __init__(self, vocabulary: ItemVocabulary, bitmaps: np.ndarray, num_transactions: int):
+        self.vocabulary = vocabulary
+        self.bitmaps = bitmaps
+        self.num_transactions = num_transactions
+
+    @classmethod
+    def from_transactions(cls, transactions: Iterable, vocabulary: ItemVocabulary = None):
+        '''
+            Builds the bitmaps in a single pass over any iterable of transactions (each an iterable
+            of hashable items), so generators are consumed without being materialized
+
+            If a vocabulary is provided only its items are indexed and other items are ignored
+        '''
+        if vocabulary is None:
+            vocabulary = ItemVocabulary()
+            lookup = vocabulary.intern
+        else:
+            lookup = vocabulary.get
+
+        item_codes = []
+        transaction_ids = []
+        num_transactions = 0
+        for transaction_id, transaction in enumerate(transactions):
+            codes = {lookup(item) for item in transaction}
+            codes.discard(None)
+            item_codes.extend(codes)
+            transaction_ids.extend(itertools.repeat(transaction_id, len(codes)))
+            num_transactions = transaction_id + 1
+
+        item_codes = np.array(item_codes, dtype=np.int64)
+        transaction_ids = np.array(transaction_ids, dtype=np.int64)
+        word_count = max(1, (num_transactions + 63) // 64)
+        bitmaps = np.zeros((len(vocabulary), word_count), dtype=np.uint64)
+        bits = np.left_shift(np.uint64(1), (transaction_ids & 63).astype(np.uint64))
+        np.bitwise_or.at(bitmaps, (item_codes, transaction_ids >> 6), bits)
+        return cls(vocabulary, bitmaps, num_transactions)
+
+    def counts(self) -> np.ndarray:
+        '''
+            The number of transactions containing each item
+        '''
+        return popcount_rows(self.bitmaps)
+
+    def itemset_bitmap(self, codes) -> np.ndarray:
+        '''
+            The bitmap of the transactions containing every item of the itemset
+        '''
+        codes = list(codes)
+        if not codes:
+            return full_bitmap(self.num_transactions, self.bitmaps.shape[1])
+        return np.bitwise_and.reduce(self.bitmaps[codes], axis=0)
+
+
+def full_bitmap(num_transactions: int, word_count: int) -> np.ndarray:
+    '''
+        A bitmap with the bits of every transaction set, the support set of the empty itemset
+    '''
+    bitmap = np.zeros(word_count, dtype=np.uint64)
+    full_words, remainder = divmod(num_transactions, 64)
+    bitmap[:full_words] = np.iinfo(np.uint64).max
+    if remainder:
+        bitmap[full_words] = np.uint64((1 << remainder) - 1)
+    return bitmap
+
+
+def _chunks(size: int, count: int) -> List:
+    '''
+        Splits range(size) into at most count contiguous (start, stop) chunks
+    '''
+    bounds = np.linspace(0, size, max(1, count) + 1).astype(np.int64)
+    return [(start, stop) for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()) if stop > start]
+
+
+#Arrays shared with the worker processes of the process pool mode, set once per worker
+_worker_state = {}
+
+
+def _init_worker(*state):
+    _worker_state['state'] = state
+
+
+def _apriori_candidates(frequent: List) -> tuple:
+    '''
+        Joins the sorted frequent k-itemsets sharing their first k-1 items, and prunes candidates
+        with an infrequent k-subset
+
+        Returns the candidates, the row of their prefix itemset in frequent and the extending item
+    '''
+    frequent_set = set(frequent)
+    candidates = []
+    parent_rows = []
+    extension_items = []
+    for _, group in itertools.groupby(enumerate(frequent), key=lambda pair: pair[1][:-1]):
+        group = list(group)
+        for position, (row, itemset) in enumerate(group):
+            for _, other in group[position + 1:]:
+                candidate = itemset + other[-1:]
+                #Dropping either of the last two items gives the joined itemsets, check the others
+                if all(candidate[:index] + candidate[index + 1:] in frequent_set for index in range(len(candidate) - 2)):
+                    candidates.append(candidate)
+                    parent_rows.append(row)
+                    extension_items.append(other[-1])
+    return candidates, np.array(parent_rows, dtype=np.int64), np.array(extension_items, dtype=np.int64)
+
+
+def _count_candidates(parents: np.ndarray, item_bitmaps: np.ndarray, parent_rows: np.ndarray, extension_items: np.ndarray) -> np.ndarray:
+    return popcount_rows(parents[parent_rows] & item_bitmaps[extension_items])
+
+
+def _count_candidates_worker(parent_rows: np.ndarray, extension_items: np.ndarray) -> np.ndarray:
+    parents, item_bitmaps = _worker_state['state']
+    return _count_candidates(parents, item_bitmaps, parent_rows, extension_items)
+
+
+def _apriori(item_bitmaps: np.ndarray, min_count: float, max_length: int, n_jobs: int, chunk_size: int = 8192) -> dict:
+    '''
+        Level-wise search, every candidate bitmap is the AND of its prefix itemset's bitmap and
+        the bitmap of the extending item. In process pool mode the candidates of each level are
+        counted in chunks across the workers
+    '''
+    item_counts = popcount_rows(item_bitmaps)
+    frequent_items = np.flatnonzero(item_counts >= min_count)
+    frequent = [(code,) for code in frequent_items.tolist()]
+    itemset_counts = {itemset: int(item_counts[itemset[0]]) for itemset in frequent}
+    parents = item_bitmaps[frequent_items]
+
+    length = 1
+    while frequent and (max_length is None or length < max_length):
+        candidates, parent_rows, extension_items = _apriori_candidates(frequent)
+        if not candidates:
+            break
+        chunks = _chunks(len(candidates), max(n_jobs * 4, len(candidates) // chunk_size))
+        if n_jobs > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(n_jobs, initializer=_init_worker, initargs=(parents, item_bitmaps)) as executor:
+                counts = list(executor.map(
+                    _count_candidates_worker,
+                    [parent_rows[start:stop] for start, stop in chunks],
+                    [extension_items[start:stop] for start, stop in chunks],
+                ))
+        else:
+            counts = [
+                _count_candidates(parents, item_bitmaps, parent_rows[start:stop], extension_items[start:stop])
+                for start, stop in chunks
+            ]
+        counts = np.concatenate(counts)
+
+        keep = np.flatnonzero(counts >= min_count)
+        frequent = [candidates[index] for index in keep.tolist()]
+        for itemset, count in zip(frequent, counts[keep].tolist()):
+            itemset_counts[itemset] = count
+        parents = parents[parent_rows[keep]] & item_bitmaps[extension_items[keep]]
+        length += 1
+        logging.debug("Found %s frequent itemsets of length %s", len(frequent), length)
+    return itemset_counts
+
+
+def _eclat_class(bitmaps: np.ndarray, codes: np.ndarray, index: int, min_count: float, max_length: int) -> List:
+    '''
+        Depth first search of the frequent itemsets starting with codes[index], extended only
+        by the items that follow it
+    '''
+    itemsets = []
+    stack = [((int(codes[index]),), bitmaps[index], bitmaps[index + 1:], codes[index + 1:])]
+    while stack:
+        prefix, prefix_bitmap, extension_bitmaps, extension_codes = stack.pop()
+        if len(extension_codes) == 0 or (max_length is not None and len(prefix) >= max_length):
+            continue
+        intersections = extension_bitmaps & prefix_bitmap
+        counts = popcount_rows(intersections)
+        keep = np.flatnonzero(counts >= min_count)
+        intersections = intersections[keep]
+        kept_codes = extension_codes[keep]
+        for position, (code, count) in enumerate(zip(kept_codes.tolist(), counts[keep].tolist())):
+            itemset = prefix + (code,)
+            itemsets.append((itemset, count))
+            stack.append((itemset, intersections[position], intersections[position + 1:], kept_codes[position + 1:]))
+    return itemsets
+
+
+def _eclat_class_worker(index: int) -> List:
+    bitmaps, codes, min_count, max_length = _worker_state['state']
+    return _eclat_class(bitmaps, codes, index, min_count, max_length)
+
+
+def _eclat(item_bitmaps: np.ndarray, min_count: float, max_length: int, n_jobs: int) -> dict:
+    '''
+        Depth first search over prefix equivalence classes. In process pool mode each class
+        (all itemsets starting with a given frequent item) is mined by a worker
+    '''
+    item_counts = popcount_rows(item_bitmaps)
+    codes = np.flatnonzero(item_counts >= min_count)
+    bitmaps = item_bitmaps[codes]
+    itemset_counts = {(code,): int(item_counts[code]) for code in codes.tolist()}
+
+    if n_jobs > 1 and len(codes) > 1:
+        with ProcessPoolExecutor(n_jobs, initializer=_init_worker, initargs=(bitmaps, codes, min_count, max_length)) as executor:
+            classes = executor.map(_eclat_class_worker, range(len(codes)))
+            for itemsets in classes:
+                itemset_counts.update(itemsets)
+    else:
+        for index in range(len(codes)):
+            itemset_counts.update(_eclat_class(bitmaps, codes, index, min_count, max_length))
+    return itemset_counts
+
+
+#Frequent itemset search algorithms available by name
+MINING_ALGORITHMS = {
+    'apriori': _apriori,
+    'eclat': _eclat,
+}
+#Used by both mine_itemsets and mine_rules, the two find the same itemsets and Eclat is faster
+DEFAULT_MINING_ALGORITHM = 'eclat'
+
+
+def _sorted_vertical(transactions) -> tuple:
+    '''
+        Builds the bitmaps (unless given) and orders their rows by item, so that itemsets
+        and the rules derived from them list their items in sorted order where possible
+    '''
+    if isinstance(transactions, VerticalBitmaps):
+        vertical = transactions
+    else:
+        vertical = VerticalBitmaps.from_transactions(transactions)
+    items = vertical.vocabulary.items
+    try:
+        order = sorted(range(len(items)), key=items.__getitem__)
+    except TypeError:
+        order = list(range(len(items)))
+    return vertical, np.array(order, dtype=np.int64)
+
+
+def _mine_codes(vertical: VerticalBitmaps, order: np.ndarray, min_support: float, max_length: int, algorithm: str, n_jobs: int) -> dict:
+    if algorithm not in MINING_ALGORITHMS:
+        raise ValueError("Unknown mining algorithm {}".format(algorithm))
+    min_count = min_support * vertical.num_transactions
+    return MINING_ALGORITHMS[algorithm](vertical.bitmaps[order], min_count, max_length, n_jobs)
+
+
+def mine_itemsets(transactions, min_support: float = 0.05, max_length: int = None, algorithm: str = DEFAULT_MINING_ALGORITHM, n_jobs: int = 1) -> dict:
+    '''
+        Finds the itemsets appearing in at least min_support of the transactions
+
+        Accepts any iterable of transactions (for example the List[List] returned by
+        datasets.load_shopping_transactions, or a generator) or prebuilt VerticalBitmaps
+
+        Returns a dictionary from itemset (a sorted tuple of items) to transaction count
+    '''
+    vertical, order = _sorted_vertical(transactions)
+    itemset_counts = _mine_codes(vertical, order, min_support, max_length, algorithm, n_jobs)
+    decode = vertical.vocabulary.decode
+    return {tuple(decode(order[list(codes)].tolist())): count for codes, count in itemset_counts.items()}
+
+
+def mine_rules(transactions, min_support: float = 0.05, min_confidence: float = 0.7, max_length: int = None,
+               algorithm: str = DEFAULT_MINING_ALGORITHM, n_jobs: int = 1) -> List[Rule]:
+    '''
+        Mines association rules from transactions with a bitset based Apriori or Eclat search
+
+        Parameters
+        ----------
+        transactions : iterable or VerticalBitmaps
+            The transactions, each an iterable of hashable items.
+        min_support : float
+            Minimum fraction of transactions containing all items of a rule.
+        min_confidence : float
+            Minimum confidence of a rule.
+        max_length : int
+            Maximum number of items (antecedents plus consequents) of a rule.
+        algorithm : str
+            'apriori' (breadth first) or 'eclat' (depth first, the default).
+        n_jobs : int
+            Number of worker processes used to count candidates, 1 runs in process.
+
+        Returns the rules with all four counts filled in
+    '''
+    vertical, order = _sorted_vertical(transactions)
+    itemset_counts = _mine_codes(vertical, order, min_support, max_length, algorithm, n_jobs)
+    logging.info("Found %s frequent itemsets in %s transactions", len(itemset_counts), vertical.num_transactions)
+
+    items = vertical.vocabulary.items
+    ranked_items = [items[code] for code in order.tolist()]
+    num_transactions = vertical.num_transactions
+
+    rules = []
+    for itemset in sorted(itemset_counts, key=lambda itemset: (len(itemset), itemset)):
+        if len(itemset) < 2:
+            continue
+        count_full = itemset_counts[itemset]
+        for lhs_length in range(1, len(itemset)):
+            for lhs in itertools.combinations(itemset, lhs_length):
+                count_lhs = itemset_counts[lhs]
+                if count_full / count_lhs < min_confidence:
+                    continue
+                rhs = tuple(code for code in itemset if code not in lhs)
+                rules.append(Rule(
+                    tuple(ranked_items[code] for code in lhs),
+                    tuple(ranked_items[code] for code in rhs),
+                    count_full,
+                    count_lhs,
+                    itemset_counts[rhs],
+                    num_transactions,
+                ))
+    return rules
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per stage instrumentation of the plot builders.
+
+The plot functions wrap their stages (grouping rules by axis count, axis
+ordering, dimension building, layout, figure assembly, display, ...) in
+stage() blocks. Outside of a profile_stages() block these return a shared
+no-op context, so instrumentation costs one function call per stage.
+
+    with profile_stages() as stats:
+        adjacency_parallel_coordinate_plot(rules, show_flag=False)
+    print(stats.report())
+
+With trace_memory every stage also records its peak traced allocation
+(tracemalloc) above the allocation at its start.
+"""
+
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+#The StageStats being recorded into, None when profiling is off
+_active_stats = None
+
+
+class StageRecord(object):
+    """
+    The accumulated wall time, call count and item count of one stage, and
+    the largest peak allocation of its calls when memory is traced.
+    """
+
+    __slots__ = ("calls", "seconds", "items", "peak_bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.items = 0
+        self.peak_bytes = 0
+
+    def as_dict(self) -> dict:
+        return dict(calls=self.calls, seconds=self.seconds, items=self.items, peak_bytes=self.peak_bytes)
+
+    def __repr__(self):
+        return "StageRecord(calls={}, seconds={:.6f}, items={}, peak_bytes={})".format(
+            self.calls, self.seconds, self.items, self.peak_bytes)
+
+
+class StageStats(object):
+    """
+    StageRecords by stage name, in the order the stages first ran.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.stages = {}
+        self.trace_memory = trace_memory
+        #The stages currently running, outermost first, while memory is traced
+        self._open_stages = []
+
+    def record(self, stage: str, seconds: float, items: int = 0, peak_bytes: int = 0):
+        stage_record = self.stages.get(stage)
+        if stage_record is None:
+            stage_record = self.stages[stage] = StageRecord()
+        stage_record.calls += 1
+        stage_record.seconds += seconds
+        stage_record.items += items
+        stage_record.peak_bytes = max(stage_record.peak_bytes, peak_bytes)
+
+    def _fold_peak(self) -> int:
+        '''
+            Folds the traced peak since the last fold into every running stage and resets it,
+            so nested stages each see their own peak. Returns the current traced allocation
+        '''
+        current, peak = tracemalloc.get_traced_memory()
+        for running_stage in self._open_stages:
+            running_stage.peak = max(running_stage.peak, peak)
+        tracemalloc.reset_peak()
+        return current
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(stage_record.seconds for stage_record in self.stages.values())
+
+    def as_dict(self) -> dict:
+        return {stage: stage_record.as_dict() for stage, stage_record in self.stages.items()}
+
+    def report(self) -> str:
+        '''
+            The stages as a text table
+        '''
+        lines = ["{:<24}{:>8}{:>12}{:>12}{:>14}".format("stage", "calls", "seconds", "items", "peak bytes")]
+        for stage, stage_record in self.stages.items():
+            lines.append("{:<24}{:>8}{:>12.4f}{:>12}{:>14}".format(stage, stage_record.calls, stage_record.seconds,
+                                                                  stage_record.items, stage_record.peak_bytes))
+        return "\n".join(lines)
+
+    def __getitem__(self, stage: str) -> StageRecord:
+        return self.stages[stage]
+
+    def __contains__(self, stage: str):
+        return stage in self.stages
+
+    def __iter__(self):
+        return iter(self.stages)
+
+    def __repr__(self):
+        return "StageStats({})".format(", ".join(self.stages))
+
+
+class _Stage(object):
+    """
+    Times one run of a stage into a StageStats, items can be counted with
+    add_items while the stage runs.
+    """
+
+    __slots__ = ("stats", "name", "items", "start", "start_bytes", "peak")
+
+    def __init__(self, stats: StageStats, name: str, items: int):
+        self.stats = stats
+        self.name = name
+        self.items = items
+        self.start_bytes = self.peak = 0
+
+    def add_items(self, items: int):
+        self.items += items
+
+    def __enter__(self):
+        if self.stats.trace_memory:
+            self.start_bytes = self.peak = self.stats._fold_peak()
+            self.stats._open_stages.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        if self.stats.trace_memory:
+            self.stats._fold_peak()
+            self.stats._open_stages.remove(self)
+        self.stats.record(self.name, seconds, self.items, self.peak - self.start_bytes)
+        return False
+
+
+class _NullStage(object):
+    """
+    The stage returned while profiling is off, it records nothing.
+    """
+
+    __slots__ = ()
+
+    def add_items(self, items: int):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str, items: int = 0):
+    '''
+        Context manager timing the block as the stage name, when profiling is on
+    '''
+    if _active_stats is None:
+        return _NULL_STAGE
+    return _Stage(_active_stats, name, items)
+
+
+def profiling_enabled() -> bool:
+    return _active_stats is not None
+
+
+@contextmanager
+def profile_stages(callback=None, trace_memory: bool = False):
+    '''
+        Records the stages run inside the block into the StageStats it yields, and calls
+        callback with those stats when the block ends. Blocks can be nested, each records
+        only the stages run while it is the innermost one
+
+        With trace_memory the peak allocation of every stage is recorded too, tracemalloc is
+        started for the block if it is not already tracing (which slows the stages down)
+    '''
+    global _active_stats
+    stats = StageStats(trace_memory)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    previous = _active_stats
+    _active_stats = stats
+    try:
+        yield stats
+    finally:
+        _active_stats = previous
+        if started_tracing:
+            tracemalloc.stop()
+        if callback is not None:
+            callback(stats)
@@ -1,50 +1,148 @@
 import plotly.graph_objects as go
-import networkx as nx
 import numpy as np
 
 from PyARMViz import Rule
+from PyARMViz.RuleSet import RuleSet, as_rule_set
+from PyARMViz.AxisOrdering import AxisOrderingEngine, encode_axis_pairs, count_crossings
+from PyARMViz.AdjacencyGraph import adjacency_graph_csr
+from PyARMViz.GraphExport import write_adjacency_graph
+from PyARMViz.Layout import cached_force_directed_layout, force_directed_layout
+from PyARMViz.Profiling import stage
+from PyARMViz.Filtering import itemset_groups, itemset_ids
+from PyARMViz.Figures import adjacency_graph_figure, adjacency_scatter_figure, itemset_label
 
 from typing import List
-import itertools
 
+import gzip
 import logging
+from concurrent.futures import ProcessPoolExecutor
 
-import math
 
-def metadata_scatter_plot(rules:List, allow_compound_flag:bool=False):
+def metadata_scatter_plot(rules:List, allow_compound_flag:bool=False, render_mode:str='auto', webgl_threshold:int=10000,
+                          density_threshold:int=200000, bins:int=200, hover_top_k:int=1000, lift_aggregate:str='mean',
+                          show_flag:bool=True):
     '''
     Visualizes the distribution of Association Rule Confidence, Support and Lift in the form of a
     Plotly scatterplot
+    
+    Accepts either a list of Rules or a RuleSet, metrics are computed for all rules at once
+    
+    The render_mode picks how the rules are drawn
+        svg: one SVG marker and hover label per rule (the default below webgl_threshold rules)
+        webgl: one WebGL marker per rule, hover labels only for the hover_top_k rules by lift
+            (the default up to density_threshold rules)
+        density: the support x confidence plane is binned into bins x bins cells colored by the
+            mean or max lift (lift_aggregate) of their rules, with the hover_top_k rules by lift
+            overlaid, so the figure size does not depend on the number of rules
+    
+    The figure is displayed unless show_flag is False, and returned either way
     '''
-    id_list = []
-    confidence_list = []
-    lift_list = []
-    support_list = []
+    with stage("encode_rules") as encoding:
+        rule_set = as_rule_set(rules)
+        encoding.add_items(len(rule_set))
     
-    for rule in rules:
-        #Discard compound rules (either pre or antecedents) if indicated 
-        if allow_compound_flag == False:
-            if len(rule.rhs) > 1 or len(rule.lhs) > 1:
-                continue
-
-        confidence_list.append(rule.confidence)
-        lift_list.append(rule.lift)
-        support_list.append(rule.support)
-        hover_text = "{} => {}, Lift: {}".format(rule.lhs, rule.rhs, rule.lift)
-        id_list.append(hover_text)
-        
-    colorbar=dict(
-        tick0=0,
-        dtick=1
-    )
+    #Discard compound rules (either pre or antecedents) if indicated 
+    if allow_compound_flag == False:
+        rule_set = rule_set.take((rule_set.lhs_lengths <= 1) & (rule_set.rhs_lengths <= 1))
+
+    if render_mode == 'auto':
+        if len(rule_set) <= webgl_threshold:
+            render_mode = 'svg'
+        elif len(rule_set) <= density_threshold:
+            render_mode = 'webgl'
+        else:
+            render_mode = 'density'
+
+    with stage("compute_metrics", len(rule_set)):
+        confidence_list = rule_set.confidence
+        lift_list = rule_set.lift
+        support_list = rule_set.support
+    marker = {'color': lift_list, 'colorscale': "purp", 'colorbar':{'title': 'Lift'}}
     
+    with stage("build_figure", len(rule_set)):
+        if render_mode == 'svg':
+            id_list = [
+                "{} => {}, Lift: {}".format(rule.lhs, rule.rhs, lift)
+                for rule, lift in zip(rule_set, lift_list.tolist())
+            ]
+            data = [go.Scatter(x=support_list, y=confidence_list, text = id_list, mode='markers', marker=marker,)]
+        elif render_mode == 'webgl':
+            data = [
+                go.Scattergl(x=support_list, y=confidence_list, mode='markers', marker=marker, hoverinfo='skip', name='Rules'),
+                _top_rules_hover_trace(rule_set, hover_top_k),
+            ]
+        elif render_mode == 'density':
+            data = [
+                _metadata_density_trace(support_list, confidence_list, lift_list, bins, lift_aggregate),
+                _top_rules_hover_trace(rule_set, hover_top_k),
+            ]
+        else:
+            raise ValueError("Unknown render mode {}".format(render_mode))
     
-    fig = go.Figure(data=go.Scatter(x=support_list, y=confidence_list, text = id_list, mode='markers', marker={'color': lift_list, 'colorscale': "purp", 'colorbar':{'title': 'Lift'}},))
-    fig.update_layout(title="Association Rules Strength Distribution", xaxis_title="Support", yaxis_title="Confidence", xaxis={'autorange':'reversed'},)
-    fig.show()
+        fig = go.Figure(data=data)
+        fig.update_layout(title="Association Rules Strength Distribution", xaxis_title="Support", yaxis_title="Confidence", xaxis={'autorange':'reversed'}, showlegend=False)
+    if show_flag:
+        with stage("show"):
+            fig.show()
     return fig
 
-def adjacency_parallel_category_plot(rules:List):
+def _top_rules_hover_trace(rule_set:RuleSet, top_k:int):
+    '''
+        Builds a WebGL trace holding the top_k rules by lift with their hover labels, so that only
+        those rules need to be decoded and labeled
+    '''
+    lift = np.nan_to_num(rule_set.lift, nan=-np.inf)
+    top_k = min(top_k, len(rule_set))
+    top_rows = np.argpartition(-lift, top_k - 1)[:top_k] if top_k > 0 else np.empty(0, dtype=np.int64)
+    top_rows = top_rows[np.argsort(-lift[top_rows], kind='stable')]
+    top_rules = rule_set.take(top_rows)
+    
+    id_list = [
+        "{} => {}, Lift: {}".format(rule.lhs, rule.rhs, lift)
+        for rule, lift in zip(top_rules, top_rules.lift.tolist())
+    ]
+    return go.Scattergl(
+        x=top_rules.support, y=top_rules.confidence, text=id_list, mode='markers', name='Top rules by lift',
+        marker={'color': top_rules.lift, 'colorscale': "purp", 'showscale': False, 'line': {'width': 1, 'color': 'black'}},
+    )
+
+def _metadata_density_trace(support:np.ndarray, confidence:np.ndarray, lift:np.ndarray, bins:int, lift_aggregate:str):
+    '''
+        Bins the rules on the support x confidence plane and reduces the lift of the rules in
+        each cell with the mean or max, returns a heatmap trace of the cells
+    '''
+    valid = np.isfinite(support) & np.isfinite(confidence) & np.isfinite(lift)
+    support, confidence, lift = support[valid], confidence[valid], lift[valid]
+    
+    support_edges = np.histogram_bin_edges(support, bins=bins)
+    confidence_edges = np.histogram_bin_edges(confidence, bins=bins)
+    #Digitize to cell indices, the last edge is included in the last cell as in histogram2d
+    support_cells = np.clip(np.searchsorted(support_edges, support, side='right') - 1, 0, bins - 1)
+    confidence_cells = np.clip(np.searchsorted(confidence_edges, confidence, side='right') - 1, 0, bins - 1)
+    cells = confidence_cells * bins + support_cells
+    
+    counts = np.bincount(cells, minlength=bins * bins)
+    if lift_aggregate == 'mean':
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = np.bincount(cells, weights=lift, minlength=bins * bins) / counts
+    elif lift_aggregate == 'max':
+        values = np.full(bins * bins, -np.inf)
+        np.maximum.at(values, cells, lift)
+    else:
+        raise ValueError("Unknown lift aggregate {}".format(lift_aggregate))
+    values[counts == 0] = np.nan
+    
+    return go.Heatmap(
+        x=(support_edges[:-1] + support_edges[1:]) / 2,
+        y=(confidence_edges[:-1] + confidence_edges[1:]) / 2,
+        z=values.reshape(bins, bins),
+        customdata=counts.reshape(bins, bins),
+        colorscale="purp",
+        colorbar={'title': '{} Lift'.format(lift_aggregate.capitalize())},
+        hovertemplate="Support: %{x}<br>Confidence: %{y}<br>Lift: %{z}<br>Rules: %{customdata}<extra></extra>",
+    )
+
+def adjacency_parallel_category_plot(rules:List, show_flag:bool=True, n_jobs:int=1, max_categories:int=None, aggregate:str='mean'):
     '''
         Visualizes the antecedents and consequents of each association rules by drawing lines
         representing each rule across identical vertical axes representing the potential items
@@ -52,32 +150,41 @@ def adjacency_parallel_category_plot(rules:List):
         
         Similar to parallel coordinate plot but more readible for small numbers of categorical
         points
+        
+        Rules following the same path across the axes are drawn as one path weighted by their
+        number and colored by their mean or max confidence (aggregate), so the figure grows
+        with the number of distinct paths rather than the number of rules. With max_categories
+        each axis shows at most that many categories, its rarest items folded into "other"
+        
+        One figure is drawn per number of antecedents, the figures are returned as a list and
+        displayed unless show_flag is False. With n_jobs above 1 the figures are built
+        concurrently in that many worker processes
     '''
-    unique_entities_by_axis_count = []
-    rules_by_axis_count = []
-    for rule in rules:
-        axis_required = len(rule.lhs) + 1 
-
-        #Filter out rules with multiple consequents
-        #TODO consider allowing multiple consequents
-        if len(rule.rhs) == 1:
-            #If the rules_by_axis_count list lacks a slot for the current number of antacedents, add them
-            while len(rules_by_axis_count) < axis_required - 1:
-                rules_by_axis_count.append([])
-                unique_entities_by_axis_count.append(set())
-            
-            #Add the rule and the entities found in its atecedents and consequents to their respective structure
-            rules_by_axis_count[axis_required - 2].append(rule)
-            unique_entities_by_axis_count[axis_required - 2] = unique_entities_by_axis_count[axis_required - 2].union(set(rule.lhs), set(rule.rhs))
+    if aggregate not in ('mean', 'max'):
+        raise ValueError("Unknown aggregate {}".format(aggregate))
+    rule_set = as_rule_set(rules)
+    groups = _group_rules_by_axis_count(rule_set)
+    figures = _map_axis_count_groups(_parallel_category_figure, groups, n_jobs, max_categories, aggregate)
+    if show_flag:
+        for fig in figures:
+            with stage("show"):
+                fig.show()
+    return figures
 
-    axis_counter = 2
-    for rules, unique_entities in zip(rules_by_axis_count, unique_entities_by_axis_count): 
-        line_color = list(map(lambda rule: round(rule.confidence, 2), rules))
-    
-        dimensions = _parallel_category_builder(rules, axis_counter)
+def _parallel_category_figure(rules:RuleSet, unique_entities:np.ndarray, axis_count:int, max_categories:int=None, aggregate:str='mean'):
+    '''
+        Builds the parallel category figure of one group of rules with axis_count axis
+    '''
+    dimensions, counts, line_color = _parallel_category_builder(rules, unique_entities, axis_count, max_categories, aggregate)
+    with stage("build_figure", len(counts)):
         fig = go.Figure(data=
             go.Parcats(
                 dimensions = dimensions,
+                counts = counts,
+                line = dict(color = line_color,
+                            colorscale = [[0,'white'], [1,'red']],
+                            showscale = True,
+                            colorbar = {'title': '{} Confidence'.format(aggregate.capitalize())}),
             )
         )
 
@@ -85,11 +192,9 @@ def adjacency_parallel_category_plot(rules:List):
             plot_bgcolor = 'white',
             paper_bgcolor = 'white'
         )
-
-        fig.show()    
-        axis_counter += 1    
+    return fig
     
-def adjacency_parallel_coordinate_plot(rules:List):
+def adjacency_parallel_coordinate_plot(rules:List, axis_ordering:AxisOrderingEngine=None, show_flag:bool=True, n_jobs:int=1):
     '''
         Visualizes the antecedents and consequents of each rule by drawing lines
         representing each rule across identical vertical axis representing the
@@ -97,37 +202,41 @@ def adjacency_parallel_coordinate_plot(rules:List):
         
         Has the advantage of making it easier to visualize compound rules over
         scatterplots
+        
+        The order of the entities on the axis is chosen by axis_ordering, an AxisOrderingEngine
+        which can be configured with its strategies, budget and seed. Every number of antecedents
+        is searched with its own seed derived from the engine seed, so the orders do not depend
+        on n_jobs
+        
+        One figure is drawn per number of antecedents, the figures are returned as a list and
+        displayed unless show_flag is False. With n_jobs above 1 the groups are ordered and built
+        concurrently in that many worker processes, so the total time approaches that of the
+        slowest group
     '''
-    
-    #These two structures track the rules and entities therein based on the number of antecedents/consequents involved
-    #Allows us to visualize each number separately in a parallel coordinate graph
-    #Note these are indexed 0->2 axis on (no association rule can have less then 2)
-    unique_entities_by_axis_count = []
-    rules_by_axis_count = []
-    for rule in rules:
-        axis_required = len(rule.lhs) + 1 
-            
-        #Filter out rules with multiple consequents
-        #TODO consider allowing multiple consequents
-        if len(rule.rhs) == 1:
-            #If the rules_by_axis_count list lacks a slot for the current number of antacedents, add them
-            while len(rules_by_axis_count) < axis_required - 1:
-                rules_by_axis_count.append([])
-                unique_entities_by_axis_count.append(set())
-            
-            #Add the rule and the entities found in its atecedents and consequents to their respective structure
-            rules_by_axis_count[axis_required - 2].append(rule)
-            unique_entities_by_axis_count[axis_required - 2] = unique_entities_by_axis_count[axis_required - 2].union(set(rule.lhs), set(rule.rhs))
+    if axis_ordering is None:
+        axis_ordering = AxisOrderingEngine()
+    rule_set = as_rule_set(rules)
+    groups = _group_rules_by_axis_count(rule_set)
+    figures = _map_axis_count_groups(_parallel_coordinate_figure, groups, n_jobs, axis_ordering)
+    if show_flag:
+        for fig in figures:
+            with stage("show"):
+                fig.show()
+    return figures
 
-    
-    axis_counter = 2
-    for rules, unique_entities in zip(rules_by_axis_count, unique_entities_by_axis_count): 
-        unique_entities = list(unique_entities)
-        unique_entities = _parallel_coord_axis_optimizer(rules, unique_entities, axis_counter)
-    
-        line_color = list(map(lambda rule: round(rule.confidence, 2), rules))
-    
-        dimensions = _paracoord_builder(rules, unique_entities, axis_counter)
+def _parallel_coordinate_figure(rules:RuleSet, unique_entities:np.ndarray, axis_count:int, axis_ordering:AxisOrderingEngine):
+    '''
+        Orders the axis of one group of rules with axis_count axis and builds its parallel
+        coordinate figure
+    '''
+    with stage("order_axes", len(unique_entities)):
+        unique_entities = _parallel_coord_axis_optimizer(rules, unique_entities, axis_count, axis_ordering)
+
+    line_color = np.round(rules.confidence, 2)
+
+    with stage("build_dimensions", len(rules)):
+        dimensions = _paracoord_builder(rules, unique_entities, axis_count)
+    with stage("build_figure", len(rules)):
         fig = go.Figure(data=
             go.Parcoords(
                 line = dict(color = line_color,
@@ -140,41 +249,84 @@ def adjacency_parallel_coordinate_plot(rules:List):
             plot_bgcolor = 'white',
             paper_bgcolor = 'white'
         )
+    return fig
+
+def _map_axis_count_groups(function, groups, n_jobs:int, *arguments):
+    '''
+        Calls function(rules, unique_entities, axis_count, *arguments) on every group returned by
+        _group_rules_by_axis_count and returns the results in axis count order
+        
+        With n_jobs above 1 the groups run in a pool of worker processes, the largest submitted
+        first so the slowest group starts right away. Stages run in the workers are not profiled
+    '''
+    rules_by_axis_count, unique_entities_by_axis_count = groups
+    calls = [(rules, unique_entities, axis_count) for axis_count, (rules, unique_entities)
+             in enumerate(zip(rules_by_axis_count, unique_entities_by_axis_count), start=2)]
+    if n_jobs > 1 and len(calls) > 1:
+        with ProcessPoolExecutor(min(n_jobs, len(calls))) as executor:
+            futures = {}
+            for index in sorted(range(len(calls)), key=lambda index: len(calls[index][0]), reverse=True):
+                futures[index] = executor.submit(function, *calls[index], *arguments)
+            return [futures[index].result() for index in range(len(calls))]
+    return [function(*call, *arguments) for call in calls]
 
-        fig.show()    
-        axis_counter += 1
+def _group_rules_by_axis_count(rule_set:RuleSet):
+    '''
+        Groups the rules with a single consequent by the number of axis they need (antecedents
+        plus one), returns the RuleSet and the entity codes (in vocabulary order) of every group,
+        indexed from 2 axis on (no association rule can have less then 2)
+        
+        This allows us to visualize each number separately in a parallel plot
+    '''
+    unique_entities_by_axis_count = []
+    rules_by_axis_count = []
+    with stage("group_rules") as grouping:
+        #Filter out rules with multiple consequents
+        #TODO consider allowing multiple consequents
+        lhs_lengths = rule_set.lhs_lengths
+        single_consequent = (rule_set.rhs_lengths == 1) & (lhs_lengths >= 1)
+        max_antecedents = int(lhs_lengths[single_consequent].max()) if single_consequent.any() else 0
+        for antecedent_count in range(1, max_antecedents + 1):
+            rules = rule_set.take(single_consequent & (lhs_lengths == antecedent_count))
+            rules_by_axis_count.append(rules)
+            unique_entities_by_axis_count.append(np.union1d(rules.lhs_indices, rules.rhs_indices))
+            grouping.add_items(len(rules))
+    return rules_by_axis_count, unique_entities_by_axis_count
+
+def _axis_codes(rules:RuleSet, axis_count:int):
+    '''
+        The entity code of every rule on every axis, as a rules x axis_count matrix, for a group
+        of rules with axis_count - 1 antecedents and one consequent
+    '''
+    antecedents = np.asarray(rules.lhs_indices).reshape(len(rules), axis_count - 1)
+    return np.column_stack([antecedents, rules.rhs_indices])
 
-def _parallel_coord_axis_optimizer(rules:List, unique_entities:List, axis_count:int):
+def _entity_positions(axis_codes:np.ndarray, ordered_entities:np.ndarray):
+    '''
+        Replaces every entity code by its position in ordered_entities
     '''
-        Accepts the rules, a list of the entities to be included in each axis, and the number of axis
+    sorter = np.argsort(ordered_entities)
+    return sorter[np.searchsorted(ordered_entities, axis_codes, sorter=sorter)]
+
+def _parallel_coord_axis_optimizer(rules:RuleSet, unique_entities:np.ndarray, axis_count:int, axis_ordering:AxisOrderingEngine=None):
+    '''
+        Accepts the rules, an array of the entity codes to be included in each axis, and the number of axis
         
-        Runs simulations to identify the optimum configuration of entities on those axis in order to
-        avoid crossings
+        Runs the axis ordering engine (heuristic sweeps, local swaps and annealing by default) to
+        identify the optimum configuration of entities on those axis in order to avoid crossings
         
-        Returns that optimum configuration as an ordered list
+        Returns that optimum configuration as an ordered array of entity codes
     '''
-    #Generate all possible combinations of entities on the axis and calculate their expected crossings
-    max_iterations = 1000
-    cross_counts = []
-    permutations = set()
-    
-    iteration_counter = 0
-    maximum_permutations = math.factorial(len(unique_entities))
-    while len(permutations) < maximum_permutations and len(permutations) < max_iterations:
-        perm = np.random.permutation(unique_entities)
-        permutations.add(tuple(perm))
-        iteration_counter += 1
-    permutations = list(permutations)
-    logging.info("Finished computing {} random axis entity arrangement permutations in {} iterations".format(len(permutations), iteration_counter))
+    if axis_ordering is None:
+        axis_ordering = AxisOrderingEngine()
+    axis_positions = _entity_positions(_axis_codes(rules, axis_count), unique_entities)
+    axis_pairs = [(axis_positions[:, axis_index], axis_positions[:, axis_index + 1]) for axis_index in range(axis_count - 1)]
+    #Each axis count gets its own random stream, reproducible whichever process runs it
+    seed = None if axis_ordering.seed is None else [axis_ordering.seed, axis_count]
+    result = axis_ordering.optimize(axis_pairs, len(unique_entities), seed=seed)
     
-    for permutation in permutations:
-        cross_count = _parallel_coord_cross_counter(rules, permutation, axis_count)
-        cross_counts.append(cross_count)
-        logging.debug("Counted {} crossings for {}".format(cross_count, permutation))
-    
-    optimum_cross_count = min(cross_counts)
-    optimum_axis_configuration = permutations[cross_counts.index(optimum_cross_count)]
-    logging.info("Found optimum solution {} with {} crossings".format(optimum_axis_configuration, min(cross_counts)))
+    optimum_axis_configuration = unique_entities[result.order]
+    logging.info("Reduced crossings from %s to %s in %s evaluations", result.initial_crossings, result.crossings, result.evaluations)
     return optimum_axis_configuration
 
 def _parallel_coord_cross_counter(rules:List, unique_entities_permutation:List, axis_count:int):
@@ -186,39 +338,18 @@ def _parallel_coord_cross_counter(rules:List, unique_entities_permutation:List,
         
         Returns the number of crossings
     '''
+    axis_pairs = encode_axis_pairs(rules, unique_entities_permutation, axis_count)
+    positions = np.arange(len(unique_entities_permutation))
+    return count_crossings(axis_pairs, positions)
     
-    #Iterates through consecutive axis pairs
-    cross_count = 0
-    for axis_index in range(0, axis_count - 1):
-        #Generate all possible pairs of relevant rules and test if they cross for this axis
-        combinations = itertools.combinations(rules, 2)
-        for rule1, rule2 in combinations:
-            if axis_index < (axis_count - 1) - 1:
-                src_axis_position1 = rule1.lhs[axis_index]
-                dst_axis_position1 = rule2.lhs[axis_index]
-                src_axis_position2 = rule1.lhs[axis_index + 1]
-                dst_axis_position2 = rule2.lhs[axis_index + 1]
-            #Handles the final axis pair which involves the consequent
-            else:
-                src_axis_position1 = rule1.lhs[axis_index]
-                dst_axis_position1 = rule2.lhs[axis_index]
-                src_axis_position2 = rule1.rhs[0]
-                dst_axis_position2 = rule2.rhs[0]
-            
-            src_delta = unique_entities_permutation.index(src_axis_position1) - unique_entities_permutation.index(src_axis_position2)
-            dst_delta = unique_entities_permutation.index(dst_axis_position1) - unique_entities_permutation.index(dst_axis_position2)
-            
-            #A cross exists only if the edges terminations swap being above/below the other on each side
-            if src_delta < 0 and dst_delta > 0:
-                cross_count += 1
-            elif src_delta > 0 and dst_delta < 0:
-                cross_count += 1        
-    return cross_count
-    
-def _paracoord_builder(rules:List, unique_entities:List, axis_count:int):
+def _paracoord_builder(rules:RuleSet, unique_entities:np.ndarray, axis_count:int):
     '''
-        Helper function to generate list of unique entities across all provided rules to build axis_index 
+        Helper function to build the axis of a group of rules, placing the entities in the order
+        of unique_entities (entity codes), whose labels are only decoded for the tick text
     '''
+    #Note the values are the index of each entity on the axis
+    axis_positions = _entity_positions(_axis_codes(rules, axis_count), unique_entities)
+    ticktext = rules.vocabulary.decode(unique_entities.tolist())
     axis_objects = []
     for axis_index in range(0,axis_count):
         if axis_index < axis_count - 1:
@@ -227,158 +358,145 @@ def _paracoord_builder(rules:List, unique_entities:List, axis_count:int):
         else: 
             label = "Consequent"
             
-            
-        #Iterate through rules, identify those relevant to that axis_index, and collect their values
-        values = []
-        for rule in rules:
-            #For all but the last axis_index, pull value from the left hand antacedents
-            if axis_index < axis_count - 1:
-                #If available, pull out the antacedent for this axis_index, otherwise add placeholder
-                if axis_index > len(rule.lhs) - 1:
-                    values.append(None)
-                else:
-                    #Note field contains the index of the value on the axis_index
-                    values.append(unique_entities.index(rule.lhs[axis_index]))
-            #Otherwise add the right hand consequent
-            else:
-                #Note field contains the index of the value on the axis_index
-                values.append(unique_entities.index(rule.rhs[0]))
-            
         #Compose the plot object for this axis_index
         axis_object = dict(
             range = [0, len(unique_entities)], 
             label=label,
-            ticktext=unique_entities,
+            ticktext=ticktext,
             tickvals=list(range(0, len(unique_entities))), 
-            values=values
+            values=axis_positions[:, axis_index]
         )
         axis_objects.append(axis_object)
     
     return axis_objects
 
-def _parallel_category_builder(rules:List, axis_count:int):
+def _fold_rare_categories(axis_positions:np.ndarray, entity_count:int, max_categories:int):
     '''
-        Helper function to generate list of unique entities across all provided rules to build axis_index 
+        Keeps the max_categories - 1 most frequent entities of every axis with more than
+        max_categories of them, replacing the others by entity_count (the "other" category)
     '''
-    axis_objects = []
-    for axis_index in range(0,axis_count):
-        if axis_index < axis_count - 1:
-            antacedent_count = abs(axis_index - (axis_count - 1))
-            label = "Antacedent {}".format(antacedent_count)
-        else: 
-            label = "Consequent"
-            
-        #Iterate through rules, identify those relevant to that axis_index, and collect their values
-        values = []
-        for rule in rules:
-            #For all but the last axis_index, pull value from the left hand antacedents
+    folded = axis_positions.copy()
+    for axis_index in range(axis_positions.shape[1]):
+        frequencies = np.bincount(axis_positions[:, axis_index], minlength=entity_count)
+        if np.count_nonzero(frequencies) <= max_categories:
+            continue
+        kept = np.zeros(entity_count, dtype=bool)
+        kept[np.argsort(-frequencies, kind='stable')[:max(max_categories - 1, 0)]] = True
+        folded[~kept[axis_positions[:, axis_index]], axis_index] = entity_count
+    return folded
+
+def _parallel_category_builder(rules:RuleSet, unique_entities:np.ndarray, axis_count:int, max_categories:int=None, aggregate:str='mean'):
+    '''
+        Helper function to build the axis of a group of rules, the labels of the unique_entities
+        (entity codes) are decoded once and gathered for every distinct path
+        
+        Identical paths across the axis are grouped, returns the axis objects along with the
+        number of rules and the mean or max confidence of every path, in order of first
+        appearance
+    '''
+    with stage("aggregate_paths", len(rules)):
+        axis_positions = _entity_positions(_axis_codes(rules, axis_count), unique_entities)
+        if max_categories is not None:
+            axis_positions = _fold_rare_categories(axis_positions, len(unique_entities), max_categories)
+        path_ids, first = itemset_groups(axis_positions, return_index=True)
+        counts = np.bincount(path_ids, minlength=len(first))
+        _, _, line_color, _ = _confidence_cells(path_ids, np.zeros(len(path_ids), dtype=np.int64), rules.confidence, 1, aggregate)
+
+    with stage("build_dimensions", len(rules)):
+        labels = np.empty(len(unique_entities) + 1, dtype=object)
+        labels[:-1] = rules.vocabulary.decode(unique_entities.tolist())
+        labels[-1] = "other"
+        axis_labels = labels[axis_positions[first]]
+        axis_objects = []
+        for axis_index in range(0,axis_count):
             if axis_index < axis_count - 1:
-                #If available, pull out the antacedent for this axis_index, otherwise add placeholder
-                if axis_index > len(rule.lhs) - 1:
-                    values.append(None)
-                else:
-                    #Note field contains the index of the value on the axis_index
-                    values.append(rule.lhs[axis_index])
-            #Otherwise add the right hand consequent
-            else:
-                #Note field contains the index of the value on the axis_index
-                values.append(rule.rhs[0])
-        #Compose the plot object for this axis_index
-        axis_object = dict(
-            label=label,
-            values=values,
-        )
-        axis_objects.append(axis_object)
+                antacedent_count = abs(axis_index - (axis_count - 1))
+                label = "Antacedent {}".format(antacedent_count)
+            else: 
+                label = "Consequent"
+                
+            #Compose the plot object for this axis_index
+            axis_object = dict(
+                label=label,
+                values=axis_labels[:, axis_index],
+            )
+            axis_objects.append(axis_object)
     
-    return axis_objects
+    return axis_objects, counts, line_color
 
-def adjacency_graph_plotly(rules:Rule):
+def adjacency_graph_plotly(rules:List[Rule], layout:str='fast', iterations:int=100, seed:int=0, use_cache:bool=True, show_flag:bool=True):
     '''
-        This is the plotly version of the 
+        This is the plotly version of the adjacency graph, drawing the directional network graph
+        of the rules (see _adjacency_graph_generator) with a force directed layout
+        
+        The layout is either 'fast', the NumPy force directed layout of PyARMViz.Layout which
+        stops once converged and is cached by graph fingerprint (unless use_cache is False) so
+        re-plotting the same rules skips it, or 'spring', the NetworkX spring layout
+        
+        The figure is displayed unless show_flag is False, and returned either way
     '''
-    graph = _adjacency_graph_generator(rules)
-    pos = nx.spring_layout(graph, iterations=100)
+    #The layout works on the adjacency arrays directly, NetworkX is only needed for its own layout
+    with stage("build_graph") as graph_building:
+        adjacency = adjacency_graph_csr(rules)
+        nodes = adjacency.node_labels
+        edge_count = adjacency.edge_count
+        sources = adjacency.sources
+        targets = adjacency.targets
+        graph_building.add_items(edge_count)
     
-    edge_x = []
-    edge_y = []
-    for edge in graph.edges():
-        src_node_ind = edge[0]
-        dst_node_ind = edge[1]
-        x0, y0 =  pos[src_node_ind]
-        x1, y1 =  pos[dst_node_ind]
-        edge_x.append(x0)
-        edge_x.append(x1)
-        edge_x.append(None)
-        edge_y.append(y0)
-        edge_y.append(y1)
-        edge_y.append(None)
-
-    edge_trace = go.Scatter(
-        x=edge_x, y=edge_y,
-        line=dict(width=0.5, color='#888'),
-        hoverinfo='none',
-        mode='lines')
-
-    node_text = []
-    node_x = []
-    node_y = []
-    for node in graph.nodes():
-        x, y = pos[node]
-        node_x.append(x)
-        node_y.append(y)
-        node_text.append(node)
-
-
-    node_trace = go.Scatter(
-        x=node_x, y=node_y,
-        mode='markers',
-        hoverinfo='text',
-        text=node_text,
-        marker=dict(
-            showscale=True,
-            # colorscale options
-            #'Greys' | 'YlGnBu' | 'Greens' | 'YlOrRd' | 'Bluered' | 'RdBu' |
-            #'Reds' | 'Blues' | 'Picnic' | 'Rainbow' | 'Portland' | 'Jet' |
-            #'Hot' | 'Blackbody' | 'Earth' | 'Electric' | 'Viridis' |
-            colorscale='YlGnBu',
-            reversescale=True,
-            color=[],
-            size=10,
-            colorbar=dict(
-                thickness=15,
-                title='Node Connections',
-                xanchor='left',
-                titleside='right'
-            ),
-            line_width=2))
-    fig = go.Figure(data=[edge_trace, node_trace],
-         layout=go.Layout(
-            title='<br>Network graph made with Python',
-            titlefont_size=16,
-            showlegend=False,
-            hovermode='closest',
-            margin=dict(b=20,l=5,r=5,t=40),
-            annotations=[ dict(
-                text="Python code: <a href='https://plotly.com/ipython-notebooks/network-graphs/'> https://plotly.com/ipython-notebooks/network-graphs/</a>",
-                showarrow=False,
-                xref="paper", yref="paper",
-                x=0.005, y=-0.002 ) ],
-            xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-            yaxis=dict(showgrid=False, zeroline=False, showticklabels=False))
-            )
-    fig.show()
+    with stage("layout", len(nodes)):
+        if layout == 'fast':
+            parameters = dict(iterations=iterations, seed=seed)
+            if use_cache:
+                pos = cached_force_directed_layout(nodes, sources, targets, **parameters)
+            else:
+                pos = force_directed_layout(len(nodes), sources, targets, **parameters)
+        elif layout == 'spring':
+            import networkx as nx
+            spring_pos = nx.spring_layout(adjacency.to_networkx(), iterations=iterations, seed=seed)
+            pos = np.array([spring_pos[node] for node in nodes]).reshape(len(nodes), 2)
+        else:
+            raise ValueError("Unknown layout {}".format(layout))
+    
+    with stage("build_figure", len(nodes)):
+        #Each edge is drawn as source, destination, gap
+        edge_x = np.full(3 * edge_count, np.nan)
+        edge_y = np.full(3 * edge_count, np.nan)
+        edge_x[0::3] = pos[sources, 0]
+        edge_x[1::3] = pos[targets, 0]
+        edge_y[0::3] = pos[sources, 1]
+        edge_y[1::3] = pos[targets, 1]
+        node_degrees = np.bincount(sources, minlength=len(nodes)) + np.bincount(targets, minlength=len(nodes))
+        fig = adjacency_graph_figure(edge_x, edge_y, pos[:, 0], pos[:, 1], [str(node) for node in nodes], node_degrees)
+    if show_flag:
+        with stage("show"):
+            fig.show()
+    return fig
 
-def adjacency_graph_gephi(rules:List[Rule], output_path:str=None):
+def adjacency_graph_gephi(rules:List[Rule], output_path:str=None, streaming:bool=False, compress:bool=False):
     '''
     Uses networkX to produce a directed graph representation of the generated
     association rules (both 1-to-1 and compound).
     
     Either displays the resulting graph in the browser with Plotly or 
     export it as a graphml file to be viewed in a program like Gephi
+    
+    With streaming the nodes and edges are written straight from the rules (GEXF, or GraphML
+    if output_path ends in .graphml) without building the graph in memory, and None is
+    returned. With compress the output is gzip compressed
     '''
+    if streaming:
+        write_adjacency_graph(rules, output_path, compress=compress)
+        return None
+    
+    import networkx as nx
     graph = _adjacency_graph_generator(rules)
-    nx.write_gexf(graph, output_path)
-    logging.debug("Output rule graph to {}".format(output_path))
+    if compress:
+        with gzip.open(output_path, 'wb') as output_file:
+            nx.write_gexf(graph, output_file)
+    else:
+        nx.write_gexf(graph, output_path)
+    logging.debug("Output rule graph to %s", output_path)
     return graph
     
 def _adjacency_graph_generator(rules:List[Rule]):
@@ -389,51 +507,187 @@ def _adjacency_graph_generator(rules:List[Rule]):
         
         The resulting graph can then be visualized through a variety of means 
     '''
-    graph = nx.DiGraph()
-    for index, rule in enumerate(rules):
-        graph.add_node (index, Weight=int(rule.confidence*10), type="Association_Rule")
-
-        for entity in rule.lhs:
-            graph.add_node(entity, Weight=1, type="Entity")
-            graph.add_edge(entity, index, Normalized_Lift=int(rule.lift*10))
-            
-        for entity in rule.rhs:
-            graph.add_node(entity, Weight=1, type="Entity")
-            graph.add_edge(index, entity, Normalized_Lift=int(rule.lift*10))
+    #Entities are interned to integer ids and the graph is built in bulk from the adjacency arrays
+    with stage("build_graph") as graph_building:
+        adjacency = adjacency_graph_csr(rules)
+        graph_building.add_items(adjacency.edge_count)
+    with stage("build_networkx", adjacency.edge_count):
+        graph = adjacency.to_networkx()
     
-    logging.debug("Generated NetworkX graph for {} rules with {} nodes".format(len(rules), len(graph.nodes)))
+    logging.debug("Generated NetworkX graph for %s rules with %s nodes", len(rules), len(graph.nodes))
     return graph
     
 
 
-def adjacency_scatter_plot(rules:List[Rule], notebook_flag:bool = False):
+def _itemset_label_table(indptr:np.ndarray, indices:np.ndarray, vocabulary):
+    '''
+        Numbers the distinct itemsets of a CSR encoded list, returns the number of every itemset
+        and the label of every number, decoding each distinct itemset once
+    '''
+    ids, first = itemset_ids(indptr, indices)
+    labels = np.empty(len(first), dtype=object)
+    labels[:] = [itemset_label(vocabulary.decode(indices[indptr[position]:indptr[position + 1]].tolist())) for position in first.tolist()]
+    return ids, labels
+
+def _itemset_labels(indptr:np.ndarray, indices:np.ndarray, vocabulary):
+    '''
+        The label of every itemset of a CSR encoded list with its items in their own order,
+        decoding each distinct ordered itemset once
+    '''
+    lengths = np.diff(indptr)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    ordered = np.full((len(lengths), int(lengths.max()) if len(lengths) else 0), -1, dtype=np.int64)
+    ordered[rows, np.arange(len(rows)) - indptr[rows]] = indices
+    ids, first = itemset_groups(ordered, return_index=True)
+    labels = np.empty(len(first), dtype=object)
+    labels[:] = [itemset_label(vocabulary.decode(indices[indptr[position]:indptr[position + 1]].tolist())) for position in first.tolist()]
+    return labels[ids]
+
+def _confidence_cells(row_ids:np.ndarray, column_ids:np.ndarray, confidence:np.ndarray, column_count:int, aggregate:str):
+    '''
+        Reduces the confidence of the rules falling in each cell of the antecedent x consequent
+        matrix (given by their itemset numbers) to its max or mean, returns the rows, columns,
+        values and rule counts of the occupied cells
+    '''
+    cells, cell_index = np.unique(row_ids * column_count + column_ids, return_inverse=True)
+    counts = np.bincount(cell_index, minlength=len(cells))
+    if aggregate == 'max':
+        values = np.full(len(cells), -np.inf)
+        np.maximum.at(values, cell_index, confidence)
+    elif aggregate == 'mean':
+        values = np.bincount(cell_index, weights=confidence, minlength=len(cells)) / counts
+    else:
+        raise ValueError("Unknown aggregate {}".format(aggregate))
+    return cells // column_count, cells % column_count, values, counts
+
+def _top_n(ids:np.ndarray, counts:np.ndarray, id_count:int, top_n:int):
+    '''
+        The ids holding the most rules, at most top_n of them (all if top_n is None), ties
+        going to the first seen
+    '''
+    totals = np.bincount(ids, weights=counts, minlength=id_count)
+    kept = np.argsort(-totals, kind='stable')
+    if top_n is not None:
+        kept = kept[:top_n]
+    return np.sort(kept)
+
+def _barycenter_ranks(groups:np.ndarray, positions:np.ndarray, weights:np.ndarray, count:int, current:np.ndarray):
+    '''
+        Ranks every group by the weighted mean position of its members, groups without members
+        and ties keep their current rank order
+    '''
+    sums = np.bincount(groups, weights=weights * positions, minlength=count)
+    totals = np.bincount(groups, weights=weights, minlength=count)
+    barycenters = np.divide(sums, totals, out=current.astype(np.float64), where=totals > 0)
+    ranks = np.empty(count)
+    ranks[np.lexsort((current, barycenters))] = np.arange(count)
+    return ranks
+
+def _seriate(rows:np.ndarray, columns:np.ndarray, values:np.ndarray, row_count:int, column_count:int, sweeps:int=8):
+    '''
+        Orders the rows and columns of a sparse matrix so that its heavy cells gather along the
+        diagonal, by alternating barycenter sweeps (as in the axis ordering heuristics): columns
+        move to the weighted mean rank of their rows, then rows to that of their columns
+        
+        Returns the row and column orders, each sweep costs a pass over the occupied cells
+    '''
+    weights = values + 1e-9
+    row_ranks = np.arange(row_count, dtype=np.float64)
+    column_ranks = np.arange(column_count, dtype=np.float64)
+    for sweep in range(sweeps):
+        column_ranks = _barycenter_ranks(columns, row_ranks[rows], weights, column_count, column_ranks)
+        previous_row_ranks = row_ranks
+        row_ranks = _barycenter_ranks(rows, column_ranks[columns], weights, row_count, row_ranks)
+        if np.array_equal(row_ranks, previous_row_ranks):
+            break
+    return np.argsort(row_ranks), np.argsort(column_ranks)
+
+def _adjacency_heatmap_figure(rule_set:RuleSet, aggregate:str, top_n, seriation:bool):
+    '''
+        Builds the antecedent x consequent confidence matrix of the rules from their itemset
+        numbers and draws it as a single heatmap, see adjacency_scatter_plot
+    '''
+    row_top_n, column_top_n = top_n if isinstance(top_n, tuple) else (top_n, top_n)
+    with stage("label_itemsets", len(rule_set)):
+        row_ids, row_labels = _itemset_label_table(rule_set.lhs_indptr, rule_set.lhs_indices, rule_set.vocabulary)
+        column_ids, column_labels = _itemset_label_table(rule_set.rhs_indptr, rule_set.rhs_indices, rule_set.vocabulary)
+    
+    with stage("aggregate_cells", len(rule_set)):
+        confidence = rule_set.confidence
+        defined = ~np.isnan(confidence)
+        rows, columns, values, counts = _confidence_cells(row_ids[defined], column_ids[defined], confidence[defined], len(column_labels), aggregate)
+        
+        #Keep the rows and columns with the most rules, renumbered in their original order
+        kept_rows = _top_n(rows, counts, len(row_labels), row_top_n)
+        kept_columns = _top_n(columns, counts, len(column_labels), column_top_n)
+        kept_cells = np.isin(rows, kept_rows) & np.isin(columns, kept_columns)
+        rows = np.searchsorted(kept_rows, rows[kept_cells])
+        columns = np.searchsorted(kept_columns, columns[kept_cells])
+        values, counts = values[kept_cells], counts[kept_cells]
+        row_labels, column_labels = row_labels[kept_rows], column_labels[kept_columns]
+    
+    with stage("order_axes", len(rows)):
+        if seriation:
+            row_order, column_order = _seriate(rows, columns, values, len(row_labels), len(column_labels))
+        else:
+            row_order, column_order = np.arange(len(row_labels)), np.arange(len(column_labels))
+        row_positions = np.argsort(row_order)
+        column_positions = np.argsort(column_order)
+    
+    with stage("build_figure", len(rows)):
+        matrix = np.full((len(row_labels), len(column_labels)), np.nan)
+        rule_counts = np.zeros((len(row_labels), len(column_labels)), dtype=np.int64)
+        matrix[row_positions[rows], column_positions[columns]] = values
+        rule_counts[row_positions[rows], column_positions[columns]] = counts
+        fig = go.Figure(data=go.Heatmap(
+            z=matrix,
+            x=column_labels[column_order],
+            y=row_labels[row_order],
+            customdata=rule_counts,
+            colorscale='YlOrRd',
+            hoverongaps=False,
+            hovertemplate="Antecedents: %{y}<br>Consequents: %{x}<br>Confidence: %{z:.3f}<br>Rules: %{customdata}<extra></extra>",
+            colorbar=dict(title=dict(text="{} confidence".format(aggregate.capitalize()), side='right')),
+        ))
+        fig.update_layout(
+            xaxis=dict(title=dict(text="Consequents"), type='category'),
+            yaxis=dict(title=dict(text="Antecedents"), type='category'),
+            plot_bgcolor = 'white',
+            paper_bgcolor = 'white'
+        )
+    return fig
+
+def adjacency_scatter_plot(rules:List[Rule], notebook_flag:bool = False, show_flag:bool=True, mode:str='scatter',
+                           aggregate:str='max', top_n=None, seriation:bool=True):
     '''
     Generates a plot showing the distribution of association rules in terms of association
     rules between antecedent and consequent entities, support and confidence
     
-    Visulizes this plot as a Plotly scattergraph and views it in the browser
-    '''
-    unique_values = set()
-    x_axis = []
-    y_axis = []
-    strength = []
-    for index, rule in enumerate(rules):
-        x_axis.append(str(rule.rhs))
-        y_axis.append(str(rule.lhs))
-        strength.append(20 * rule.confidence)
-        unique_values.add(str(rule.rhs))
-        unique_values.add(str(rule.lhs))
-        
-    #Generate distance matrix view
-    fig = go.Figure()
-
-    fig.add_trace(go.Scatter(
-        x=x_axis,
-        y=y_axis,
-        mode="markers",
-        marker = {'size':strength},
-        name='Association rules',
-    ))
+    Visulizes this plot as a Plotly scattergraph and views it in the browser, unless show_flag
+    is False
+    
+    With mode 'heatmap' the rules are aggregated instead into one cell per antecedent and
+    consequent set, holding the max or mean (aggregate) confidence of its rules, and drawn as a
+    single heatmap. The rows and columns are ordered by barycenter seriation unless seriation is
+    False, and top_n (a number, or a (rows, columns) pair) keeps only the antecedent and
+    consequent sets with the most rules, for collections too large to draw whole
+    '''
+    rule_set = as_rule_set(rules)
+    if mode == 'heatmap':
+        fig = _adjacency_heatmap_figure(rule_set, aggregate, top_n, seriation)
+    elif mode == 'scatter':
+        with stage("label_itemsets", len(rule_set)):
+            #Every distinct itemset is labelled once (as str() of its item tuple), the rules
+            #then gather their labels by itemset number
+            x_axis = _itemset_labels(rule_set.rhs_indptr, rule_set.rhs_indices, rule_set.vocabulary)
+            y_axis = _itemset_labels(rule_set.lhs_indptr, rule_set.lhs_indices, rule_set.vocabulary)
+        with stage("build_figure", len(rule_set)):
+            strength = 20 * rule_set.confidence
+            fig = adjacency_scatter_figure(x_axis, y_axis, strength)
+    else:
+        raise ValueError("Unknown mode {}".format(mode))
     
-    fig.show()
+    if show_flag:
+        with stage("show"):
+            fig.show()
     return fig
\ No newline at end of file
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless rendering of many figures into a single HTML report or figure
+JSON bundle.
+
+The figures are serialized to JSON once (optionally in parallel worker
+processes) and written into one document, with plotly.js embedded a single
+time instead of once per figure.
+"""
+
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from html import escape
+
+import plotly.offline
+import plotly.io as pio
+
+from PyARMViz.PyARMViz import (
+    adjacency_graph_plotly,
+    adjacency_parallel_category_plot,
+    adjacency_parallel_coordinate_plot,
+    adjacency_scatter_plot,
+    metadata_scatter_plot,
+)
+
+_HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8" />
+<title>{title}</title>
+{plotlyjs}
+</head>
+<body>
+<h1>{title}</h1>
+{sections}
+</body>
+</html>
+"""
+_HTML_SECTION = """<h2>{title}</h2>
+<div id="{div_id}" class="pyarmviz-figure"></div>
+<script type="text/javascript">
+Plotly.newPlot("{div_id}", {figure_json});
+</script>
+"""
+
+
+def _figure_json(figure) -> str:
+    return pio.to_json(figure, validate=False)
+
+
+def _titled_figures(figures) -> list:
+    '''
+        Accepts a dictionary of title to figure or a list of figures, returns a list of
+        (title, figure) pairs, untitled figures are named after their layout title
+    '''
+    if isinstance(figures, dict):
+        return list(figures.items())
+    titled = []
+    for index, figure in enumerate(figures):
+        title = figure.layout.title.text if figure.layout.title.text else "Figure {}".format(index + 1)
+        titled.append((title, figure))
+    return titled
+
+
+def serialize_figures(figures, n_jobs: int = 1) -> list:
+    '''
+        Serializes a list of figures to plotly JSON strings, in n_jobs worker processes if
+        n_jobs is above 1
+    '''
+    figures = list(figures)
+    if n_jobs > 1 and len(figures) > 1:
+        with ProcessPoolExecutor(n_jobs) as executor:
+            return list(executor.map(_figure_json, figures))
+    return [_figure_json(figure) for figure in figures]
+
+
+def _plotlyjs_tag(include_plotlyjs) -> str:
+    if include_plotlyjs is True:
+        return '<script type="text/javascript">{}</script>'.format(plotly.offline.get_plotlyjs())
+    if include_plotlyjs == 'cdn':
+        return '<script src="https://cdn.plot.ly/plotly-{}.min.js"></script>'.format(plotly.offline.get_plotlyjs_version())
+    if include_plotlyjs is False:
+        return ''
+    raise ValueError("include_plotlyjs must be True, False or 'cdn'")
+
+
+def _write_report(report: str, output_path: str):
+    if output_path is not None:
+        with open(output_path, 'w', encoding='utf-8') as report_file:
+            report_file.write(report)
+        logging.debug("Wrote report to %s", output_path)
+
+
+def render_html_report(figures, output_path: str = None, title: str = "PyARMViz Report", include_plotlyjs=True, n_jobs: int = 1) -> str:
+    '''
+        Renders figures (a list, or a dictionary of section title to figure) into one HTML
+        document and writes it to output_path if given. Returns the document
+
+        include_plotlyjs embeds plotly.js once for the whole document (True), links it from the
+        plotly CDN ('cdn') or leaves it out (False). Figures are serialized in n_jobs processes
+    '''
+    titled = _titled_figures(figures)
+    figure_jsons = serialize_figures([figure for _, figure in titled], n_jobs)
+    sections = [
+        #Keep a closing tag inside a JSON string from ending the script element
+        _HTML_SECTION.format(title=escape(section_title), div_id="pyarmviz-figure-{}".format(index), figure_json=figure_json.replace("</", "<\\/"))
+        for index, ((section_title, _), figure_json) in enumerate(zip(titled, figure_jsons))
+    ]
+    report = _HTML_TEMPLATE.format(title=escape(title), plotlyjs=_plotlyjs_tag(include_plotlyjs), sections="".join(sections))
+    _write_report(report, output_path)
+    return report
+
+
+def render_json_report(figures, output_path: str = None, n_jobs: int = 1) -> str:
+    '''
+        Renders figures (a list, or a dictionary of title to figure) into one JSON bundle of the
+        form {"figures": [{"title": ..., "figure": ...}, ...]}, writes it to output_path if given
+        and returns it. Figures are serialized in n_jobs processes
+    '''
+    titled = _titled_figures(figures)
+    figure_jsons = serialize_figures([figure for _, figure in titled], n_jobs)
+    entries = [
+        '{{"title": {}, "figure": {}}}'.format(json.dumps(section_title), figure_json)
+        for (section_title, _), figure_json in zip(titled, figure_jsons)
+    ]
+    report = '{{"figures": [{}]}}'.format(", ".join(entries))
+    _write_report(report, output_path)
+    return report
+
+
+def report_figures(rules) -> dict:
+    '''
+        Draws the standard PyARMViz figures of a rule collection without displaying them,
+        returned as a dictionary of title to figure ready for render_html_report
+    '''
+    figures = {"Rule Strength Distribution": metadata_scatter_plot(rules, show_flag=False)}
+    for axis_count, figure in enumerate(adjacency_parallel_coordinate_plot(rules, show_flag=False), 2):
+        figures["Parallel Coordinates, {} Axes".format(axis_count)] = figure
+    for axis_count, figure in enumerate(adjacency_parallel_category_plot(rules, show_flag=False), 2):
+        figures["Parallel Categories, {} Axes".format(axis_count)] = figure
+    figures["Rule Adjacency Graph"] = adjacency_graph_plotly(rules, show_flag=False)
+    figures["Rule Adjacency Scatter"] = adjacency_scatter_plot(rules, show_flag=False)
+    return figures
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rescoring of existing rules against new transactions, without re-mining.
+
+The transactions are turned into a vertical bitmap index once (see
+Miner.VerticalBitmaps), then the antecedent, consequent and full itemset of
+every rule is counted with bitwise ANDs and popcounts. Each distinct itemset
+is counted once however many rules share it, and itemsets sharing a prefix
+reuse the bitmap of that prefix.
+"""
+
+import numpy as np
+
+from PyARMViz.Filtering import itemset_groups, padded_itemsets
+from PyARMViz.Miner import VerticalBitmaps, popcount_rows
+from PyARMViz.RuleSet import RuleSet, as_rule_set
+
+#Bytes of prefix bitmaps held at once while counting
+DEFAULT_MEMORY_BUDGET = 256 * 2 ** 20
+
+
+def _prefix_counts(item_bitmaps: np.ndarray, itemsets: np.ndarray) -> np.ndarray:
+    '''
+        Counts the transactions containing every itemset of a lexicographically sorted padded
+        itemset matrix. The bitmap of each distinct prefix is built once, level by level, from
+        the bitmap of its parent prefix and the bitmap of its last item
+    '''
+    counts = np.zeros(len(itemsets), dtype=np.int64)
+    lengths = (itemsets >= 0).sum(axis=1)
+    #Rows whose prefix of the previous level is held in parent_bitmaps, and its index there
+    parent_rows = np.arange(len(itemsets))
+    parent_ids = None
+    parent_bitmaps = None
+    for level in range(1, itemsets.shape[1] + 1):
+        rows = parent_rows[lengths[parent_rows] >= level]
+        if len(rows) == 0:
+            break
+        prefixes = itemsets[rows, :level]
+        #Sorted rows keep equal prefixes next to each other
+        starts = np.r_[True, (prefixes[1:] != prefixes[:-1]).any(axis=1)]
+        prefix_ids = np.cumsum(starts) - 1
+        bitmaps = item_bitmaps[prefixes[starts, level - 1]]
+        if parent_bitmaps is not None:
+            parents = parent_ids[np.searchsorted(parent_rows, rows[starts])]
+            bitmaps &= parent_bitmaps[parents]
+        complete = lengths[rows] == level
+        if complete.any():
+            counts[rows[complete]] = popcount_rows(bitmaps)[prefix_ids[complete]]
+        parent_rows, parent_ids, parent_bitmaps = rows, prefix_ids, bitmaps
+    return counts
+
+
+def itemset_counts(vertical: VerticalBitmaps, itemsets: np.ndarray, memory_budget: int = DEFAULT_MEMORY_BUDGET) -> np.ndarray:
+    '''
+        The number of transactions of the vertical bitmaps containing every row of a padded
+        itemset matrix (item codes of the bitmaps' vocabulary, -1 padded, codes at or past the
+        number of bitmaps are items no transaction contains)
+
+        Distinct itemsets are counted once, in sorted order and in chunks sized so their prefix
+        bitmaps stay within memory_budget bytes
+    '''
+    ids, first = itemset_groups(itemsets, return_index=True)
+    distinct = itemsets[first]
+    order = np.lexsort(distinct.T[::-1]) if distinct.shape[1] else np.arange(len(distinct))
+    distinct = distinct[order]
+
+    #An extra all-zero bitmap stands for the items the transactions never contain
+    item_count, word_count = vertical.bitmaps.shape
+    item_bitmaps = np.vstack([vertical.bitmaps, np.zeros((1, word_count), dtype=np.uint64)])
+    distinct = np.where(distinct >= item_count, item_count, distinct)
+
+    distinct_counts = np.full(len(distinct), vertical.num_transactions, dtype=np.int64)
+    #A chunk holds the prefix bitmaps of two levels at a time
+    chunk_size = max(1, memory_budget // (16 * word_count))
+    for start in range(0, len(distinct), chunk_size):
+        chunk = distinct[start:start + chunk_size]
+        nonempty = chunk[:, 0] >= 0 if chunk.shape[1] else np.zeros(len(chunk), dtype=bool)
+        distinct_counts[start:start + chunk_size][nonempty] = _prefix_counts(item_bitmaps, chunk[nonempty])
+
+    counts = np.empty(len(distinct), dtype=np.int64)
+    counts[order] = distinct_counts
+    return counts[ids]
+
+
+def _full_itemsets(rule_set: RuleSet):
+    '''
+        The CSR encoded union of the antecedent and consequent of every rule
+    '''
+    lhs_lengths, rhs_lengths = rule_set.lhs_lengths, rule_set.rhs_lengths
+    indptr = np.asarray(rule_set.lhs_indptr, dtype=np.int64) + np.asarray(rule_set.rhs_indptr, dtype=np.int64)
+    indices = np.empty(indptr[-1], dtype=np.int32)
+    lhs_rules = np.repeat(np.arange(len(rule_set)), lhs_lengths)
+    rhs_rules = np.repeat(np.arange(len(rule_set)), rhs_lengths)
+    indices[indptr[lhs_rules] + np.arange(len(lhs_rules)) - rule_set.lhs_indptr[lhs_rules]] = rule_set.lhs_indices
+    indices[indptr[rhs_rules] + lhs_lengths[rhs_rules] + np.arange(len(rhs_rules)) - rule_set.rhs_indptr[rhs_rules]] = rule_set.rhs_indices
+    return indptr, indices
+
+
+def rescore_rules(rules, transactions, columnar: bool = False, memory_budget: int = DEFAULT_MEMORY_BUDGET):
+    '''
+        Recounts a list of Rules or a RuleSet against transactions, an iterable of transactions
+        or VerticalBitmaps already built from them, so the same window can rescore several rule
+        sets
+
+        Returns fresh Rules, or with columnar a RuleSet holding the same itemsets (sharing the
+        vocabulary of the rules) with the new count_full, count_lhs, count_rhs and
+        num_transactions columns
+
+        >>> from PyARMViz.Rule import Rule
+        >>> rules = [Rule(('milk',), ('eggs',), 1, 1, 1, 1)]
+        >>> rescore_rules(rules, [['milk', 'eggs'], ['milk'], ['flour']])[0].confidence
+        0.5
+    '''
+    rule_set = as_rule_set(rules)
+    if isinstance(transactions, VerticalBitmaps):
+        vertical = transactions
+    else:
+        #Only the items of the rules are indexed
+        vertical = VerticalBitmaps.from_transactions(transactions, rule_set.vocabulary)
+
+    #Rule item codes in the bitmaps' vocabulary, items it lacks get a code past its bitmaps
+    if vertical.vocabulary is rule_set.vocabulary:
+        codes = np.arange(len(rule_set.vocabulary), dtype=np.int32)
+    else:
+        lookup = vertical.vocabulary.get
+        missing = len(vertical.bitmaps)
+        codes = np.array([lookup(item, missing) for item in rule_set.vocabulary], dtype=np.int32)
+
+    full_indptr, full_indices = _full_itemsets(rule_set)
+    itemsets = [
+        padded_itemsets(rule_set.lhs_indptr, codes[rule_set.lhs_indices]),
+        padded_itemsets(rule_set.rhs_indptr, codes[rule_set.rhs_indices]),
+        padded_itemsets(full_indptr, codes[full_indices]),
+    ]
+    width = max(matrix.shape[1] for matrix in itemsets)
+    stacked = np.full((3 * len(rule_set), width), -1, dtype=np.int32)
+    for index, matrix in enumerate(itemsets):
+        stacked[index * len(rule_set):(index + 1) * len(rule_set), :matrix.shape[1]] = matrix
+    count_lhs, count_rhs, count_full = np.split(itemset_counts(vertical, stacked, memory_budget), 3)
+
+    rescored = RuleSet(
+        rule_set.vocabulary,
+        rule_set.lhs_indptr,
+        rule_set.lhs_indices,
+        rule_set.rhs_indptr,
+        rule_set.rhs_indices,
+        count_full,
+        count_lhs,
+        count_rhs,
+        np.full(len(rule_set), vertical.num_transactions, dtype=np.int64),
+    )
+    return rescored if columnar else rescored.to_rules()
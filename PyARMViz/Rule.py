@@ -184,7 +184,154 @@ class Rule(object):
         The length of a rule, defined as the number of items in the rule.
         """
         return len(self.lhs + self.rhs)
-    
+
+
+def _canonical_itemset(items: tuple):
+    """
+    The canonical (order and duplicate insensitive) key of an itemset. Sorted
+    tuples are used where the items are orderable and the original tuple is
+    reused when it is already canonical, otherwise a frozenset.
+    """
+    if len(items) < 2:
+        return items
+    try:
+        canonical = tuple(sorted(items))
+    except TypeError:
+        return frozenset(items)
+    if len(set(canonical)) != len(canonical):
+        canonical = tuple(sorted(set(canonical)))
+    return items if canonical == items else canonical
+
+
+#Sets a slot of a FrozenRule, bypassing its immutability
+_set_slot = object.__setattr__
+
+#The Rule metric formulas, evaluated once per FrozenRule
+_confidence = Rule.confidence.fget
+_support = Rule.support.fget
+_lift = Rule.lift.fget
+_conviction = Rule.conviction.fget
+_rpf = Rule.rpf.fget
+
+
+class FrozenRule(object):
+    """
+    A memory compact, immutable rule.
+
+    Behaves like Rule, but stores its fields in __slots__ instead of a per
+    instance __dict__. The canonical itemset key, the hash and the metric
+    values are computed once on construction and read back from their slots.
+    """
+
+    __slots__ = (
+        "lhs",
+        "rhs",
+        "count_full",
+        "count_lhs",
+        "count_rhs",
+        "num_transactions",
+        "key",
+        "_hash",
+        "confidence",
+        "support",
+        "lift",
+        "conviction",
+        "rpf",
+    )
+
+    def __init__(
+        self,
+        lhs: tuple,
+        rhs: tuple,
+        count_full: int = 0,
+        count_lhs: int = 0,
+        count_rhs: int = 0,
+        num_transactions: int = 0,
+    ):
+        """
+        Initialize a new frozen rule, see Rule for the parameters.
+
+        Examples
+        --------
+        >>> r = FrozenRule(('a', 'b'), ('c',), 50, 100, 150, 200)
+        >>> r.confidence
+        0.5
+        >>> r.key
+        (('a', 'b'), ('c',))
+        >>> r == Rule(('b', 'a'), ('c',))
+        True
+        >>> hash(r) == hash(Rule(('b', 'a'), ('c',)))
+        True
+        >>> r.lift = 1
+        Traceback (most recent call last):
+        ...
+        AttributeError: FrozenRule is immutable
+        """
+        if type(lhs) is not tuple:
+            lhs = tuple(lhs)
+        if type(rhs) is not tuple:
+            rhs = tuple(rhs)
+        _set_slot(self, "lhs", lhs)
+        _set_slot(self, "rhs", rhs)
+        _set_slot(self, "count_full", count_full)
+        _set_slot(self, "count_lhs", count_lhs)
+        _set_slot(self, "count_rhs", count_rhs)
+        _set_slot(self, "num_transactions", num_transactions)
+        # The canonical (lhs, rhs) itemset key used for equality
+        _set_slot(self, "key", (_canonical_itemset(lhs), _canonical_itemset(rhs)))
+        # Matches Rule.__hash__ so both classes can share a set or dict
+        _set_slot(self, "_hash", hash(frozenset(lhs + rhs)))
+        # Conviction and rpf read the confidence and support slots set before
+        # them, and are undefined (None) when either of those is
+        confidence = _confidence(self)
+        support = _support(self)
+        _set_slot(self, "confidence", confidence)
+        _set_slot(self, "support", support)
+        _set_slot(self, "lift", _lift(self))
+        defined = confidence is not None and support is not None
+        _set_slot(self, "conviction", _conviction(self) if defined else None)
+        _set_slot(self, "rpf", _rpf(self) if defined else None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FrozenRule is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("FrozenRule is immutable")
+
+    def __reduce__(self):
+        # Unpickling goes through __init__, which recomputes the cached slots
+        return (
+            FrozenRule,
+            (
+                self.lhs,
+                self.rhs,
+                self.count_full,
+                self.count_lhs,
+                self.count_rhs,
+                self.num_transactions,
+            ),
+        )
+
+    _pf = staticmethod(Rule._pf)
+    __repr__ = Rule.__repr__
+    __str__ = Rule.__str__
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        """
+        Equality of two rules, compatible with Rule.__eq__.
+        """
+        if type(other) is FrozenRule:
+            return self._hash == other._hash and self.key == other.key
+        return (set(self.lhs) == set(other.lhs)) and (
+            set(self.rhs) == set(other.rhs)
+        )
+
+    def __len__(self):
+        return len(self.lhs) + len(self.rhs)
+
 
 def generate_rule_from_rule(rule_object):
     '''
@@ -200,4 +347,12 @@ def generate_rule_from_dict(rule_dict):
         in order to take advantage of its additional functionality if needed
     '''
     return Rule(rule_dict['lhs'], rule_dict['rhs'], rule_dict['count_full'], 
-                rule_dict['count_lhs'], rule_dict['count_rhs'], rule_dict['num_transactions'])
\ No newline at end of file
+                rule_dict['count_lhs'], rule_dict['count_rhs'], rule_dict['num_transactions'])
+
+def generate_frozen_rule_from_rule(rule_object):
+    '''
+        Converts a Rule (or compatible rule object) into its memory compact, immutable
+        FrozenRule equivalent
+    '''
+    return FrozenRule(rule_object.lhs, rule_object.rhs, rule_object.count_full, rule_object.count_lhs, rule_object.count_rhs, 
+                rule_object.num_transactions)
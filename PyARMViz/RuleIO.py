@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reading and writing rule collections in a compact binary columnar format.
+
+A rule file holds an 8 byte magic string, the length of a JSON header as a
+little endian uint64, the JSON header describing every array (dtype, shape
+and offset), and then the raw array buffers, each aligned to 64 bytes:
+
+    lhs_indptr, lhs_indices, rhs_indptr, rhs_indices  CSR encoded itemsets
+    count_full, count_lhs, count_rhs, num_transactions  per rule counts
+    item_offsets, item_data                            the item vocabulary
+
+String items are stored as a UTF-8 blob (item_data) with offsets, integer
+items as an int64 array. Loading memory maps the file, so a RuleSet can be
+opened without reading it and sliced by reading only the requested rows.
+
+Rules produced elsewhere (JSON Lines files, DataFrames, dicts of columns or
+rule objects of other libraries) can be read in fixed size chunks, each a
+RuleSet over one shared vocabulary, so collections larger than memory can be
+streamed into the plot and export functions one chunk after another.
+"""
+
+import json
+import numbers
+import struct
+from itertools import islice
+from typing import Iterator
+
+import numpy as np
+
+from PyARMViz.RuleSet import COLUMN_NAMES, ItemVocabulary, RuleSet, as_rule_set
+from PyARMViz.datasets import open_compressed
+
+_MAGIC = b"PYARMRS\x01"
+_ALIGNMENT = 64
+#Rules per chunk read by the bulk readers
+DEFAULT_CHUNK_SIZE = 100000
+_RULE_ARRAYS = (
+    "lhs_indptr",
+    "lhs_indices",
+    "rhs_indptr",
+    "rhs_indices",
+    "count_full",
+    "count_lhs",
+    "count_rhs",
+    "num_transactions",
+)
+
+
+class MappedItemVocabulary(ItemVocabulary):
+    """
+    An ItemVocabulary backed by the (memory mapped) arrays of a rule file.
+
+    Items are decoded on demand, the item to code dictionary is only built
+    if a lookup by item or a new item requires it.
+    """
+
+    def __init__(self, item_offsets: np.ndarray, item_data: np.ndarray, item_kind: str):
+        self._item_offsets = item_offsets
+        self._item_data = item_data
+        self._item_kind = item_kind
+        self._size = len(item_offsets) - 1 if item_kind == "str" else len(item_data)
+        self._decoded = {}
+        self._items = None
+        self._codes = None
+
+    def _item(self, code: int):
+        item = self._decoded.get(code)
+        if item is None:
+            if not 0 <= code < self._size:
+                raise IndexError("Item code out of range")
+            if self._item_kind == "str":
+                start, stop = self._item_offsets[code], self._item_offsets[code + 1]
+                item = self._item_data[start:stop].tobytes().decode("utf-8")
+            else:
+                item = int(self._item_data[code])
+            self._decoded[code] = item
+        return item
+
+    def _materialize(self):
+        '''
+            Decodes every item so that the vocabulary can be searched and extended
+        '''
+        if self._items is None:
+            self._items = [self._item(code) for code in range(self._size)]
+            self._codes = {item: code for code, item in enumerate(self._items)}
+            self._decoded = None
+
+    def intern(self, item) -> int:
+        self._materialize()
+        return ItemVocabulary.intern(self, item)
+
+    def code(self, item) -> int:
+        self._materialize()
+        return ItemVocabulary.code(self, item)
+
+    def get(self, item, default=None):
+        self._materialize()
+        return ItemVocabulary.get(self, item, default)
+
+    def decode(self, codes):
+        if self._items is not None:
+            return ItemVocabulary.decode(self, codes)
+        return [self._item(code) for code in codes]
+
+    @property
+    def items(self):
+        self._materialize()
+        return self._items
+
+    def __getitem__(self, code):
+        if self._items is not None:
+            return self._items[code]
+        return self._item(code)
+
+    def __contains__(self, item):
+        self._materialize()
+        return item in self._codes
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return self._size if self._items is None else len(self._items)
+
+
+def _encode_vocabulary(vocabulary: ItemVocabulary) -> tuple:
+    '''
+        Encodes the items as (item_kind, item_offsets, item_data)
+    '''
+    items = list(vocabulary)
+    if all(isinstance(item, str) for item in items):
+        encoded = [item.encode("utf-8") for item in items]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+        return "str", offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    if all(isinstance(item, numbers.Integral) and not isinstance(item, bool) for item in items):
+        return "int", np.zeros(0, dtype=np.int64), np.array(items, dtype=np.int64)
+    raise TypeError("Only rule files with all string or all integer items are supported")
+
+
+def save_rule_set(rules, path: str):
+    '''
+        Writes a list of Rules or a RuleSet to path in the binary columnar rule format
+    '''
+    rule_set = as_rule_set(rules)
+    item_kind, item_offsets, item_data = _encode_vocabulary(rule_set.vocabulary)
+    arrays = {
+        "lhs_indptr": rule_set.lhs_indptr.astype("<i8", copy=False),
+        "lhs_indices": rule_set.lhs_indices.astype("<i4", copy=False),
+        "rhs_indptr": rule_set.rhs_indptr.astype("<i8", copy=False),
+        "rhs_indices": rule_set.rhs_indices.astype("<i4", copy=False),
+        "count_full": rule_set.count_full.astype("<i8", copy=False),
+        "count_lhs": rule_set.count_lhs.astype("<i8", copy=False),
+        "count_rhs": rule_set.count_rhs.astype("<i8", copy=False),
+        "num_transactions": rule_set.num_transactions.astype("<i8", copy=False),
+        "item_offsets": item_offsets.astype("<i8", copy=False),
+        "item_data": item_data.astype("<i8" if item_kind == "int" else "u1", copy=False),
+    }
+
+    #Offsets are relative to the end of the header, which is padded to the alignment
+    descriptions = {}
+    offset = 0
+    for name, array in arrays.items():
+        descriptions[name] = dict(dtype=array.dtype.str, shape=list(array.shape), offset=offset)
+        offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+    header = json.dumps(dict(version=1, rule_count=len(rule_set), item_kind=item_kind, arrays=descriptions)).encode("utf-8")
+    data_start = -(-(len(_MAGIC) + 8 + len(header)) // _ALIGNMENT) * _ALIGNMENT
+
+    with open(path, "wb") as rule_file:
+        rule_file.write(_MAGIC)
+        rule_file.write(struct.pack("<Q", len(header)))
+        rule_file.write(header)
+        for name, array in arrays.items():
+            rule_file.seek(data_start + descriptions[name]["offset"])
+            rule_file.write(np.ascontiguousarray(array).tobytes())
+        #Pad the final buffer so that the file covers every aligned offset
+        rule_file.truncate(data_start + offset)
+
+
+def load_rule_set(path: str, mmap: bool = True) -> RuleSet:
+    '''
+        Opens a rule file written by save_rule_set as a RuleSet
+
+        With mmap (the default) the arrays are memory mapped read only, so opening is nearly
+        instant and only the parts of the file that are used are read. Otherwise the whole
+        file is read into memory
+    '''
+    with open(path, "rb") as rule_file:
+        if rule_file.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError("{} is not a PyARMViz rule file".format(path))
+        (header_length,) = struct.unpack("<Q", rule_file.read(8))
+        header = json.loads(rule_file.read(header_length).decode("utf-8"))
+    if header["version"] != 1:
+        raise ValueError("Unsupported rule file version {}".format(header["version"]))
+    data_start = -(-(len(_MAGIC) + 8 + header_length) // _ALIGNMENT) * _ALIGNMENT
+
+    if mmap:
+        buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    else:
+        buffer = np.fromfile(path, dtype=np.uint8)
+
+    arrays = {}
+    for name, description in header["arrays"].items():
+        dtype = np.dtype(description["dtype"])
+        count = int(np.prod(description["shape"], dtype=np.int64))
+        start = data_start + description["offset"]
+        arrays[name] = buffer[start:start + count * dtype.itemsize].view(dtype).reshape(description["shape"])
+
+    vocabulary = MappedItemVocabulary(arrays["item_offsets"], arrays["item_data"], header["item_kind"])
+    return RuleSet(vocabulary, *(arrays[name] for name in _RULE_ARRAYS))
+
+
+def iter_json_lines(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, vocabulary: ItemVocabulary = None,
+                    encoding: str = "utf-8") -> Iterator[RuleSet]:
+    '''
+        Streams a JSON Lines rule file (one object per line with the keys read by
+        generate_rule_from_dict, gzip/bz2/xz compressed by extension) as RuleSets of at most
+        chunk_size rules, holding only the current chunk in memory
+
+        The chunks share vocabulary (a new one by default), so their item codes can be compared
+        and they can be joined with RuleSet.concatenate without recoding
+    '''
+    if vocabulary is None:
+        vocabulary = ItemVocabulary()
+    with open_compressed(path, "rt", encoding) as rule_file:
+        lines = (line for line in rule_file if not line.isspace())
+        while True:
+            chunk = list(islice(lines, chunk_size))
+            if not chunk:
+                break
+            #One parse per chunk rather than per line
+            rule_dicts = json.loads("[" + ",".join(chunk) + "]")
+            yield RuleSet.from_columns({name: [rule_dict[name] for rule_dict in rule_dicts] for name in COLUMN_NAMES}, vocabulary)
+
+
+def iter_column_chunks(columns, chunk_size: int = DEFAULT_CHUNK_SIZE, vocabulary: ItemVocabulary = None) -> Iterator[RuleSet]:
+    '''
+        Splits a DataFrame or mapping of columns (see RuleSet.from_columns) into RuleSets of at
+        most chunk_size rules over one shared vocabulary
+    '''
+    if vocabulary is None:
+        vocabulary = ItemVocabulary()
+    arrays = {}
+    for name in COLUMN_NAMES:
+        values = columns[name]
+        arrays[name] = values.to_numpy() if hasattr(values, "to_numpy") else values
+    rule_count = len(arrays["count_full"])
+    for start in range(0, rule_count, chunk_size):
+        yield RuleSet.from_columns({name: values[start:start + chunk_size] for name, values in arrays.items()}, vocabulary)
+
+
+def iter_rule_batches(rules, chunk_size: int = DEFAULT_CHUNK_SIZE, vocabulary: ItemVocabulary = None) -> Iterator[RuleSet]:
+    '''
+        Encodes an iterable of Rules or rule-like objects from other libraries (with lhs, rhs,
+        count_full, count_lhs, count_rhs and num_transactions attributes) into RuleSets of at
+        most chunk_size rules over one shared vocabulary, consuming the iterable lazily
+    '''
+    if vocabulary is None:
+        vocabulary = ItemVocabulary()
+    rules = iter(rules)
+    while True:
+        batch = list(islice(rules, chunk_size))
+        if not batch:
+            break
+        yield RuleSet.from_rules(batch, vocabulary)
@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar container for large collections of association rules.
+"""
+
+import numbers
+from itertools import chain
+from typing import List
+
+import numpy as np
+
+from PyARMViz.Rule import Rule
+
+#The columns of a rule collection, as accepted by RuleSet.from_columns
+COLUMN_NAMES = ("lhs", "rhs", "count_full", "count_lhs", "count_rhs", "num_transactions")
+
+
+class ItemVocabulary(object):
+    """
+    Interns the items (antecedent/consequent entities) of a rule collection to
+    dense int32 codes so that itemsets can be stored as integer arrays.
+    """
+
+    def __init__(self, items=None):
+        """
+        Initialize a vocabulary, optionally pre-populated with items.
+
+        Parameters
+        ----------
+        items : iterable
+            Hashable items to intern, in code order.
+
+        Examples
+        --------
+        >>> vocabulary = ItemVocabulary(['milk', 'eggs'])
+        >>> vocabulary.intern('flour')
+        2
+        >>> vocabulary.decode([2, 0])
+        ['flour', 'milk']
+        """
+        self._items = []
+        self._codes = {}
+        if items is not None:
+            for item in items:
+                self.intern(item)
+
+    def intern(self, item) -> int:
+        """
+        Return the code of an item, assigning the next free code if unseen.
+        """
+        code = self._codes.get(item)
+        if code is None:
+            code = len(self._items)
+            self._codes[item] = code
+            self._items.append(item)
+        return code
+
+    def code(self, item) -> int:
+        """
+        Return the code of a known item, raises KeyError if it was never interned.
+        """
+        return self._codes[item]
+
+    def get(self, item, default=None):
+        """
+        Return the code of an item or the default if it was never interned.
+        """
+        return self._codes.get(item, default)
+
+    def encode(self, items) -> np.ndarray:
+        """
+        Intern a sequence of items and return their codes as an int32 array.
+        """
+        intern = self.intern
+        return np.fromiter((intern(item) for item in items), dtype=np.int32)
+
+    def decode(self, codes) -> List:
+        """
+        Translate a sequence of codes back to their items.
+        """
+        items = self._items
+        return [items[code] for code in codes]
+
+    @property
+    def items(self) -> List:
+        """
+        The interned items, indexed by code.
+        """
+        return self._items
+
+    def __getitem__(self, code):
+        return self._items[code]
+
+    def __contains__(self, item):
+        return item in self._codes
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __repr__(self):
+        return "ItemVocabulary({} items)".format(len(self._items))
+
+
+def _csr_take(indptr: np.ndarray, indices: np.ndarray, rows: np.ndarray):
+    """
+    Gathers the given rows of a CSR encoded list of itemsets, returns the new
+    (indptr, indices) pair
+    """
+    lengths = indptr[rows + 1] - indptr[rows]
+    new_indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_indptr[1:])
+    #Offset of every gathered element relative to its position in the new indices array
+    offsets = np.repeat(indptr[rows] - new_indptr[:-1], lengths)
+    positions = offsets + np.arange(new_indptr[-1], dtype=np.int64)
+    return new_indptr, np.asarray(indices[positions])
+
+
+class RuleSet(object):
+    """
+    A columnar collection of rules.
+
+    The antecedents and consequents are stored as CSR encoded arrays of item
+    codes (an indptr array of offsets plus a flat indices array) against a
+    shared ItemVocabulary, and the counts are stored as int64 arrays. Metrics
+    are computed for the whole collection at once and cached.
+    """
+
+    #Metrics computed by compute_metrics, in order
+    metric_names = ("confidence", "support", "lift", "conviction", "rpf")
+
+    def __init__(
+        self,
+        vocabulary: ItemVocabulary,
+        lhs_indptr,
+        lhs_indices,
+        rhs_indptr,
+        rhs_indices,
+        count_full,
+        count_lhs,
+        count_rhs,
+        num_transactions,
+    ):
+        """
+        Initialize a rule set directly from its encoded arrays.
+
+        Parameters
+        ----------
+        vocabulary : ItemVocabulary
+            The vocabulary the item codes refer to.
+        lhs_indptr : array of int64
+            Offsets into lhs_indices, with len(rules) + 1 entries.
+        lhs_indices : array of int32
+            The concatenated antecedent item codes of every rule.
+        rhs_indptr : array of int64
+            Offsets into rhs_indices, with len(rules) + 1 entries.
+        rhs_indices : array of int32
+            The concatenated consequent item codes of every rule.
+        count_full, count_lhs, count_rhs, num_transactions : array of int64
+            The per rule counts, as documented on Rule.
+
+        Examples
+        --------
+        >>> rule_set = RuleSet.from_rules([Rule(('a', 'b'), ('c',), 50, 100, 150, 200)])
+        >>> rule_set.confidence
+        array([0.5])
+        >>> rule_set.to_rules()
+        [{a, b} -> {c}]
+        """
+        self.vocabulary = vocabulary
+        self.lhs_indptr = np.asarray(lhs_indptr)
+        self.lhs_indices = np.asarray(lhs_indices)
+        self.rhs_indptr = np.asarray(rhs_indptr)
+        self.rhs_indices = np.asarray(rhs_indices)
+        self.count_full = np.asarray(count_full)
+        self.count_lhs = np.asarray(count_lhs)
+        self.count_rhs = np.asarray(count_rhs)
+        self.num_transactions = np.asarray(num_transactions)
+        self._metrics = None
+
+        size = len(self.count_full)
+        if len(self.lhs_indptr) != size + 1 or len(self.rhs_indptr) != size + 1:
+            raise ValueError("indptr arrays must have one more entry than there are rules")
+        for counts in (self.count_lhs, self.count_rhs, self.num_transactions):
+            if len(counts) != size:
+                raise ValueError("All count arrays must have one entry per rule")
+
+    @classmethod
+    def from_rules(cls, rules, vocabulary: ItemVocabulary = None):
+        """
+        Encodes an iterable of Rule (or rule-like) objects into a RuleSet.
+
+        Items are interned into the provided vocabulary, or a new one.
+        """
+        if vocabulary is None:
+            vocabulary = ItemVocabulary()
+        intern = vocabulary.intern
+
+        lhs_codes = []
+        rhs_codes = []
+        lhs_lengths = []
+        rhs_lengths = []
+        count_full = []
+        count_lhs = []
+        count_rhs = []
+        num_transactions = []
+        for rule in rules:
+            lhs_codes.extend(intern(item) for item in rule.lhs)
+            rhs_codes.extend(intern(item) for item in rule.rhs)
+            lhs_lengths.append(len(rule.lhs))
+            rhs_lengths.append(len(rule.rhs))
+            count_full.append(rule.count_full)
+            count_lhs.append(rule.count_lhs)
+            count_rhs.append(rule.count_rhs)
+            num_transactions.append(rule.num_transactions)
+
+        return cls(
+            vocabulary,
+            _lengths_to_indptr(lhs_lengths),
+            np.array(lhs_codes, dtype=np.int32),
+            _lengths_to_indptr(rhs_lengths),
+            np.array(rhs_codes, dtype=np.int32),
+            np.array(count_full, dtype=np.int64),
+            np.array(count_lhs, dtype=np.int64),
+            np.array(count_rhs, dtype=np.int64),
+            np.array(num_transactions, dtype=np.int64),
+        )
+
+    @classmethod
+    def from_columns(cls, columns, vocabulary: ItemVocabulary = None):
+        """
+        Encodes a mapping of columns, such as a dict of lists or arrays or a
+        DataFrame, into a RuleSet without building a Rule per row.
+
+        Parameters
+        ----------
+        columns : mapping
+            The columns named as the fields of Rule: lhs and rhs hold one
+            sequence of items per rule, count_full, count_lhs, count_rhs and
+            num_transactions one integer per rule.
+        vocabulary : ItemVocabulary
+            The vocabulary to intern the items into, by default a new one.
+
+        Examples
+        --------
+        >>> rule_set = RuleSet.from_columns(dict(lhs=[['a', 'b'], ['c']], rhs=[['c'], ['a']], count_full=[50, 10],
+        ...                                      count_lhs=[100, 40], count_rhs=[150, 90], num_transactions=[200, 200]))
+        >>> rule_set.to_rules()
+        [{a, b} -> {c}, {c} -> {a}]
+        """
+        if vocabulary is None:
+            vocabulary = ItemVocabulary()
+        missing = [name for name in COLUMN_NAMES if name not in columns]
+        if missing:
+            raise ValueError("Missing rule columns {}".format(missing))
+
+        def column(name):
+            values = columns[name]
+            #Series and other array-likes are read through their numpy view
+            return values.to_numpy() if hasattr(values, "to_numpy") else values
+
+        lhs_indptr, lhs_indices = _encode_itemsets(column("lhs"), vocabulary)
+        rhs_indptr, rhs_indices = _encode_itemsets(column("rhs"), vocabulary)
+        return cls(
+            vocabulary,
+            lhs_indptr,
+            lhs_indices,
+            rhs_indptr,
+            rhs_indices,
+            *(np.asarray(column(name), dtype=np.int64) for name in COLUMN_NAMES[2:])
+        )
+
+    @classmethod
+    def concatenate(cls, rule_sets, vocabulary: ItemVocabulary = None):
+        """
+        Joins rule sets end to end into one RuleSet.
+
+        The rules are recoded into the vocabulary (by default a copy of the
+        first set's vocabulary, so no input set is modified).
+        """
+        rule_sets = list(rule_sets)
+        if vocabulary is None:
+            vocabulary = ItemVocabulary(rule_sets[0].vocabulary.items if rule_sets else None)
+        rule_sets = [rule_set.recode(vocabulary) for rule_set in rule_sets]
+
+        def joined_indptr(indptrs):
+            offsets = np.cumsum([0] + [int(indptr[-1]) for indptr in indptrs[:-1]])
+            return np.concatenate([[0]] + [np.asarray(indptr[1:], dtype=np.int64) + offset for indptr, offset in zip(indptrs, offsets)])
+
+        def joined(name, dtype):
+            return np.concatenate([np.zeros(0, dtype=dtype)] + [getattr(rule_set, name) for rule_set in rule_sets])
+
+        return cls(
+            vocabulary,
+            joined_indptr([rule_set.lhs_indptr for rule_set in rule_sets]).astype(np.int64),
+            joined("lhs_indices", np.int32),
+            joined_indptr([rule_set.rhs_indptr for rule_set in rule_sets]).astype(np.int64),
+            joined("rhs_indices", np.int32),
+            joined("count_full", np.int64),
+            joined("count_lhs", np.int64),
+            joined("count_rhs", np.int64),
+            joined("num_transactions", np.int64),
+        )
+
+    def recode(self, vocabulary: ItemVocabulary):
+        """
+        Returns the same rules with their item codes translated to another
+        vocabulary, interning the items it lacks. Only the items the rules
+        use are interned, and the set itself is returned if the vocabulary
+        is already its own.
+        """
+        if vocabulary is self.vocabulary:
+            return self
+        item_count = len(self.vocabulary)
+        used = np.bincount(self.lhs_indices, minlength=item_count) + np.bincount(self.rhs_indices, minlength=item_count)
+        used_codes = np.flatnonzero(used)
+        codes = np.full(len(self.vocabulary), -1, dtype=np.int32)
+        codes[used_codes] = vocabulary.encode(self.vocabulary.decode(used_codes.tolist()))
+        recoded = RuleSet(
+            vocabulary,
+            self.lhs_indptr,
+            codes[self.lhs_indices],
+            self.rhs_indptr,
+            codes[self.rhs_indices],
+            self.count_full,
+            self.count_lhs,
+            self.count_rhs,
+            self.num_transactions,
+        )
+        recoded._metrics = self._metrics
+        return recoded
+
+    def to_rules(self) -> List[Rule]:
+        """
+        Decodes the collection back into a list of Rule objects.
+        """
+        return list(self)
+
+    def lhs(self, index: int) -> tuple:
+        """
+        The antecedent items of a single rule.
+        """
+        start, stop = self.lhs_indptr[index], self.lhs_indptr[index + 1]
+        return tuple(self.vocabulary.decode(self.lhs_indices[start:stop].tolist()))
+
+    def rhs(self, index: int) -> tuple:
+        """
+        The consequent items of a single rule.
+        """
+        start, stop = self.rhs_indptr[index], self.rhs_indptr[index + 1]
+        return tuple(self.vocabulary.decode(self.rhs_indices[start:stop].tolist()))
+
+    @property
+    def lhs_lengths(self) -> np.ndarray:
+        """
+        The number of antecedent items of every rule.
+        """
+        return np.diff(self.lhs_indptr)
+
+    @property
+    def rhs_lengths(self) -> np.ndarray:
+        """
+        The number of consequent items of every rule.
+        """
+        return np.diff(self.rhs_indptr)
+
+    def compute_metrics(self) -> dict:
+        """
+        Computes confidence, support, lift, conviction and rpf for every rule
+        in one vectorized pass, mirroring the formulas of the Rule properties.
+
+        Rules whose metric is undefined (zero counts) get NaN where Rule would
+        return None. The result is cached until the count arrays are replaced.
+        """
+        if self._metrics is not None:
+            return self._metrics
+
+        count_full = self.count_full.astype(np.float64)
+        count_lhs = self.count_lhs.astype(np.float64)
+        count_rhs = self.count_rhs.astype(np.float64)
+        num_transactions = self.num_transactions.astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            confidence = count_full / count_lhs
+            support = count_full / num_transactions
+            expected_support = (count_lhs * count_rhs) / num_transactions ** 2
+            lift = support / expected_support
+            eps = 10e-10  # Avoid zero division, as in Rule.conviction
+            prob_not_rhs = 1 - count_rhs / num_transactions
+            conviction = prob_not_rhs / ((1 - confidence) + eps)
+            rpf = confidence * support
+
+        #Rule reports undefined metrics when the denominators are zero
+        confidence[self.count_lhs == 0] = np.nan
+        undefined = self.num_transactions == 0
+        for metric in (support, lift, conviction, rpf):
+            metric[undefined] = np.nan
+        lift[(self.count_lhs == 0) | (self.count_rhs == 0)] = np.nan
+
+        self._metrics = dict(
+            confidence=confidence,
+            support=support,
+            lift=lift,
+            conviction=conviction,
+            rpf=rpf,
+        )
+        return self._metrics
+
+    @property
+    def confidence(self) -> np.ndarray:
+        return self.compute_metrics()["confidence"]
+
+    @property
+    def support(self) -> np.ndarray:
+        return self.compute_metrics()["support"]
+
+    @property
+    def lift(self) -> np.ndarray:
+        return self.compute_metrics()["lift"]
+
+    @property
+    def conviction(self) -> np.ndarray:
+        return self.compute_metrics()["conviction"]
+
+    @property
+    def rpf(self) -> np.ndarray:
+        return self.compute_metrics()["rpf"]
+
+    def take(self, rows):
+        """
+        Returns a new RuleSet holding the given rows (an index array or a
+        boolean mask), sharing this set's vocabulary.
+        """
+        rows = np.asarray(rows)
+        if rows.dtype == np.bool_:
+            rows = np.flatnonzero(rows)
+        rows = rows.astype(np.int64, copy=False)
+        lhs_indptr, lhs_indices = _csr_take(self.lhs_indptr, self.lhs_indices, rows)
+        rhs_indptr, rhs_indices = _csr_take(self.rhs_indptr, self.rhs_indices, rows)
+        subset = RuleSet(
+            self.vocabulary,
+            lhs_indptr,
+            lhs_indices,
+            rhs_indptr,
+            rhs_indices,
+            self.count_full[rows],
+            self.count_lhs[rows],
+            self.count_rhs[rows],
+            self.num_transactions[rows],
+        )
+        if self._metrics is not None:
+            subset._metrics = {name: values[rows] for name, values in self._metrics.items()}
+        return subset
+
+    def __getitem__(self, key):
+        """
+        An integer returns a single Rule, a slice, index array or boolean mask
+        returns a RuleSet.
+        """
+        if isinstance(key, numbers.Integral):
+            index = int(key)
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError("RuleSet index out of range")
+            return Rule(
+                self.lhs(index),
+                self.rhs(index),
+                int(self.count_full[index]),
+                int(self.count_lhs[index]),
+                int(self.count_rhs[index]),
+                int(self.num_transactions[index]),
+            )
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return self._contiguous(start, max(start, stop))
+            return self.take(np.arange(start, stop, step))
+        return self.take(key)
+
+    def _contiguous(self, start: int, stop: int):
+        """
+        Returns rows start to stop as a RuleSet whose item codes and counts
+        are views on this set's arrays, so memory mapped sets are not read.
+        """
+        lhs_start, lhs_stop = int(self.lhs_indptr[start]), int(self.lhs_indptr[stop])
+        rhs_start, rhs_stop = int(self.rhs_indptr[start]), int(self.rhs_indptr[stop])
+        subset = RuleSet(
+            self.vocabulary,
+            self.lhs_indptr[start:stop + 1] - lhs_start,
+            self.lhs_indices[lhs_start:lhs_stop],
+            self.rhs_indptr[start:stop + 1] - rhs_start,
+            self.rhs_indices[rhs_start:rhs_stop],
+            self.count_full[start:stop],
+            self.count_lhs[start:stop],
+            self.count_rhs[start:stop],
+            self.num_transactions[start:stop],
+        )
+        if self._metrics is not None:
+            subset._metrics = {name: values[start:stop] for name, values in self._metrics.items()}
+        return subset
+
+    def __iter__(self):
+        decode = self.vocabulary.decode
+        lhs_indptr = self.lhs_indptr.tolist()
+        rhs_indptr = self.rhs_indptr.tolist()
+        lhs_indices = self.lhs_indices.tolist()
+        rhs_indices = self.rhs_indices.tolist()
+        counts = zip(
+            self.count_full.tolist(),
+            self.count_lhs.tolist(),
+            self.count_rhs.tolist(),
+            self.num_transactions.tolist(),
+        )
+        for index, (count_full, count_lhs, count_rhs, num_transactions) in enumerate(counts):
+            lhs = tuple(decode(lhs_indices[lhs_indptr[index]:lhs_indptr[index + 1]]))
+            rhs = tuple(decode(rhs_indices[rhs_indptr[index]:rhs_indptr[index + 1]]))
+            yield Rule(lhs, rhs, count_full, count_lhs, count_rhs, num_transactions)
+
+    def __len__(self):
+        return len(self.count_full)
+
+    def __repr__(self):
+        return "RuleSet({} rules, {} items)".format(len(self), len(self.vocabulary))
+
+
+def _lengths_to_indptr(lengths) -> np.ndarray:
+    """
+    Converts a sequence of itemset lengths to a CSR offsets array.
+    """
+    indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(np.asarray(lengths, dtype=np.int64), out=indptr[1:])
+    return indptr
+
+
+def _encode_itemsets(itemsets, vocabulary: ItemVocabulary):
+    """
+    Interns a sequence of itemsets into a CSR encoded (indptr, indices) pair.
+    """
+    lengths = np.fromiter(map(len, itemsets), dtype=np.int64, count=len(itemsets))
+    return _lengths_to_indptr(lengths), vocabulary.encode(chain.from_iterable(itemsets))
+
+
+def as_rule_set(rules) -> RuleSet:
+    """
+    Returns the rules as a RuleSet, encoding them if they are a list of Rule
+    objects and passing them through unchanged if they already are one.
+    """
+    if isinstance(rules, RuleSet):
+        return rules
+    return RuleSet.from_rules(rules)
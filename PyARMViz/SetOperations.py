@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bulk set operations on rule collections: dedupe, merge and diff.
+
+Two rules are the same rule when their antecedent and consequent item sets
+match, regardless of item order, repeats or counts (as with Rule.__eq__).
+Instead of hashing Rule objects one at a time, every rule is keyed by its
+canonical (sorted, deduplicated) antecedent and consequent codes over a
+shared vocabulary, and the collections are joined by sorting those keys.
+"""
+
+import numpy as np
+
+from PyARMViz.Filtering import itemset_groups, padded_itemsets
+from PyARMViz.RuleSet import RuleSet, as_rule_set
+
+#Metrics reported by diff
+DIFF_METRICS = ("confidence", "support", "lift", "conviction")
+
+
+def _rule_keys(rule_set: RuleSet) -> np.ndarray:
+    '''
+        One fixed width row per rule: the padded canonical antecedent codes followed by the
+        padded canonical consequent codes
+    '''
+    return np.column_stack([
+        padded_itemsets(rule_set.lhs_indptr, rule_set.lhs_indices),
+        padded_itemsets(rule_set.rhs_indptr, rule_set.rhs_indices),
+    ])
+
+
+def rule_ids(rules):
+    '''
+        Numbers the distinct rules of a collection (see the module docstring), returns the
+        number of every rule and the position of the first rule of each number
+
+        >>> from PyARMViz.Rule import Rule
+        >>> ids, first = rule_ids([Rule(('a', 'b'), ('c',), 1, 2, 3, 10), Rule(('b', 'a'), ('c',), 2, 4, 6, 20)])
+        >>> ids.tolist(), first.tolist()
+        ([0, 0], [0])
+    '''
+    return itemset_groups(_rule_keys(as_rule_set(rules)), return_index=True)
+
+
+def _shared_collections(collections):
+    '''
+        The collections as RuleSets over one vocabulary (a copy of the first one's), joined end
+        to end, with the collection of every rule
+    '''
+    rule_sets = [as_rule_set(rules) for rules in collections]
+    joined = RuleSet.concatenate(rule_sets)
+    sources = np.repeat(np.arange(len(rule_sets)), [len(rule_set) for rule_set in rule_sets])
+    return joined, sources
+
+
+def duplicate_mask(rules) -> np.ndarray:
+    '''
+        Boolean mask of the rules equal to an earlier rule of the collection
+    '''
+    ids, first = rule_ids(rules)
+    mask = np.ones(len(ids), dtype=bool)
+    mask[first] = False
+    return mask
+
+
+def dedupe(rules) -> RuleSet:
+    '''
+        The collection without its repeated rules, keeping the first of each in the original
+        order
+    '''
+    rule_set = as_rule_set(rules)
+    return rule_set.take(~duplicate_mask(rule_set))
+
+
+def merge(*collections) -> RuleSet:
+    '''
+        Merges the rules of several runs (lists of Rules or RuleSets, e.g. one per store or
+        week) into one RuleSet with every distinct rule once, in order of first appearance
+
+        The counts of a rule, and its num_transactions, are summed over the runs it appears in
+        (a rule repeated within one run is counted once), so its metrics are those of the runs
+        taken together
+    '''
+    joined, sources = _shared_collections(collections)
+    ids, first = itemset_groups(_rule_keys(joined), return_index=True)
+    #Keep one rule per id and run, then sum those per id
+    run_count = max(len(collections), 1)
+    per_run = _first_positions(ids * run_count + sources, len(first) * run_count)
+    per_run = per_run[per_run >= 0]
+    per_run_ids = ids[per_run]
+    order = np.argsort(first)
+    merged = joined.take(first[order])
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[order] = np.arange(len(first))
+
+    def summed(counts):
+        return np.bincount(rank[per_run_ids], weights=counts[per_run], minlength=len(first)).astype(np.int64)
+
+    return RuleSet(
+        merged.vocabulary,
+        merged.lhs_indptr,
+        merged.lhs_indices,
+        merged.rhs_indptr,
+        merged.rhs_indices,
+        summed(joined.count_full),
+        summed(joined.count_lhs),
+        summed(joined.count_rhs),
+        summed(joined.num_transactions),
+    )
+
+
+class RuleSetDiff(object):
+    """
+    The difference between two rule collections: the rules only in the new
+    one (added), only in the old one (removed), and for the rules in both
+    the change of every metric from the old to the new collection.
+    """
+
+    def __init__(self, added: RuleSet, removed: RuleSet, common: RuleSet, old_index: np.ndarray, new_index: np.ndarray, deltas: dict):
+        self.added = added
+        self.removed = removed
+        #The rules in both, as they are in the new collection
+        self.common = common
+        #Positions of the common rules in the old and new collections
+        self.old_index = old_index
+        self.new_index = new_index
+        #Metric name -> new value minus old value of every common rule
+        self.deltas = deltas
+
+    def changed(self, metric: str = "confidence", tolerance: float = 0.0) -> RuleSet:
+        '''
+            The common rules whose metric moved by more than tolerance, with undefined changes
+            (NaN) left out
+        '''
+        with np.errstate(invalid='ignore'):
+            return self.common.take(np.abs(self.deltas[metric]) > tolerance)
+
+    def summary(self) -> dict:
+        return dict(added=len(self.added), removed=len(self.removed), common=len(self.common))
+
+    def __repr__(self):
+        return "RuleSetDiff({added} added, {removed} removed, {common} common)".format(**self.summary())
+
+
+def _first_positions(ids: np.ndarray, id_count: int) -> np.ndarray:
+    '''
+        The first position of every id in ids, -1 for the ids it does not hold
+    '''
+    order = np.argsort(ids, kind="stable")
+    sorted_ids = ids[order]
+    starts = np.r_[True, sorted_ids[1:] != sorted_ids[:-1]] if len(ids) else np.zeros(0, dtype=bool)
+    positions = np.full(id_count, -1, dtype=np.int64)
+    positions[sorted_ids[starts]] = order[starts]
+    return positions
+
+
+def diff(old, new) -> RuleSetDiff:
+    '''
+        Compares two rule collections (lists of Rules or RuleSets), joining them on their rule
+        keys. Repeated rules are matched by their first occurrence
+
+        >>> from PyARMViz.Rule import Rule
+        >>> old = [Rule(('a',), ('b',), 5, 10, 10, 100), Rule(('b',), ('c',), 5, 10, 10, 100)]
+        >>> new = [Rule(('a',), ('b',), 8, 10, 10, 100), Rule(('c',), ('d',), 5, 10, 10, 100)]
+        >>> changes = diff(old, new)
+        >>> changes
+        RuleSetDiff(1 added, 1 removed, 1 common)
+        >>> changes.deltas['confidence']
+        array([0.3])
+    '''
+    old_set, new_set = as_rule_set(old), as_rule_set(new)
+    joined, _ = _shared_collections([old_set, new_set])
+    ids, first = itemset_groups(_rule_keys(joined), return_index=True)
+    id_count = len(first)
+
+    #First position of every id in each collection, -1 where it is missing. The ids are
+    #numbered by first appearance, so those found in the old collection were found there first
+    old_positions = np.where(first < len(old_set), first, -1)
+    new_positions = _first_positions(ids[len(old_set):], id_count)
+
+    in_both = (old_positions >= 0) & (new_positions >= 0)
+    common_ids = np.flatnonzero(in_both)
+    #Common rules in the order of the new collection
+    common_ids = common_ids[np.argsort(new_positions[common_ids])]
+    old_index, new_index = old_positions[common_ids], new_positions[common_ids]
+    old_common, new_common = old_set.take(old_index), new_set.take(new_index)
+    with np.errstate(invalid='ignore'):
+        deltas = {metric: getattr(new_common, metric) - getattr(old_common, metric) for metric in DIFF_METRICS}
+
+    added = np.sort(new_positions[(new_positions >= 0) & (old_positions < 0)])
+    removed = np.sort(old_positions[(old_positions >= 0) & (new_positions < 0)])
+    return RuleSetDiff(new_set.take(added), old_set.take(removed), new_common, old_index, new_index, deltas)
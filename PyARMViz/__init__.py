@@ -8,12 +8,30 @@ Advanced Python Association Rule Visualization Library
 # See https://semver.org/
 __version__ = "0.1.4"
 
-import sys 
-
-#Specific function
-from PyARMViz.PyARMViz import adjacency_parallel_category_plot
-from PyARMViz.PyARMViz import adjacency_parallel_coordinate_plot
-from PyARMViz.PyARMViz import adjacency_graph_gephi
-from PyARMViz.PyARMViz import adjacency_graph_plotly
-from PyARMViz.PyARMViz import adjacency_scatter_plot
-from PyARMViz.PyARMViz import metadata_scatter_plot
\ No newline at end of file
+import importlib
+
+#Specific function, imported from its module on first access (PEP 562) so that importing the
+#package, for instance only to load rules, does not load plotly, networkx and numpy
+_LAZY_ATTRIBUTES = {
+    'adjacency_parallel_category_plot': 'PyARMViz.PyARMViz',
+    'adjacency_parallel_coordinate_plot': 'PyARMViz.PyARMViz',
+    'adjacency_graph_gephi': 'PyARMViz.PyARMViz',
+    'adjacency_graph_plotly': 'PyARMViz.PyARMViz',
+    'adjacency_scatter_plot': 'PyARMViz.PyARMViz',
+    'metadata_scatter_plot': 'PyARMViz.PyARMViz',
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,22 +1,97 @@
 
-from typing import List
-from zipfile import ZipFile
+from typing import Iterator, List
 
-from tarfile import TarFile
 import tarfile
 from io import TextIOWrapper
-from io import StringIO
 import csv
+import gzip
+import lzma
+import bz2
+from itertools import chain, islice
 
-import logging
-
-import pandas as pd
-
-from os.path import dirname, exists, expanduser, isdir, join, splitext
-from bokeh.layouts import row
+from os.path import dirname, join, splitext
 from PyARMViz.Rule import Rule, generate_rule_from_dict
 import json
 
+#Openers of the compressed single file formats, by extension
+_COMPRESSED_OPENERS = {
+    '.gz': gzip.open,
+    '.xz': lzma.open,
+    '.bz2': bz2.open,
+}
+
+def open_compressed(path: str, mode: str = "rb", encoding: str = None):
+    '''
+        Opens path with the gzip/bz2/xz opener matching its extension, or as a plain file, in
+        mode (binary or text, with encoding for text)
+    '''
+    _, extension = splitext(path)
+    opener = _COMPRESSED_OPENERS.get(extension.lower(), open)
+    return opener(path, mode, encoding=encoding)
+
+def _open_transaction_stream(path: str, member: str = None):
+    '''
+        Opens a binary stream over the CSV data in path, which can be a tar archive (optionally
+        gzip/bz2/xz compressed), a gzip/bz2/xz compressed file or a plain file
+        
+        Tar members are extracted as a stream, by default the first regular file is used
+        
+        Returns the stream and a list of the resources to close with it
+    '''
+    if tarfile.is_tarfile(path):
+        tar = tarfile.open(path, "r:*")
+        try:
+            if member is None:
+                member = next((tar_member for tar_member in tar if tar_member.isfile()), None)
+                if member is None:
+                    raise ValueError("no transaction file in archive")
+            return tar.extractfile(member), [tar]
+        except Exception:
+            tar.close()
+            raise
+    
+    return open_compressed(path, "rb"), []
+
+def iter_transaction_batches(path: str, batch_size: int = 1000, member: str = None, encoding: str = 'utf-8') -> Iterator[List[List]]:
+    '''
+        Streams a CSV file of transactions (one transaction per row, one item per column) in
+        batches of at most batch_size transactions
+        
+        The data is decompressed and decoded incrementally, so only the current batch is held
+        in memory. See _open_transaction_stream for the supported file types
+    '''
+    stream, resources = _open_transaction_stream(path, member)
+    try:
+        text = TextIOWrapper(stream, encoding=encoding, newline='')
+        reader = csv.reader(text)
+        while True:
+            batch = list(islice(reader, batch_size))
+            if not batch:
+                break
+            yield batch
+    finally:
+        stream.close()
+        for resource in resources:
+            resource.close()
+
+def iter_transactions(path: str, batch_size: int = 1000, member: str = None, encoding: str = 'utf-8') -> Iterator[List]:
+    '''
+        Streams the transactions of a CSV file one at a time, reading them in batches of
+        batch_size (see iter_transaction_batches)
+        
+        Can be passed straight to the miner, e.g. mine_rules(iter_transactions(path))
+    '''
+    return chain.from_iterable(iter_transaction_batches(path, batch_size, member, encoding))
+
+def iter_shopping_transactions(batch_size: int = 1000) -> Iterator[List[List]]:
+    '''
+        Streams the test dataset of shopping transactions (see load_shopping_transactions) in
+        batches of batch_size transactions
+    '''
+    module_path = dirname(__file__)
+    shopping_data_uri = join(module_path, 'Online_Retail_Grouped.tar.xz')
+    return iter_transaction_batches(shopping_data_uri, batch_size, member='Online_Retail_Grouped.csv')
+
 def load_shopping_transactions() -> List[List]:
     '''
         Test dataset of shopping transaction data for testing PyARMViz visualizations
@@ -27,16 +102,10 @@ def load_shopping_transactions() -> List[List]:
         they reflect the entire buying history of an individual
         
         Stored in compressed csv, provided in Python List-of-List-of-Strings
-    '''
-    module_path = dirname(__file__)
-    shopping_data_uri = join(module_path, 'Online_Retail_Grouped.tar.xz')
-    with tarfile.open(shopping_data_uri, "r:xz") as tar:   
-        f=tar.extractfile('Online_Retail_Grouped.csv')
         
-        
-        csv_file_buffer=StringIO(f.read().decode('utf-8'))
-        data = list(csv.reader(csv_file_buffer))
-        return data
+        Use iter_shopping_transactions to stream the data instead
+    '''
+    return list(chain.from_iterable(iter_shopping_transactions()))
         
         
 def load_shopping_rules() -> List[Rule]:
@@ -48,6 +117,54 @@ def load_shopping_rules() -> List[Rule]:
     '''
     module_path=dirname(__file__)
     shopping_rule_data_uri = join(module_path, 'Online_Retail_Rules.json')
-    rule_dicts = json.load(open(shopping_rule_data_uri, 'r'))
+    with open(shopping_rule_data_uri, 'r') as rule_file:
+        rule_dicts = json.load(rule_file)
     rules = list(map(lambda rule_dict: generate_rule_from_dict(rule_dict), rule_dicts))
-    return rules
\ No newline at end of file
+    return rules
+
+def generate_synthetic_rules(rule_count: int, item_count: int = 1000, min_lhs_length: int = 1, max_lhs_length: int = 3,
+                             rhs_length: int = 1, num_transactions: int = 100000, seed: int = 0, columnar: bool = False):
+    '''
+        Random association rules for benchmarks and tests, over item_count items named
+        "item 0", "item 1", ... with antecedent lengths drawn uniformly from min_lhs_length
+        to max_lhs_length and rhs_length consequents. The items of a rule are distinct and
+        the counts are consistent (count_full <= count_lhs, count_rhs <= num_transactions)
+        
+        Returns a RuleSet if columnar, otherwise a list of Rules. The same seed always
+        produces the same rules
+    '''
+    #NumPy is only needed here, it is imported on first use to keep the datasets import light
+    import numpy as np
+    from PyARMViz.RuleSet import ItemVocabulary, RuleSet, _lengths_to_indptr
+    
+    if max_lhs_length + rhs_length > item_count:
+        raise ValueError("A rule needs more distinct items than the vocabulary has")
+    generator = np.random.default_rng(seed)
+    lhs_lengths = generator.integers(min_lhs_length, max_lhs_length + 1, rule_count)
+    
+    #Every rule walks the items in steps small enough to never wrap past its first item, so
+    #its antecedents and consequents are distinct
+    width = max_lhs_length + rhs_length
+    steps = generator.integers(1, item_count // width + 1, (rule_count, width))
+    steps[:, 0] = generator.integers(0, item_count, rule_count)
+    codes = (np.cumsum(steps, axis=1) % item_count).astype(np.int32)
+    lhs_mask = np.arange(width) < lhs_lengths[:, None]
+    rhs_mask = (np.arange(width) >= lhs_lengths[:, None]) & (np.arange(width) < (lhs_lengths + rhs_length)[:, None])
+    
+    count_lhs = generator.integers(1, num_transactions // 10 + 2, rule_count)
+    count_full = (count_lhs * generator.random(rule_count)).astype(np.int64) + 1
+    count_full = np.minimum(count_full, count_lhs)
+    count_rhs = np.minimum(count_full + generator.integers(0, num_transactions // 10 + 1, rule_count), num_transactions)
+    
+    rule_set = RuleSet(
+        ItemVocabulary("item {}".format(code) for code in range(item_count)),
+        _lengths_to_indptr(lhs_lengths),
+        codes[lhs_mask],
+        _lengths_to_indptr(np.full(rule_count, rhs_length)),
+        codes[rhs_mask],
+        count_full,
+        count_lhs,
+        count_rhs,
+        np.full(rule_count, num_transactions, dtype=np.int64),
+    )
+    return rule_set if columnar else rule_set.to_rules()
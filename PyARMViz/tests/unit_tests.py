@@ -1,8 +1,44 @@
 import unittest
+import PyARMViz as PyARMViz_package
 from PyARMViz import PyARMViz
 from PyARMViz import datasets
+from PyARMViz.Rule import Rule, FrozenRule, generate_frozen_rule_from_rule
+from PyARMViz.RuleSet import ItemVocabulary, RuleSet
+from PyARMViz.RuleIO import save_rule_set, load_rule_set, iter_column_chunks, iter_json_lines, iter_rule_batches
+from PyARMViz.Miner import MINING_ALGORITHMS, VerticalBitmaps, mine_itemsets, mine_rules, popcount_rows
+from PyARMViz.AdjacencyGraph import adjacency_graph_csr
+from PyARMViz.GraphExport import write_adjacency_gexf
+from PyARMViz.Report import render_html_report, render_json_report, report_figures
+from PyARMViz.Filtering import filter_rules, item_mask, itemset_ids, prune_redundant, redundant_mask, threshold_mask, top_k
+from PyARMViz.ItemIndex import ItemIndex
+from PyARMViz.Profiling import profile_stages, profiling_enabled, stage
+from PyARMViz.Layout import LAYOUT_CACHE, clear_layout_cache, force_directed_layout, refine_layout
+from PyARMViz.Incremental import IncrementalVisualizer
+from PyARMViz.SetOperations import dedupe, diff, duplicate_mask, merge
+from PyARMViz.Rescoring import rescore_rules
+from PyARMViz.AxisOrdering import AxisOrderingEngine, ORDERING_STRATEGIES, encode_axis_pairs, count_crossings
+
+import numpy as np
+import plotly.graph_objects as go
+import plotly.offline
+import networkx as nx
 
 import os
+import sys
+import subprocess
+import json
+from unittest import mock
+import random
+import itertools
+import collections
+import tempfile
+import shutil
+import csv
+import gzip
+import lzma
+import bz2
+import tarfile
+import pickle
 
 import logging
 
@@ -15,17 +51,1186 @@ class MyTest(unittest.TestCase):
         self.rules = datasets.load_shopping_rules()
         
     def test_plotly_rule_graph(self):
-        graph = PyARMViz.generate_rule_graph_plotly(self.rules,)
-        self.assertTrue(True)
+        graph = PyARMViz.adjacency_graph_plotly(self.rules, show_flag=False)
+        self.assertIsInstance(graph, go.Figure)
         #generate_rule_strength_plot(rules)
     def test_graphml_rule_graph(self):
-        test_file_path = './test.gexf'
-        graph = PyARMViz.generate_rule_graph_graphml(self.rules, test_file_path)
-        self.assertTrue(os.path.exists(test_file_path))
+        test_directory = tempfile.mkdtemp()
+        try:
+            test_file_path = os.path.join(test_directory, 'test.gexf')
+            graph = PyARMViz.adjacency_graph_gephi(self.rules, test_file_path)
+            self.assertTrue(os.path.exists(test_file_path))
+        finally:
+            shutil.rmtree(test_directory)
     def test_plotly_rule_strength_plot(self):
-        PyARMViz.generate_rule_strength_plot(self.rules)
+        PyARMViz.metadata_scatter_plot(self.rules, show_flag=False)
         self.assertTrue(True)
     def test_plotly_parallel_coordinate_plot(self):
-        PyARMViz.generate_parallel_coordinate_plot(self.rules)
+        PyARMViz.adjacency_parallel_coordinate_plot(self.rules, show_flag=False)
     def test_plotly_parallel_category_plot(self):
-        PyARMViz.generate_parallel_category_plot(self.rules)
\ No newline at end of file
+        PyARMViz.adjacency_parallel_category_plot(self.rules, show_flag=False)
+
+class RuleSetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+        self.rule_set = RuleSet.from_rules(self.rules)
+
+    def test_round_trip(self):
+        self.assertEqual(len(self.rule_set), len(self.rules))
+        for original, decoded in zip(self.rules, self.rule_set.to_rules()):
+            self.assertEqual(tuple(original.lhs), decoded.lhs)
+            self.assertEqual(tuple(original.rhs), decoded.rhs)
+            self.assertEqual(original.count_full, decoded.count_full)
+            self.assertEqual(original.num_transactions, decoded.num_transactions)
+
+    def test_vectorized_metrics_match_rule(self):
+        for metric in RuleSet.metric_names:
+            expected = [getattr(rule, metric) for rule in self.rules]
+            self.assertEqual(getattr(self.rule_set, metric).tolist(), expected)
+
+    def test_undefined_metrics_are_nan(self):
+        rule_set = RuleSet.from_rules([Rule(('a',), ('b',), 0, 0, 0, 0)])
+        for metric in RuleSet.metric_names:
+            self.assertTrue(np.isnan(getattr(rule_set, metric)[0]))
+
+    def test_slicing(self):
+        subset = self.rule_set[5:10]
+        self.assertIsInstance(subset, RuleSet)
+        self.assertEqual(subset.to_rules(), self.rules[5:10])
+        self.assertEqual(self.rule_set[-1], self.rules[-1])
+        mask = self.rule_set.lhs_lengths > 1
+        self.assertEqual(
+            self.rule_set[mask].to_rules(),
+            [rule for rule in self.rules if len(rule.lhs) > 1],
+        )
+
+    def test_metadata_scatter_plot_accepts_rule_set(self):
+        fig = PyARMViz.metadata_scatter_plot(self.rule_set, show_flag=False)
+        list_fig = PyARMViz.metadata_scatter_plot(self.rules, show_flag=False)
+        self.assertEqual(list(fig.data[0].x), list(list_fig.data[0].x))
+
+
+class FrozenRuleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+        self.frozen_rules = [generate_frozen_rule_from_rule(rule) for rule in self.rules]
+
+    def test_metrics_match_rule(self):
+        for rule, frozen_rule in zip(self.rules, self.frozen_rules):
+            for metric in RuleSet.metric_names:
+                self.assertEqual(getattr(rule, metric), getattr(frozen_rule, metric))
+            self.assertEqual(str(rule), str(frozen_rule))
+            self.assertEqual(len(rule), len(frozen_rule))
+
+    def test_equality_and_hash_compatible_with_rule(self):
+        frozen_rule = FrozenRule(('b', 'a'), ('c',), 1, 2, 3, 4)
+        rule = Rule(('a', 'b'), ('c',))
+        self.assertEqual(frozen_rule, FrozenRule(('a', 'b', 'a'), ('c',)))
+        self.assertNotEqual(frozen_rule, FrozenRule(('a',), ('b', 'c')))
+        self.assertEqual(frozen_rule, rule)
+        self.assertEqual(hash(frozen_rule), hash(rule))
+        self.assertEqual(len(set(self.frozen_rules) | set(self.rules)), len(set(self.rules)))
+
+    def test_immutable(self):
+        frozen_rule = self.frozen_rules[0]
+        with self.assertRaises(AttributeError):
+            frozen_rule.count_full = 0
+        with self.assertRaises(AttributeError):
+            frozen_rule.extra = 0
+        self.assertFalse(hasattr(frozen_rule, '__dict__'))
+
+    def test_key_hash_and_metrics_cached(self):
+        frozen_rule = FrozenRule(['b', 'a'], ['c'], 1, 2, 3, 4)
+        other = FrozenRule(('a', 'b'), ('c',))
+        self.assertEqual(frozen_rule.key, (('a', 'b'), ('c',)))
+        with mock.patch('PyARMViz.Rule._canonical_itemset') as canonical, \
+                mock.patch.object(Rule, 'confidence', new_callable=mock.PropertyMock) as confidence:
+            self.assertEqual(frozen_rule.confidence, 0.5)
+            self.assertEqual(hash(frozen_rule), hash(Rule(('a', 'b'), ('c',))))
+            self.assertEqual(frozen_rule, other)
+        canonical.assert_not_called()
+        confidence.assert_not_called()
+        self.assertEqual(pickle.loads(pickle.dumps(frozen_rule)).key, frozen_rule.key)
+
+    def test_undefined_metrics(self):
+        frozen_rule = FrozenRule(('a',), ('b',))
+        self.assertIsNone(frozen_rule.confidence)
+        self.assertIsNone(frozen_rule.lift)
+        self.assertIsNone(frozen_rule.conviction)
+        self.assertIsNone(frozen_rule.rpf)
+
+
+def _reference_cross_counter(rules, unique_entities_permutation, axis_count):
+    '''
+        The original pairwise crossing counter, kept as a reference for the equivalence test
+    '''
+    cross_count = 0
+    for axis_index in range(0, axis_count - 1):
+        for rule1, rule2 in itertools.combinations(rules, 2):
+            if axis_index < (axis_count - 1) - 1:
+                src_axis_position1 = rule1.lhs[axis_index]
+                dst_axis_position1 = rule2.lhs[axis_index]
+                src_axis_position2 = rule1.lhs[axis_index + 1]
+                dst_axis_position2 = rule2.lhs[axis_index + 1]
+            else:
+                src_axis_position1 = rule1.lhs[axis_index]
+                dst_axis_position1 = rule2.lhs[axis_index]
+                src_axis_position2 = rule1.rhs[0]
+                dst_axis_position2 = rule2.rhs[0]
+
+            src_delta = unique_entities_permutation.index(src_axis_position1) - unique_entities_permutation.index(src_axis_position2)
+            dst_delta = unique_entities_permutation.index(dst_axis_position1) - unique_entities_permutation.index(dst_axis_position2)
+
+            if src_delta < 0 and dst_delta > 0:
+                cross_count += 1
+            elif src_delta > 0 and dst_delta < 0:
+                cross_count += 1
+    return cross_count
+
+
+class CrossCounterTest(unittest.TestCase):
+
+    def test_randomized_equivalence(self):
+        rng = random.Random(7)
+        for trial in range(60):
+            axis_count = rng.randint(2, 4)
+            entities = ["item{}".format(index) for index in range(rng.randint(2, 12))]
+            rules = [
+                Rule(tuple(rng.choice(entities) for _ in range(axis_count - 1)), (rng.choice(entities),))
+                for _ in range(rng.randint(0, 40))
+            ]
+            permutation = list(entities)
+            rng.shuffle(permutation)
+            self.assertEqual(
+                PyARMViz._parallel_coord_cross_counter(rules, permutation, axis_count),
+                _reference_cross_counter(rules, permutation, axis_count),
+            )
+
+    def test_shopping_rules_equivalence(self):
+        rules = [rule for rule in datasets.load_shopping_rules() if len(rule.lhs) == 2 and len(rule.rhs) == 1]
+        entities = sorted({entity for rule in rules for entity in list(rule.lhs) + list(rule.rhs)})
+        self.assertEqual(
+            PyARMViz._parallel_coord_cross_counter(rules, entities, 3),
+            _reference_cross_counter(rules, entities, 3),
+        )
+
+
+class AxisOrderingTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(3)
+        self.entities = ["item{}".format(index) for index in range(30)]
+        self.rules = [
+            Rule((rng.choice(self.entities), rng.choice(self.entities)), (rng.choice(self.entities),))
+            for _ in range(300)
+        ]
+        self.axis_pairs = encode_axis_pairs(self.rules, self.entities, 3)
+
+    def test_never_worse_than_initial_and_reports_history(self):
+        for strategy in ORDERING_STRATEGIES:
+            result = AxisOrderingEngine(strategies=(strategy,), max_iterations=300).optimize(self.axis_pairs, len(self.entities))
+            self.assertLessEqual(result.crossings, result.initial_crossings)
+            self.assertEqual(sorted(result.order.tolist()), list(range(len(self.entities))))
+            crossings = [entry[2] for entry in result.history]
+            self.assertEqual(crossings, sorted(crossings, reverse=True))
+            self.assertEqual(crossings[-1], result.crossings)
+            positions = np.empty(len(self.entities), dtype=np.int64)
+            positions[result.order] = np.arange(len(self.entities))
+            self.assertEqual(count_crossings(self.axis_pairs, positions), result.crossings)
+
+    def test_default_engine_improves_on_identity(self):
+        result = AxisOrderingEngine().optimize(self.axis_pairs, len(self.entities))
+        self.assertLess(result.crossings, result.initial_crossings)
+        self.assertLessEqual(result.evaluations, 1000)
+
+    def test_seeded_results_are_reproducible(self):
+        first = AxisOrderingEngine(strategies=('annealing',), seed=11).optimize(self.axis_pairs, len(self.entities))
+        second = AxisOrderingEngine(strategies=('annealing',), seed=11).optimize(self.axis_pairs, len(self.entities))
+        self.assertEqual(first.order.tolist(), second.order.tolist())
+
+    def test_budget(self):
+        result = AxisOrderingEngine(strategies=('random',), max_iterations=50, patience=1000).optimize(self.axis_pairs, len(self.entities))
+        self.assertEqual(result.evaluations, 50)
+
+    def test_custom_strategy(self):
+        def reverse_strategy(search):
+            search.evaluate(search.best_order[::-1])
+        result = AxisOrderingEngine(strategies=(reverse_strategy,)).optimize(self.axis_pairs, len(self.entities))
+        self.assertEqual(result.evaluations, 2)
+        with self.assertRaises(ValueError):
+            AxisOrderingEngine(strategies=('unknown',))
+
+
+class MinerTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(5)
+        items = "abcdefgh"
+        self.transactions = [rng.sample(items, rng.randint(1, 6)) for _ in range(150)]
+
+    def _brute_force_itemsets(self, min_support):
+        items = sorted({item for transaction in self.transactions for item in transaction})
+        itemsets = {}
+        for length in range(1, len(items) + 1):
+            for itemset in itertools.combinations(items, length):
+                count = sum(1 for transaction in self.transactions if set(itemset) <= set(transaction))
+                if count / len(self.transactions) >= min_support:
+                    itemsets[itemset] = count
+        return itemsets
+
+    def test_itemsets_match_brute_force(self):
+        expected = self._brute_force_itemsets(0.1)
+        for algorithm in MINING_ALGORITHMS:
+            self.assertEqual(mine_itemsets(self.transactions, 0.1, algorithm=algorithm), expected)
+        self.assertEqual(mine_itemsets(iter(self.transactions), 0.1, algorithm='eclat', n_jobs=2), expected)
+        self.assertEqual(
+            mine_itemsets(self.transactions, 0.1, max_length=2),
+            {itemset: count for itemset, count in expected.items() if len(itemset) <= 2},
+        )
+
+    def test_entry_points_share_the_default_algorithm(self):
+        with mock.patch.dict(MINING_ALGORITHMS, {name: mock.Mock(return_value={}) for name in MINING_ALGORITHMS}):
+            mine_itemsets(self.transactions, 0.1)
+            mine_rules(self.transactions, 0.1, 0.5)
+            called = [name for name, search in MINING_ALGORITHMS.items() if search.called]
+            self.assertEqual(called, ['eclat'])
+            self.assertEqual(MINING_ALGORITHMS['eclat'].call_count, 2)
+
+    def test_rules_have_consistent_counts(self):
+        rules = mine_rules(self.transactions, 0.1, 0.5, algorithm='apriori', n_jobs=2)
+        self.assertEqual(set(rules), set(mine_rules(self.transactions, 0.1, 0.5, algorithm='eclat')))
+        for rule in rules:
+            self.assertGreaterEqual(rule.confidence, 0.5)
+            self.assertEqual(rule.num_transactions, len(self.transactions))
+            lhs = set(rule.lhs)
+            self.assertEqual(rule.count_lhs, sum(1 for transaction in self.transactions if lhs <= set(transaction)))
+
+    def test_reproduces_bundled_rules(self):
+        transactions = datasets.load_shopping_transactions()
+        rules = mine_rules(transactions, min_support=0.05, min_confidence=0.7, max_length=3)
+        expected = {rule: rule for rule in datasets.load_shopping_rules()}
+        self.assertEqual(set(rules), set(expected))
+        for rule in rules:
+            self.assertEqual(
+                (rule.count_full, rule.count_lhs, rule.count_rhs, rule.num_transactions),
+                (expected[rule].count_full, expected[rule].count_lhs, expected[rule].count_rhs, expected[rule].num_transactions),
+            )
+
+    def test_vertical_bitmaps(self):
+        vertical = VerticalBitmaps.from_transactions(self.transactions)
+        self.assertEqual(vertical.num_transactions, len(self.transactions))
+        counts = vertical.counts()
+        for code, item in enumerate(vertical.vocabulary):
+            self.assertEqual(counts[code], sum(1 for transaction in self.transactions if item in transaction))
+        self.assertEqual(int(popcount_rows(vertical.itemset_bitmap([]))), len(self.transactions))
+
+
+class TransactionLoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.transactions = [['milk', 'eggs'], ['bread'], ['milk', 'bread, sliced', 'jam']] * 7
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, opener):
+        path = os.path.join(self.directory, name)
+        with opener(path, 'wt', newline='') as output:
+            csv.writer(output).writerows(self.transactions)
+        return path
+
+    def test_batches(self):
+        path = self._write('transactions.csv', open)
+        batches = list(datasets.iter_transaction_batches(path, batch_size=4))
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 4, 4, 4, 1])
+        self.assertEqual([transaction for batch in batches for transaction in batch], self.transactions)
+
+    def test_compressed_files(self):
+        for name, opener in (('t.csv.gz', gzip.open), ('t.csv.xz', lzma.open), ('t.csv.bz2', bz2.open)):
+            path = self._write(name, opener)
+            self.assertEqual(list(datasets.iter_transactions(path, batch_size=5)), self.transactions)
+
+    def test_tar_archive(self):
+        csv_path = self._write('transactions.csv', open)
+        tar_path = os.path.join(self.directory, 'transactions.tar.gz')
+        with tarfile.open(tar_path, 'w:gz') as tar:
+            tar.add(csv_path, arcname='transactions.csv')
+        self.assertEqual(list(datasets.iter_transactions(tar_path)), self.transactions)
+
+    def test_tar_archive_without_files(self):
+        tar_path = os.path.join(self.directory, 'empty.tar')
+        with tarfile.open(tar_path, 'w') as tar:
+            folder = tarfile.TarInfo('folder')
+            folder.type = tarfile.DIRTYPE
+            tar.addfile(folder)
+        with mock.patch.object(tarfile.TarFile, 'close', autospec=True, side_effect=tarfile.TarFile.close) as close:
+            with self.assertRaisesRegex(ValueError, 'no transaction file in archive'):
+                list(datasets.iter_transactions(tar_path))
+        close.assert_called()
+
+    def test_shopping_transactions(self):
+        transactions = datasets.load_shopping_transactions()
+        batches = list(datasets.iter_shopping_transactions(batch_size=1000))
+        self.assertEqual(len(transactions), 4372)
+        self.assertEqual(len(batches), 5)
+        self.assertEqual([transaction for batch in batches for transaction in batch], transactions)
+
+    def test_miner_consumes_stream(self):
+        path = self._write('transactions.csv.gz', gzip.open)
+        self.assertEqual(
+            set(mine_rules(datasets.iter_transactions(path, batch_size=2), 0.2, 0.5)),
+            set(mine_rules(self.transactions, 0.2, 0.5)),
+        )
+
+
+class RuleFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'rules.pyarm')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        save_rule_set(self.rules, self.path)
+        for mmap in (True, False):
+            rule_set = load_rule_set(self.path, mmap=mmap)
+            self.assertEqual(len(rule_set), len(self.rules))
+            for original, loaded in zip(self.rules, rule_set):
+                self.assertEqual(tuple(original.lhs), loaded.lhs)
+                self.assertEqual(tuple(original.rhs), loaded.rhs)
+                self.assertEqual(
+                    (original.count_full, original.count_lhs, original.count_rhs, original.num_transactions),
+                    (loaded.count_full, loaded.count_lhs, loaded.count_rhs, loaded.num_transactions),
+                )
+            self.assertEqual(rule_set.lift.tolist(), [rule.lift for rule in self.rules])
+
+    def test_memory_mapped_slicing(self):
+        save_rule_set(RuleSet.from_rules(self.rules), self.path)
+        rule_set = load_rule_set(self.path)
+        self.assertFalse(rule_set.count_full.flags.owndata)
+        subset = rule_set[10:20]
+        self.assertTrue(np.shares_memory(subset.count_full, rule_set.count_full))
+        self.assertTrue(np.shares_memory(subset.lhs_indices, rule_set.lhs_indices))
+        self.assertEqual(subset.to_rules(), self.rules[10:20])
+        self.assertEqual(rule_set[::7].to_rules(), self.rules[::7])
+        self.assertIn(self.rules[0].lhs[0], rule_set.vocabulary)
+
+    def test_integer_items_and_empty_sets(self):
+        rules = [Rule((1, 2), (3,), 5, 10, 20, 100), Rule((3,), (-4,), 5, 20, 7, 100)]
+        save_rule_set(rules, self.path)
+        self.assertEqual(load_rule_set(self.path).to_rules(), rules)
+        self.assertEqual(load_rule_set(self.path)[0].lhs, (1, 2))
+        save_rule_set([], self.path)
+        self.assertEqual(len(load_rule_set(self.path)), 0)
+
+    def test_rejects_other_files(self):
+        with open(self.path, 'wb') as rule_file:
+            rule_file.write(b'not a rule file')
+        with self.assertRaises(ValueError):
+            load_rule_set(self.path)
+        with self.assertRaises(TypeError):
+            save_rule_set([Rule(('a', 1), ('b',))], self.path)
+
+
+class MetadataScatterRenderModeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+
+    def test_auto_mode_thresholds(self):
+        self.assertIsInstance(PyARMViz.metadata_scatter_plot(self.rules, show_flag=False).data[0], go.Scatter)
+        fig = PyARMViz.metadata_scatter_plot(self.rules, webgl_threshold=10, show_flag=False)
+        self.assertIsInstance(fig.data[0], go.Scattergl)
+        fig = PyARMViz.metadata_scatter_plot(self.rules, webgl_threshold=10, density_threshold=20, show_flag=False)
+        self.assertIsInstance(fig.data[0], go.Heatmap)
+
+    def test_hover_only_for_top_rules(self):
+        fig = PyARMViz.metadata_scatter_plot(self.rules, allow_compound_flag=True, render_mode='webgl', hover_top_k=5, show_flag=False)
+        self.assertIsNone(fig.data[0].text)
+        self.assertEqual(len(fig.data[1].text), 5)
+        top_lift = sorted((rule.lift for rule in self.rules), reverse=True)[:5]
+        self.assertEqual(list(fig.data[1].marker.color), top_lift)
+
+    def test_density_aggregates(self):
+        rules = [
+            Rule(('a',), ('b',), 10, 20, 40, 100),
+            Rule(('c',), ('d',), 10, 20, 20, 100),
+            Rule(('e',), ('f',), 50, 50, 100, 100),
+        ]
+        for aggregate, expected in (('mean', (1.25 + 2.5) / 2), ('max', 2.5)):
+            fig = PyARMViz.metadata_scatter_plot(rules, render_mode='density', bins=2, lift_aggregate=aggregate, show_flag=False)
+            heatmap = fig.data[0]
+            z = np.asarray(heatmap.z, dtype=float)
+            self.assertEqual(z.shape, (2, 2))
+            self.assertAlmostEqual(z[0, 0], expected)
+            self.assertEqual(int(np.asarray(heatmap.customdata).sum()), 3)
+            self.assertEqual(np.count_nonzero(np.isnan(z)), 2)
+
+
+class LayoutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+        clear_layout_cache()
+
+    def test_force_directed_layout(self):
+        rng = np.random.default_rng(1)
+        sources, targets = rng.integers(0, 300, 600), rng.integers(0, 300, 600)
+        positions = force_directed_layout(300, sources, targets, seed=4)
+        self.assertEqual(positions.shape, (300, 2))
+        self.assertTrue(np.all(np.isfinite(positions)))
+        self.assertAlmostEqual(np.abs(positions).max(), 1.0)
+        np.testing.assert_array_equal(positions, force_directed_layout(300, sources, targets, seed=4))
+        self.assertEqual(force_directed_layout(0, [], []).shape, (0, 2))
+
+    def test_connected_nodes_are_closer(self):
+        #Two disconnected cliques should be laid out apart from each other
+        sources, targets = zip(*[(a, b) for group in (range(0, 10), range(10, 20)) for a in group for b in group if a < b])
+        positions = force_directed_layout(20, sources, targets, iterations=200)
+        within = np.linalg.norm(positions[0] - positions[1:10], axis=1).mean()
+        between = np.linalg.norm(positions[0] - positions[10:20], axis=1).mean()
+        self.assertLess(within, between)
+
+    def test_plot_uses_cache(self):
+        fig = PyARMViz.adjacency_graph_plotly(self.rules, show_flag=False)
+        self.assertEqual(len(LAYOUT_CACHE), 1)
+        again = PyARMViz.adjacency_graph_plotly(self.rules, show_flag=False)
+        self.assertEqual(len(LAYOUT_CACHE), 1)
+        self.assertEqual(list(fig.data[1].x), list(again.data[1].x))
+        PyARMViz.adjacency_graph_plotly(self.rules, seed=1, show_flag=False)
+        self.assertEqual(len(LAYOUT_CACHE), 2)
+
+    def test_edge_coordinates(self):
+        fig = PyARMViz.adjacency_graph_plotly(self.rules, layout='spring', use_cache=False, show_flag=False)
+        graph = PyARMViz._adjacency_graph_generator(self.rules)
+        edge_x = np.asarray(fig.data[0].x, dtype=float)
+        self.assertEqual(len(edge_x), 3 * graph.number_of_edges())
+        self.assertTrue(np.all(np.isnan(edge_x[2::3])))
+        self.assertEqual(len(LAYOUT_CACHE), 0)
+
+
+def _reference_adjacency_graph(rules):
+    '''
+        The original per rule graph construction, kept as a reference for the bulk builder
+    '''
+    graph = nx.DiGraph()
+    for index, rule in enumerate(rules):
+        graph.add_node(index, Weight=int(rule.confidence*10), type="Association_Rule")
+        for entity in rule.lhs:
+            graph.add_node(entity, Weight=1, type="Entity")
+            graph.add_edge(entity, index, Normalized_Lift=int(rule.lift*10))
+        for entity in rule.rhs:
+            graph.add_node(entity, Weight=1, type="Entity")
+            graph.add_edge(index, entity, Normalized_Lift=int(rule.lift*10))
+    return graph
+
+
+class AdjacencyGraphTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+
+    def test_bulk_graph_matches_reference(self):
+        graph = PyARMViz._adjacency_graph_generator(self.rules)
+        reference = _reference_adjacency_graph(self.rules)
+        self.assertEqual(dict(graph.nodes(data=True)), dict(reference.nodes(data=True)))
+        self.assertEqual(
+            {(src, dst): data for src, dst, data in graph.edges(data=True)},
+            {(src, dst): data for src, dst, data in reference.edges(data=True)},
+        )
+
+    def test_csr_structure(self):
+        rules = [Rule(('a', 'b'), ('c',), 5, 10, 20, 100), Rule(('c', 'c'), ('a',), 5, 20, 10, 100)]
+        adjacency = adjacency_graph_csr(rules)
+        self.assertEqual(adjacency.node_labels, [0, 1, 'a', 'b', 'c'])
+        self.assertEqual(adjacency.node_count, 5)
+        edges = set(zip(adjacency.sources.tolist(), adjacency.targets.tolist()))
+        self.assertEqual(edges, {(2, 0), (3, 0), (0, 4), (4, 1), (1, 2)})
+        self.assertEqual(adjacency.indptr.tolist(), [0, 1, 2, 3, 4, 5])
+        self.assertEqual(adjacency.weights.tolist(), [int(rules[0].lift * 10), int(rules[1].lift * 10), 
+                                                      int(rules[0].lift * 10), int(rules[0].lift * 10), int(rules[1].lift * 10)])
+
+    def test_subset_uses_only_its_items(self):
+        subset = RuleSet.from_rules(self.rules)[-3:]
+        adjacency, reference = adjacency_graph_csr(subset), adjacency_graph_csr(subset.to_rules())
+        self.assertEqual((adjacency.node_count, adjacency.edge_count), (reference.node_count, reference.edge_count))
+        self.assertEqual(sorted(map(str, adjacency.node_labels)), sorted(map(str, reference.node_labels)))
+
+        def labelled_edges(graph):
+            return {(graph.node_labels[source], graph.node_labels[target])
+                    for source, target in zip(graph.sources.tolist(), graph.targets.tolist())}
+        self.assertEqual(labelled_edges(adjacency), labelled_edges(reference))
+        graph = PyARMViz._adjacency_graph_generator(subset)
+        self.assertEqual(graph.number_of_nodes(), reference.node_count)
+
+    def test_undefined_metrics_weigh_zero(self):
+        adjacency = adjacency_graph_csr([Rule(('a',), ('b',), 0, 0, 0, 10)])
+        self.assertEqual(adjacency.weights.tolist(), [0, 0])
+        self.assertEqual(adjacency.node_weights.tolist(), [0, 1, 1])
+
+
+class GraphExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+        self.directory = tempfile.mkdtemp()
+        reference = _reference_adjacency_graph(self.rules)
+        self.reference_nodes = {str(node): (data['Weight'], data['type']) for node, data in reference.nodes(data=True)}
+        self.reference_edges = {(str(src), str(dst)): data['Normalized_Lift'] for src, dst, data in reference.edges(data=True)}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _check_graph(self, graph):
+        self.assertEqual({node: (data['Weight'], data['type']) for node, data in graph.nodes(data=True)}, self.reference_nodes)
+        self.assertEqual({(src, dst): data['Normalized_Lift'] for src, dst, data in graph.edges(data=True)}, self.reference_edges)
+
+    def test_streaming_gexf(self):
+        path = os.path.join(self.directory, 'rules.gexf')
+        #A generator, the writer only iterates the rules once
+        self.assertIsNone(PyARMViz.adjacency_graph_gephi((rule for rule in self.rules), path, streaming=True))
+        self._check_graph(nx.read_gexf(path, relabel=True))
+
+    def test_streaming_compressed_graphml(self):
+        path = os.path.join(self.directory, 'rules.graphml.gz')
+        PyARMViz.adjacency_graph_gephi(self.rules, path, streaming=True, compress=True)
+        with gzip.open(path, 'rb') as graph_file:
+            graph = nx.read_graphml(graph_file)
+        graph = nx.relabel_nodes(graph, {node: data['label'] for node, data in graph.nodes(data=True)})
+        self._check_graph(graph)
+
+    def test_escaped_labels_and_repeated_items(self):
+        path = os.path.join(self.directory, 'rules.gexf')
+        write_adjacency_gexf([Rule(('a<b', 'a<b'), ('"c" & d',), 5, 10, 20, 100)], path)
+        graph = nx.read_gexf(path, relabel=True)
+        self.assertEqual(set(graph.nodes()), {'0', 'a<b', '"c" & d'})
+        self.assertEqual(graph.number_of_edges(), 2)
+
+
+    def test_streaming_matches_graph_for_undefined_metrics(self):
+        rules = [Rule(('a',), ('b',), 0, 0, 0, 0), Rule(('b',), ('c',), 5, 10, 20, 100)]
+        path = os.path.join(self.directory, 'graph.gexf')
+        streamed_path = os.path.join(self.directory, 'streamed.gexf')
+        PyARMViz.adjacency_graph_gephi(rules, path)
+        PyARMViz.adjacency_graph_gephi(rules, streamed_path, streaming=True)
+        graph = nx.read_gexf(path)
+        streamed = nx.read_gexf(streamed_path, relabel=True)
+        self.assertEqual({node: (data['Weight'], data['type']) for node, data in streamed.nodes(data=True)},
+                         {node: (data['Weight'], data['type']) for node, data in graph.nodes(data=True)})
+        self.assertEqual({(src, dst): data['Normalized_Lift'] for src, dst, data in streamed.edges(data=True)},
+                         {(src, dst): data['Normalized_Lift'] for src, dst, data in graph.edges(data=True)})
+        self.assertEqual(streamed.nodes['0']['Weight'], 0)
+
+
+class ReportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+
+    def test_headless_entry_points(self):
+        with mock.patch.object(go.Figure, 'show') as show:
+            figures = report_figures(self.rules)
+        show.assert_not_called()
+        self.assertTrue(all(isinstance(figure, go.Figure) for figure in figures.values()))
+        self.assertIn("Parallel Coordinates, 2 Axes", figures)
+        self.assertIn("Parallel Categories, 3 Axes", figures)
+
+    def test_html_report_embeds_plotlyjs_once(self):
+        figures = report_figures(self.rules)
+        report = render_html_report(figures)
+        self.assertEqual(report.count(plotly.offline.get_plotlyjs()), 1)
+        self.assertEqual(report.count('Plotly.newPlot('), len(figures))
+        self.assertNotIn(plotly.offline.get_plotlyjs(), render_html_report(figures, include_plotlyjs='cdn'))
+
+    def test_json_report(self):
+        figures = [PyARMViz.metadata_scatter_plot(self.rules, show_flag=False), PyARMViz.adjacency_scatter_plot(self.rules, show_flag=False)]
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'report.json')
+            report = render_json_report(figures, path, n_jobs=2)
+            self.assertEqual(json.loads(report), json.loads(render_json_report(figures)))
+            with open(path) as report_file:
+                bundle = json.load(report_file)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual([entry['title'] for entry in bundle['figures']], ["Association Rules Strength Distribution", "Figure 2"])
+        self.assertEqual(go.Figure(bundle['figures'][0]['figure']).data[0].type, 'scatter')
+
+
+def _import_profile(statement):
+    '''
+        Runs statement in a fresh interpreter with -X importtime, returns the cumulative import
+        time in microseconds of every top level package it imported
+    '''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_time, module = line[len('import time:'):].split('|')
+        module = module.strip()
+        if '.' not in module:
+            cumulative[module] = max(cumulative.get(module, 0), int(cumulative_time))
+    return cumulative
+
+
+class ImportTimeTest(unittest.TestCase):
+    #Budget for importing the package and loading rules, well above the expected time
+    IMPORT_BUDGET_MICROSECONDS = 500000
+
+    def test_datasets_import_is_light(self):
+        cumulative = _import_profile("import PyARMViz; from PyARMViz import datasets; datasets.load_shopping_rules()")
+        for heavy in ('plotly', 'networkx', 'numpy', 'pandas', 'bokeh'):
+            self.assertNotIn(heavy, cumulative)
+        self.assertLess(cumulative['PyARMViz'], self.IMPORT_BUDGET_MICROSECONDS)
+
+    def test_plot_functions_load_on_access(self):
+        cumulative = _import_profile("import PyARMViz; PyARMViz.metadata_scatter_plot")
+        self.assertIn('plotly', cumulative)
+        self.assertIs(PyARMViz.metadata_scatter_plot, PyARMViz_package.metadata_scatter_plot)
+        self.assertIn('metadata_scatter_plot', dir(PyARMViz_package))
+        with self.assertRaises(AttributeError):
+            PyARMViz_package.not_a_plot
+
+
+def _reference_redundant(rules):
+    '''
+        Quadratic reference for redundancy pruning over Rule objects
+    '''
+    redundant = []
+    for rule in rules:
+        redundant.append(any(
+            set(other.rhs) == set(rule.rhs) and set(other.lhs) < set(rule.lhs) and rule.confidence <= other.confidence
+            for other in rules
+        ))
+    return redundant
+
+
+class FilteringTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+        generator = random.Random(7)
+        items = ['a', 'b', 'c', 'd', 'e']
+        self.random_rules = []
+        for _ in range(300):
+            lhs = tuple(generator.sample(items, generator.randint(1, 4)))
+            rhs = (generator.choice(['x', 'y']),)
+            count_lhs = generator.randint(10, 20)
+            self.random_rules.append(Rule(lhs, rhs, generator.randint(0, count_lhs), count_lhs, 30, 100))
+
+    def test_redundant_mask_matches_reference(self):
+        self.assertEqual(redundant_mask(self.random_rules).tolist(), _reference_redundant(self.random_rules))
+        self.assertEqual(redundant_mask(self.rules).tolist(), _reference_redundant(self.rules))
+
+    def test_redundant_mask_without_hashing(self):
+        #Colliding row hashes make the index fall back to comparing the rows themselves
+        with mock.patch('PyARMViz.Filtering._row_hashes', lambda matrix: np.zeros(len(matrix), dtype=np.uint64)):
+            self.assertEqual(redundant_mask(self.random_rules).tolist(), _reference_redundant(self.random_rules))
+
+    def test_prune_redundant(self):
+        rules = [
+            Rule(('a',), ('c',), 8, 10, 20, 100),
+            Rule(('b', 'a'), ('c',), 4, 5, 20, 100),
+            Rule(('a', 'b'), ('d',), 4, 5, 20, 100),
+            Rule(('a', 'b', 'e'), ('c',), 5, 5, 20, 100),
+        ]
+        pruned = prune_redundant(rules)
+        self.assertIsInstance(pruned, RuleSet)
+        self.assertEqual(pruned.to_rules(), [rules[0], rules[2], rules[3]])
+
+    def test_thresholds_and_items(self):
+        filtered = filter_rules(self.rules, min_confidence=0.8, max_lhs_length=1)
+        expected = [rule for rule in self.rules if rule.confidence >= 0.8 and len(rule.lhs) <= 1]
+        self.assertEqual(filtered.to_rules(), expected)
+        item = self.rules[0].rhs[0]
+        self.assertEqual(filter_rules(self.rules, items=[item], side='rhs').to_rules(), [rule for rule in self.rules if item in rule.rhs])
+        self.assertEqual(item_mask(self.rules, [item, 'not an item'], match='all').sum(), 0)
+        with self.assertRaises(ValueError):
+            threshold_mask(self.rules, confidence=0.5)
+
+    def test_top_k(self):
+        best = top_k(self.rules, 10, metric='lift')
+        expected = sorted(range(len(self.rules)), key=lambda index: (-self.rules[index].lift, index))[:10]
+        self.assertEqual(best.to_rules(), [self.rules[index] for index in expected])
+        self.assertEqual(len(top_k(self.rules, 0)), 0)
+        self.assertEqual(len(top_k(self.rules, len(self.rules) + 5)), len(self.rules))
+        self.assertIsInstance(PyARMViz.metadata_scatter_plot(best, show_flag=False), go.Figure)
+
+
+class ItemIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+        self.index = ItemIndex(self.rules)
+        self.items = sorted(set(item for rule in self.rules for item in rule.lhs + rule.rhs))
+
+    def _scan(self, items, side, match):
+        sides = {'lhs': lambda rule: set(rule.lhs), 'rhs': lambda rule: set(rule.rhs), 'either': lambda rule: set(rule.lhs) | set(rule.rhs)}
+        test = all if match == 'all' else any
+        return [index for index, rule in enumerate(self.rules) if test(item in sides[side](rule) for item in items)]
+
+    def test_queries_match_scan(self):
+        generator = random.Random(3)
+        for _ in range(50):
+            items = generator.sample(self.items, generator.randint(1, 3))
+            for side in ('lhs', 'rhs', 'either'):
+                for match in ('all', 'any'):
+                    self.assertEqual(self.index.query(items, side, match).tolist(), self._scan(items, side, match))
+
+    def test_unknown_items_and_subset(self):
+        item = self.items[0]
+        self.assertEqual(self.index.query([item, 'not an item']).tolist(), [])
+        self.assertEqual(self.index.query([item, 'not an item'], match='any').tolist(), self._scan([item], 'either', 'any'))
+        subset = self.index.subset([item])
+        self.assertEqual(subset.to_rules(), [self.rules[index] for index in self._scan([item], 'either', 'all')])
+        self.assertIsInstance(PyARMViz.adjacency_graph_plotly(subset, show_flag=False), go.Figure)
+        self.assertEqual(self.index.item_counts()[item], len(subset))
+
+    def test_repeated_items(self):
+        index = ItemIndex([Rule(('a', 'a'), ('b',), 5, 10, 20, 100)])
+        self.assertEqual(index.rules_with('a', 'lhs').tolist(), [0])
+
+
+class SyntheticRulesTest(unittest.TestCase):
+
+    def test_synthetic_rules(self):
+        rules = datasets.generate_synthetic_rules(500, item_count=50, min_lhs_length=2, max_lhs_length=4, rhs_length=2, num_transactions=1000, seed=5)
+        self.assertEqual(len(rules), 500)
+        self.assertEqual(rules, datasets.generate_synthetic_rules(500, item_count=50, min_lhs_length=2, max_lhs_length=4, rhs_length=2, num_transactions=1000, seed=5))
+        for rule in rules:
+            self.assertTrue(2 <= len(rule.lhs) <= 4)
+            self.assertEqual(len(rule.rhs), 2)
+            self.assertEqual(len(set(rule.lhs + rule.rhs)), len(rule.lhs) + len(rule.rhs))
+            self.assertTrue(0 < rule.count_full <= min(rule.count_lhs, rule.count_rhs))
+            self.assertTrue(rule.count_rhs <= rule.num_transactions)
+
+    def test_columnar_synthetic_rules(self):
+        rule_set = datasets.generate_synthetic_rules(1000, item_count=20, columnar=True)
+        self.assertIsInstance(rule_set, RuleSet)
+        self.assertTrue(np.all((rule_set.confidence > 0) & (rule_set.confidence <= 1)))
+        with self.assertRaises(ValueError):
+            datasets.generate_synthetic_rules(10, item_count=3, max_lhs_length=3)
+
+
+class ProfilingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+
+    def test_parallel_plot_stages(self):
+        collected = []
+        with profile_stages(collected.append) as stats:
+            figures = PyARMViz.adjacency_parallel_coordinate_plot(self.rules, axis_ordering=AxisOrderingEngine(max_iterations=20), show_flag=False)
+        self.assertEqual(collected, [stats])
+        for name in ('group_rules', 'order_axes', 'build_dimensions', 'build_figure'):
+            self.assertIn(name, stats)
+        self.assertNotIn('show', stats)
+        self.assertEqual(stats['build_figure'].calls, len(figures))
+        self.assertEqual(stats['group_rules'].items, sum(1 for rule in self.rules if len(rule.rhs) == 1))
+        self.assertEqual(stats['build_dimensions'].items, stats['group_rules'].items)
+        self.assertIn('order_axes', stats.report())
+
+    def test_graph_stages_and_nesting(self):
+        with profile_stages() as outer:
+            PyARMViz.metadata_scatter_plot(self.rules, show_flag=False)
+            with profile_stages() as inner:
+                PyARMViz.adjacency_graph_plotly(self.rules, show_flag=False)
+        self.assertEqual(list(inner), ['build_graph', 'layout', 'build_figure'])
+        self.assertEqual(list(outer), ['encode_rules', 'compute_metrics', 'build_figure'])
+        self.assertEqual(outer['encode_rules'].items, len(self.rules))
+
+    def test_scatter_and_category_stages(self):
+        with profile_stages() as heatmap_stats:
+            PyARMViz.adjacency_scatter_plot(self.rules, show_flag=False, mode='heatmap')
+        self.assertEqual(list(heatmap_stats), ['label_itemsets', 'aggregate_cells', 'order_axes', 'build_figure'])
+        with profile_stages() as category_stats:
+            PyARMViz.adjacency_parallel_category_plot(self.rules, show_flag=False)
+        self.assertEqual(list(category_stats), ['group_rules', 'aggregate_paths', 'build_dimensions', 'build_figure'])
+        with profile_stages() as coordinate_stats:
+            PyARMViz.adjacency_parallel_coordinate_plot(self.rules, axis_ordering=AxisOrderingEngine(max_iterations=20), show_flag=False)
+        self.assertGreaterEqual(coordinate_stats['count_crossings'].calls, coordinate_stats['order_axes'].calls)
+
+    def test_trace_memory(self):
+        with profile_stages(trace_memory=True) as stats:
+            with stage('outer'):
+                with stage('inner'):
+                    allocated = np.ones(1 << 20)
+                del allocated
+                np.ones(1 << 18)
+        self.assertGreaterEqual(stats['inner'].peak_bytes, 8 << 20)
+        self.assertGreaterEqual(stats['outer'].peak_bytes, stats['inner'].peak_bytes)
+        with profile_stages() as untraced:
+            with stage('outer'):
+                np.ones(1 << 20)
+        self.assertEqual(untraced['outer'].peak_bytes, 0)
+
+    def test_show_is_a_stage(self):
+        with mock.patch.object(go.Figure, 'show') as show, profile_stages() as stats:
+            PyARMViz.adjacency_scatter_plot(self.rules)
+        show.assert_called_once_with()
+        self.assertEqual(stats['show'].calls, 1)
+
+    def test_disabled_profiling_records_nothing(self):
+        self.assertFalse(profiling_enabled())
+        self.assertIs(stage('layout'), stage('build_figure'))
+        with stage('layout') as disabled:
+            disabled.add_items(10)
+
+
+class EncodedPlotBuilderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+        self.grouped_rules = [[rule for rule in self.rules if len(rule.rhs) == 1 and len(rule.lhs) == antecedent_count]
+                              for antecedent_count in (1, 2)]
+
+    def test_parallel_coordinate_values_decode_to_rule_items(self):
+        figures = PyARMViz.adjacency_parallel_coordinate_plot(self.rules, axis_ordering=AxisOrderingEngine(max_iterations=20), show_flag=False)
+        self.assertEqual(len(figures), len(self.grouped_rules))
+        for figure, rules in zip(figures, self.grouped_rules):
+            dimensions = figure.data[0].dimensions
+            axis_items = [[dimension.ticktext[value] for value in dimension.values] for dimension in dimensions]
+            self.assertEqual([list(items) for items in zip(*axis_items)], [list(rule.lhs) + list(rule.rhs) for rule in rules])
+            self.assertEqual(sorted(dimensions[0].ticktext), sorted({item for rule in rules for item in rule.lhs + rule.rhs}))
+
+    def test_parallel_category_labels(self):
+        figures = PyARMViz.adjacency_parallel_category_plot(self.rules, show_flag=False)
+        for figure, rules in zip(figures, self.grouped_rules):
+            axis_items = [dimension.values for dimension in figure.data[0].dimensions]
+            paths = collections.Counter(tuple(rule.lhs) + tuple(rule.rhs) for rule in rules)
+            self.assertEqual(dict(zip(zip(*axis_items), figure.data[0].counts)), dict(paths))
+
+    def test_scatter_labels_decoded_per_itemset(self):
+        figure = PyARMViz.adjacency_scatter_plot(self.rules, show_flag=False)
+        self.assertEqual(list(figure.data[0].x), [str(tuple(rule.rhs)) for rule in self.rules])
+        self.assertEqual(list(figure.data[0].y), [str(tuple(rule.lhs)) for rule in self.rules])
+        self.assertTrue(np.allclose(figure.data[0].marker.size, [20 * rule.confidence for rule in self.rules]))
+
+    def test_itemset_ids_ignore_item_order(self):
+        rule_set = RuleSet.from_rules([Rule(('a', 'b'), ('c',), 1, 2, 3, 10), Rule(('b', 'a'), ('c',), 1, 2, 3, 10),
+                                       Rule(('a',), ('b',), 1, 2, 3, 10)])
+        ids, first = itemset_ids(rule_set.lhs_indptr, rule_set.lhs_indices)
+        self.assertEqual(ids[0], ids[1])
+        self.assertNotEqual(ids[0], ids[2])
+        self.assertEqual(sorted(first.tolist()), [0, 2])
+
+
+class ParallelGroupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.generate_synthetic_rules(600, 40, max_lhs_length=3, columnar=True)
+
+    def test_worker_processes_build_the_same_figures(self):
+        engine = AxisOrderingEngine(max_iterations=50, seed=3)
+        sequential = PyARMViz.adjacency_parallel_coordinate_plot(self.rules, axis_ordering=engine, show_flag=False)
+        concurrent = PyARMViz.adjacency_parallel_coordinate_plot(self.rules, axis_ordering=engine, show_flag=False, n_jobs=2)
+        self.assertEqual(len(concurrent), 3)
+        self.assertEqual([json.loads(figure.to_json()) for figure in sequential], [json.loads(figure.to_json()) for figure in concurrent])
+        categories = PyARMViz.adjacency_parallel_category_plot(self.rules, show_flag=False, n_jobs=2)
+        self.assertEqual([json.loads(figure.to_json()) for figure in categories],
+                         [json.loads(figure.to_json()) for figure in PyARMViz.adjacency_parallel_category_plot(self.rules, show_flag=False)])
+
+    def test_seed_override(self):
+        axis_pairs = encode_axis_pairs([Rule(('a',), ('b',), 1, 2, 3, 10), Rule(('b',), ('c',), 1, 2, 3, 10)], ['a', 'b', 'c'], 2)
+        engine = AxisOrderingEngine(strategies=('annealing',), max_iterations=30, seed=0)
+        overridden = engine.optimize(axis_pairs, 3, seed=[0, 2])
+        self.assertEqual(overridden.order.tolist(), AxisOrderingEngine(strategies=('annealing',), max_iterations=30, seed=[0, 2]).optimize(axis_pairs, 3).order.tolist())
+        self.assertEqual(engine.seed, 0)
+
+
+class IncrementalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+
+    def assert_graph_matches(self, visualizer, rules):
+        adjacency = adjacency_graph_csr(rules)
+        rule_ids = visualizer.rule_ids().tolist()
+        labels = [rule_ids[node] if node < len(rules) else label for node, label in enumerate(adjacency.node_labels)]
+        self.assertEqual(set(visualizer.edges()), {(labels[source], labels[target]) for source, target in zip(adjacency.sources.tolist(), adjacency.targets.tolist())})
+        self.assertEqual(set(visualizer.node_positions()), set(labels))
+
+    def test_deltas_match_full_rebuild(self):
+        visualizer = IncrementalVisualizer(self.rules[:20])
+        added = visualizer.add(self.rules[20:])
+        self.assertEqual(added.tolist(), list(range(20, len(self.rules))))
+        self.assert_graph_matches(visualizer, self.rules)
+        visualizer.update(added=self.rules[:3], removed=list(range(10)) + added[-5:].tolist())
+        remaining = self.rules[10:-5] + self.rules[:3]
+        self.assertEqual(visualizer.rule_count, len(remaining))
+        self.assert_graph_matches(visualizer, remaining)
+
+    def test_existing_nodes_keep_their_positions(self):
+        visualizer = IncrementalVisualizer(self.rules[:30])
+        before = visualizer.node_positions()
+        visualizer.add(RuleSet.from_rules(self.rules[30:]))
+        after = visualizer.node_positions()
+        for label, position in before.items():
+            self.assertEqual(after[label], position)
+        self.assertTrue(np.isfinite(list(after.values())).all())
+
+    def test_figures_patched_in_place(self):
+        visualizer = IncrementalVisualizer(self.rules[:30])
+        graph_figure = visualizer.graph_figure()
+        scatter_figure = visualizer.scatter_figure()
+        added = visualizer.add(self.rules[30:])
+        visualizer.remove(added[:4])
+        self.assertIs(visualizer.graph_figure(), graph_figure)
+        node_x = np.asarray(graph_figure.data[1].x, dtype=np.float64)
+        self.assertEqual(int(np.isfinite(node_x).sum()), visualizer.node_count)
+        self.assertEqual(int(np.isfinite(np.asarray(graph_figure.data[0].x, dtype=np.float64)).sum()), 2 * visualizer.edge_count)
+        scatter_x = [label for label in scatter_figure.data[0].x if label is not None]
+        self.assertEqual(sorted(scatter_x), sorted(str(tuple(rule.rhs)) for rule in self.rules[:30] + self.rules[34:]))
+
+    def test_deltas_recompute_only_their_edges(self):
+        visualizer = IncrementalVisualizer(self.rules[:30])
+        graph_figure = visualizer.graph_figure()
+        before = np.asarray(graph_figure.data[0].x, dtype=np.float64)
+        edge_count = visualizer.edge_count
+        with mock.patch.object(visualizer, '_update_edge_coordinates', wraps=visualizer._update_edge_coordinates) as update:
+            visualizer.add(self.rules[30:40])
+        recomputed = np.concatenate([call.args[0] for call in update.call_args_list])
+        self.assertEqual(len(recomputed), visualizer.edge_count - edge_count)
+        self.assertTrue((recomputed >= edge_count).all())
+        after = np.asarray(graph_figure.data[0].x, dtype=np.float64)
+        np.testing.assert_array_equal(after[:len(before)], before)
+        self.assertTrue(np.isfinite(after[len(before):]).sum() == 2 * len(recomputed))
+
+    def test_refine_layout_moves_only_movable_nodes(self):
+        positions = np.random.default_rng(0).uniform(-1, 1, (10, 2))
+        original = positions.copy()
+        refine_layout(positions, [8, 9], [0, 1, 8], [8, 9, 9], iterations=20)
+        np.testing.assert_array_equal(positions[:8], original[:8])
+        self.assertFalse(np.array_equal(positions[8:], original[8:]))
+
+
+class AdjacencyHeatmapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+
+    def cells(self, figure):
+        matrix = np.array(figure.data[0].z, dtype=np.float64)
+        return {(row, column): matrix[row_index, column_index]
+                for row_index, row in enumerate(figure.data[0].y) for column_index, column in enumerate(figure.data[0].x)
+                if not np.isnan(matrix[row_index, column_index])}
+
+    def test_cells_reduce_confidence(self):
+        grouped = {}
+        for rule in self.rules:
+            grouped.setdefault((str(tuple(rule.lhs)), str(tuple(rule.rhs))), []).append(rule.confidence)
+        for aggregate, reduce in (('max', max), ('mean', np.mean)):
+            figure = PyARMViz.adjacency_scatter_plot(self.rules, show_flag=False, mode='heatmap', aggregate=aggregate)
+            self.assertEqual(len(figure.data), 1)
+            cells = self.cells(figure)
+            self.assertEqual(set(cells), set(grouped))
+            for cell, confidences in grouped.items():
+                self.assertAlmostEqual(cells[cell], reduce(confidences))
+
+    def test_top_n_keeps_the_busiest_sets(self):
+        figure = PyARMViz.adjacency_scatter_plot(self.rules, show_flag=False, mode='heatmap', top_n=(5, 3))
+        self.assertEqual(np.array(figure.data[0].z).shape, (5, 3))
+        consequent_counts = {}
+        for rule in self.rules:
+            consequent_counts[str(tuple(rule.rhs))] = consequent_counts.get(str(tuple(rule.rhs)), 0) + 1
+        self.assertEqual(min(consequent_counts[label] for label in figure.data[0].x), sorted(consequent_counts.values())[-3])
+
+    def test_seriation_gathers_blocks(self):
+        rules = [Rule((antecedent,), (consequent,), 5, 10, 10, 100)
+                 for block in (('a', 'c', 'e'), ('b', 'd', 'f'))
+                 for antecedent in block for consequent in [item.upper() for item in block]]
+        figure = PyARMViz.adjacency_scatter_plot(rules, show_flag=False, mode='heatmap')
+        rows = [label.strip("(',)") for label in figure.data[0].y]
+        columns = [label.strip("(',)") for label in figure.data[0].x]
+        self.assertIn(set(rows[:3]), [{'a', 'c', 'e'}, {'b', 'd', 'f'}])
+        self.assertEqual({column.lower() for column in columns[:3]}, set(rows[:3]))
+        unordered = PyARMViz.adjacency_scatter_plot(rules, show_flag=False, mode='heatmap', seriation=False)
+        self.assertEqual([label.strip("(',)") for label in unordered.data[0].y], ['a', 'c', 'e', 'b', 'd', 'f'])
+
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError):
+            PyARMViz.adjacency_scatter_plot(self.rules, show_flag=False, mode='matrix')
+        with self.assertRaises(ValueError):
+            PyARMViz.adjacency_scatter_plot(self.rules, show_flag=False, mode='heatmap', aggregate='median')
+
+
+class SetOperationsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+        #The same rules with their items reversed, under a different vocabulary
+        self.reversed_rules = [Rule(tuple(reversed(rule.lhs)), tuple(reversed(rule.rhs)), rule.count_full, rule.count_lhs,
+                                    rule.count_rhs, rule.num_transactions) for rule in reversed(self.rules)]
+
+    def test_dedupe_matches_rule_equality(self):
+        collection = self.rules + self.reversed_rules[:10]
+        seen, expected = set(), []
+        for rule in collection:
+            if rule not in seen:
+                seen.add(rule)
+                expected.append(rule)
+        self.assertEqual(int(duplicate_mask(collection).sum()), 10)
+        self.assertEqual(dedupe(collection).to_rules(), expected)
+
+    def test_concatenate_and_recode(self):
+        joined = RuleSet.concatenate([RuleSet.from_rules(self.rules[:5]), RuleSet.from_rules(self.reversed_rules[:5])])
+        self.assertEqual(joined.to_rules(), self.rules[:5] + self.reversed_rules[:5])
+        self.assertEqual(list(joined.count_full), [rule.count_full for rule in self.rules[:5] + self.reversed_rules[:5]])
+
+    def test_merge_sums_counts(self):
+        first_run = RuleSet.from_rules(self.rules[:30] + self.rules[:2])
+        second_run = self.reversed_rules
+        merged = merge(first_run, second_run)
+        #First appearance order: the first run, then the rest of the second run
+        expected = self.rules[:30] + self.rules[:29:-1]
+        self.assertEqual(merged.to_rules(), expected)
+        runs = np.array([2 if index < 30 else 1 for index in range(len(expected))])
+        np.testing.assert_array_equal(merged.count_full, runs * [rule.count_full for rule in expected])
+        np.testing.assert_array_equal(merged.num_transactions, runs * [rule.num_transactions for rule in expected])
+        np.testing.assert_allclose(merged.confidence, [rule.confidence for rule in expected])
+
+    def test_diff(self):
+        old = self.rules[:30]
+        new = [Rule(rule.lhs, rule.rhs, rule.count_full - 1, rule.count_lhs, rule.count_rhs, rule.num_transactions) for rule in self.reversed_rules[:-10]]
+        changes = diff(old, new)
+        self.assertEqual(changes.removed.to_rules(), self.rules[:10])
+        self.assertEqual(set(changes.added.to_rules()), set(self.rules[30:]))
+        self.assertEqual(len(changes.common), 20)
+        for old_position, new_position, delta in zip(changes.old_index, changes.new_index, changes.deltas['confidence']):
+            self.assertEqual(old[old_position], new[new_position])
+            self.assertAlmostEqual(delta, new[new_position].confidence - old[old_position].confidence)
+        self.assertEqual(len(changes.changed('confidence')), 20)
+        self.assertEqual(len(diff(old, old).changed('lift')), 0)
+
+
+class RescoringTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+        self.transactions = datasets.load_shopping_transactions()[:2000]
+
+    def reference_counts(self, rule, transactions):
+        transaction_sets = [set(transaction) for transaction in transactions]
+
+        def count(items):
+            return sum(1 for transaction in transaction_sets if set(items) <= transaction)
+        return (count(rule.lhs + rule.rhs), count(rule.lhs), count(rule.rhs), len(transactions))
+
+    def test_counts_match_a_transaction_scan(self):
+        rescored = rescore_rules(self.rules, self.transactions)
+        self.assertEqual(rescored, self.rules)
+        for rule, original in zip(rescored, self.rules):
+            self.assertEqual((rule.count_full, rule.count_lhs, rule.count_rhs, rule.num_transactions),
+                             self.reference_counts(original, self.transactions))
+
+    def test_prebuilt_bitmaps_and_small_memory_budget(self):
+        window = self.transactions[:500]
+        vertical = VerticalBitmaps.from_transactions(window)
+        rescored = rescore_rules(RuleSet.from_rules(self.rules), vertical, columnar=True, memory_budget=1)
+        self.assertIsInstance(rescored, RuleSet)
+        for index, original in enumerate(self.rules):
+            self.assertEqual((int(rescored.count_full[index]), int(rescored.count_lhs[index]), int(rescored.count_rhs[index])),
+                             self.reference_counts(original, window)[:3])
+
+    def test_unknown_items_count_zero(self):
+        rescored = rescore_rules([Rule(('milk', 'eggs'), ('caviar',), 1, 1, 1, 1)], [['milk', 'eggs'], ['milk']], columnar=True)
+        self.assertEqual((rescored.count_full.tolist(), rescored.count_lhs.tolist(), rescored.count_rhs.tolist()), ([0], [1], [0]))
+        self.assertTrue(np.isnan(rescore_rules([Rule(('caviar',), ('milk',), 1, 1, 1, 1)], [['milk']], columnar=True).confidence[0]))
+
+
+class ParallelCategoryPathTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = [Rule(('a',), ('b',), 2, 4, 4, 10), Rule(('a',), ('b',), 3, 4, 4, 10), Rule(('c',), ('b',), 1, 4, 4, 10),
+                      Rule(('d',), ('e',), 4, 4, 4, 10), Rule(('a',), ('e',), 4, 8, 4, 10)]
+
+    def test_identical_paths_are_counted_once(self):
+        parcats = PyARMViz.adjacency_parallel_category_plot(self.rules, show_flag=False)[0].data[0]
+        paths = list(zip(*[dimension.values for dimension in parcats.dimensions]))
+        self.assertEqual(paths, [('a', 'b'), ('c', 'b'), ('d', 'e'), ('a', 'e')])
+        self.assertEqual(list(parcats.counts), [2, 1, 1, 1])
+        self.assertTrue(np.allclose(parcats.line.color, [0.625, 0.25, 1.0, 0.5]))
+        maximum = PyARMViz.adjacency_parallel_category_plot(self.rules, show_flag=False, aggregate='max')[0].data[0]
+        self.assertTrue(np.allclose(maximum.line.color, [0.75, 0.25, 1.0, 0.5]))
+        with self.assertRaises(ValueError):
+            PyARMViz.adjacency_parallel_category_plot(self.rules, show_flag=False, aggregate='median')
+
+    def test_rare_categories_fold_into_other(self):
+        parcats = PyARMViz.adjacency_parallel_category_plot(self.rules, show_flag=False, max_categories=2)[0].data[0]
+        antecedents, consequents = [list(dimension.values) for dimension in parcats.dimensions]
+        self.assertEqual(list(zip(antecedents, consequents)), [('a', 'b'), ('other', 'b'), ('other', 'e'), ('a', 'e')])
+        self.assertEqual(list(parcats.counts), [2, 1, 1, 1])
+        self.assertEqual(sum(parcats.counts), len(self.rules))
+
+
+class BulkIngestionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = datasets.load_shopping_rules()
+        self.columns = {
+            'lhs': [list(rule.lhs) for rule in self.rules],
+            'rhs': [list(rule.rhs) for rule in self.rules],
+            'count_full': [rule.count_full for rule in self.rules],
+            'count_lhs': [rule.count_lhs for rule in self.rules],
+            'count_rhs': [rule.count_rhs for rule in self.rules],
+            'num_transactions': [rule.num_transactions for rule in self.rules],
+        }
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_from_columns(self):
+        rule_set = RuleSet.from_columns(self.columns)
+        self.assertEqual(rule_set.to_rules(), self.rules)
+        self.assertTrue(np.array_equal(rule_set.confidence, RuleSet.from_rules(self.rules).confidence))
+        with self.assertRaises(ValueError):
+            RuleSet.from_columns({'lhs': self.columns['lhs']})
+
+    def test_json_lines_chunks_share_a_vocabulary(self):
+        for file_name, opener in (('rules.jsonl', open), ('rules.jsonl.gz', gzip.open)):
+            path = os.path.join(self.directory, file_name)
+            with opener(path, 'wt') as rule_file:
+                for index in range(len(self.rules)):
+                    rule_file.write(json.dumps({name: values[index] for name, values in self.columns.items()}) + '\n\n')
+            chunks = list(iter_json_lines(path, chunk_size=100))
+            self.assertEqual([len(chunk) for chunk in chunks[:-1]], [100] * (len(chunks) - 1))
+            self.assertTrue(all(chunk.vocabulary is chunks[0].vocabulary for chunk in chunks))
+            self.assertEqual([rule for chunk in chunks for rule in chunk], self.rules)
+
+    def test_column_chunks_and_rule_batches(self):
+        vocabulary = ItemVocabulary()
+        chunks = list(iter_column_chunks(self.columns, chunk_size=250, vocabulary=vocabulary))
+        batches = list(iter_rule_batches(iter(self.rules), chunk_size=250, vocabulary=vocabulary))
+        self.assertEqual(len(chunks), -(-len(self.rules) // 250))
+        for chunk, batch in zip(chunks, batches):
+            self.assertIs(chunk.vocabulary, vocabulary)
+            self.assertTrue(np.array_equal(chunk.lhs_indices, batch.lhs_indices))
+        self.assertEqual(RuleSet.concatenate(batches, vocabulary).to_rules(), self.rules)
+
+    def test_later_chunks_plot_and_export_only_their_items(self):
+        chunk = list(iter_rule_batches(self.rules, chunk_size=5))[-1]
+        self.assertGreater(len(chunk.vocabulary), 6)
+        expected = adjacency_graph_csr(chunk.to_rules()).node_count
+        figure = PyARMViz.adjacency_graph_plotly(chunk, use_cache=False, show_flag=False)
+        self.assertEqual(len(figure.data[1].x), expected)
+        path = os.path.join(self.directory, 'chunk.gexf')
+        PyARMViz.adjacency_graph_gephi(chunk, path)
+        self.assertEqual(nx.read_gexf(path).number_of_nodes(), expected)
+
+    def test_dataframe_chunks(self):
+        try:
+            import pandas
+        except ImportError:
+            self.skipTest("pandas is not installed")
+        frame = pandas.DataFrame(self.columns)
+        self.assertEqual(RuleSet.from_columns(frame).to_rules(), self.rules)
+        self.assertEqual([rule for chunk in iter_column_chunks(frame, chunk_size=300) for rule in chunk], self.rules)
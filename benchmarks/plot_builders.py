@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Time and peak memory of every stage of the plot builders, the adjacency
+graph generator and the dataset loaders on synthetic rule sets.
+
+Rule sets of each requested size are generated with
+datasets.generate_synthetic_rules. Every entry point is run once within
+Profiling.profile_stages for the wall time, call count and item count of
+each of its stages and, unless --no-memory is given, once more with
+trace_memory for the peak allocation of each stage (NumPy buffers
+included). Results are written as JSON, and a previous result file can be
+passed to --compare to print the ratio of every matching measurement.
+
+Usage:
+    python benchmarks/plot_builders.py --sizes 1000 10000 100000 --output results.json
+    python benchmarks/plot_builders.py --sizes 1000000 --benchmarks metadata_scatter_plot
+    python benchmarks/plot_builders.py --compare old.json --output new.json
+"""
+
+import argparse
+import csv
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+#Run from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import plotly
+import plotly.graph_objects as go
+
+import PyARMViz
+from PyARMViz import PyARMViz as plots
+from PyARMViz import datasets
+from PyARMViz.AxisOrdering import AxisOrderingEngine
+from PyARMViz.Profiling import profile_stages, stage
+
+
+def measure(function, memory: bool = True) -> dict:
+    '''
+        Runs function, returns its result with the wall time and (if memory) the peak traced
+        allocation of a second, traced run
+    '''
+    gc.collect()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    peak_bytes = None
+    if memory:
+        del result
+        gc.collect()
+        tracemalloc.start()
+        result = function()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return dict(result=result, seconds=seconds, peak_bytes=peak_bytes)
+
+
+def profile(function, trace_memory: bool = False):
+    '''
+        Runs function as the "total" stage within profile_stages, returns its result and the
+        StageStats of the stages it ran (with their peak allocations if trace_memory)
+    '''
+    gc.collect()
+    with profile_stages(trace_memory=trace_memory) as stats:
+        with stage("total"):
+            result = function()
+    return result, stats
+
+
+def _metadata_scatter_call(rules, rule_set, options):
+    return lambda: plots.metadata_scatter_plot(rules, allow_compound_flag=True, show_flag=False)
+
+
+def _adjacency_scatter_call(rules, rule_set, options):
+    return lambda: plots.adjacency_scatter_plot(rules, show_flag=False)
+
+
+def _adjacency_heatmap_call(rules, rule_set, options):
+    return lambda: plots.adjacency_scatter_plot(rules, show_flag=False, mode='heatmap')
+
+
+def _parallel_coordinate_call(rules, rule_set, options):
+    engine = AxisOrderingEngine(max_iterations=options.ordering_iterations)
+    return lambda: plots.adjacency_parallel_coordinate_plot(rules, axis_ordering=engine, show_flag=False)
+
+
+def _parallel_category_call(rules, rule_set, options):
+    return lambda: plots.adjacency_parallel_category_plot(rules, show_flag=False)
+
+
+def _graph_generator_call(rules, rule_set, options):
+    return lambda: plots._adjacency_graph_generator(rule_set)
+
+
+#Entry point call of every rule benchmark. Its stages are the Profiling.stage() blocks it runs,
+#the whole call is also measured as the "total" stage and any figures it returns are timed when
+#serialized to JSON. Nested stages (count_crossings runs within order_axes) are also counted in
+#the stage around them
+RULE_BENCHMARKS = {
+    "metadata_scatter_plot": _metadata_scatter_call,
+    "adjacency_scatter_plot": _adjacency_scatter_call,
+    "adjacency_scatter_plot_heatmap": _adjacency_heatmap_call,
+    "adjacency_parallel_coordinate_plot": _parallel_coordinate_call,
+    "adjacency_parallel_category_plot": _parallel_category_call,
+    "_adjacency_graph_generator": _graph_generator_call,
+}
+
+
+def _print_measurement(benchmark: str, stage: str, size, seconds: float):
+    print("{:<36}{:<28}{:>10}{:>11.3f} s".format(benchmark, stage, "-" if size is None else size, seconds))
+
+
+def _serialize(figures) -> int:
+    if not isinstance(figures, list):
+        figures = [figures]
+    return sum(len(figure.to_json()) for figure in figures)
+
+
+def write_synthetic_transactions(path: str, transaction_count: int, item_count: int, max_length: int = 10, seed: int = 0):
+    '''
+        Writes random transactions (one per row, one item per column) to a CSV file
+    '''
+    generator = np.random.default_rng(seed)
+    lengths = generator.integers(1, max_length + 1, transaction_count)
+    with open(path, 'w', newline='') as transaction_file:
+        writer = csv.writer(transaction_file)
+        for length in lengths.tolist():
+            writer.writerow(["item {}".format(code) for code in generator.choice(item_count, length, replace=False).tolist()])
+
+
+def run_rule_benchmarks(size: int, options, results: list):
+    generated = measure(lambda: datasets.generate_synthetic_rules(size, options.items, max_lhs_length=options.max_lhs_length,
+                                                                  seed=options.seed, columnar=True), options.memory)
+    rule_set = generated.pop("result")
+    results.append(dict(benchmark="generate_synthetic_rules", stage="generate", rules=size, **generated))
+    rules = rule_set.to_rules()
+
+    for benchmark in options.benchmarks:
+        if benchmark not in RULE_BENCHMARKS:
+            continue
+        function = RULE_BENCHMARKS[benchmark](rules, rule_set, options)
+        output, stats = profile(function)
+        if options.memory:
+            #Free the first figure before the traced run
+            output = None
+            output, memory_stats = profile(function, trace_memory=True)
+        for stage_name, stage_record in stats.stages.items():
+            peak_bytes = memory_stats[stage_name].peak_bytes if options.memory else None
+            results.append(dict(benchmark=benchmark, stage=stage_name, rules=size, seconds=stage_record.seconds,
+                                peak_bytes=peak_bytes, calls=stage_record.calls, items=stage_record.items))
+            _print_measurement(benchmark, stage_name, size, stage_record.seconds)
+        if isinstance(output, (go.Figure, list)):
+            measured = measure(lambda: _serialize(output), options.memory)
+            measured.pop("result")
+            results.append(dict(benchmark=benchmark, stage="serialize", rules=size, **measured))
+            _print_measurement(benchmark, "serialize", size, measured["seconds"])
+        output = None
+
+
+def run_loader_benchmarks(sizes, options, results: list):
+    if "loaders" not in options.benchmarks:
+        return
+    for name, function in (("load_shopping_rules", datasets.load_shopping_rules),
+                           ("load_shopping_transactions", datasets.load_shopping_transactions)):
+        measured = measure(function, options.memory)
+        measured.pop("result")
+        results.append(dict(benchmark="loaders", stage=name, rules=None, **measured))
+        _print_measurement("loaders", name, None, measured["seconds"])
+
+    directory = tempfile.mkdtemp()
+    try:
+        for size in sizes:
+            path = os.path.join(directory, "transactions_{}.csv".format(size))
+            write_synthetic_transactions(path, size, options.items, seed=options.seed)
+            measured = measure(lambda: sum(len(batch) for batch in datasets.iter_transaction_batches(path)), options.memory)
+            measured.pop("result")
+            results.append(dict(benchmark="loaders", stage="iter_transaction_batches", transactions=size, **measured))
+            _print_measurement("loaders", "iter_transaction_batches", size, measured["seconds"])
+            os.remove(path)
+    finally:
+        os.rmdir(directory)
+
+
+def compare(baseline_path: str, report: dict):
+    '''
+        Prints the time and peak memory ratios of the new measurements to the matching ones of
+        a previous result file
+    '''
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    def key(result):
+        return (result["benchmark"], result["stage"], result.get("rules"), result.get("transactions"))
+
+    previous = {key(result): result for result in baseline["results"]}
+    print("\nCompared to {} (version {})".format(baseline_path, baseline.get("version")))
+    print("{:<36}{:<28}{:>10}{:>10}{:>10}".format("benchmark", "stage", "size", "time", "memory"))
+    for result in report["results"]:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        time_ratio = result["seconds"] / old["seconds"] if old["seconds"] else float("nan")
+        memory_ratio = (result["peak_bytes"] / old["peak_bytes"]
+                        if result["peak_bytes"] and old.get("peak_bytes") else float("nan"))
+        size = result.get("rules") or result.get("transactions") or "-"
+        print("{:<36}{:<28}{:>10}{:>10.2f}{:>10.2f}".format(result["benchmark"], result["stage"], size, time_ratio, memory_ratio))
+
+
+def main(arguments=None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="rule set sizes (1e3 to 1e6)")
+    parser.add_argument("--items", type=int, default=1000, help="item vocabulary size")
+    parser.add_argument("--max-lhs-length", type=int, default=3, help="longest antecedent")
+    parser.add_argument("--ordering-iterations", type=int, default=200, help="axis ordering budget of the parallel coordinate plot")
+    parser.add_argument("--benchmarks", nargs="+", default=list(RULE_BENCHMARKS) + ["loaders"], help="benchmarks to run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the traced peak memory runs")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON result file")
+    parser.add_argument("--compare", help="previous JSON result file to compare against")
+    options = parser.parse_args(arguments)
+
+    results = []
+    for size in options.sizes:
+        run_rule_benchmarks(size, options, results)
+    run_loader_benchmarks(options.sizes, options, results)
+
+    report = dict(
+        version=PyARMViz.__version__,
+        python=platform.python_version(),
+        numpy=np.__version__,
+        plotly=plotly.__version__,
+        platform=platform.platform(),
+        timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        parameters=dict(items=options.items, max_lhs_length=options.max_lhs_length,
+                        ordering_iterations=options.ordering_iterations, seed=options.seed),
+        results=results,
+    )
+    with open(options.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    print("Wrote {} measurements to {}".format(len(results), options.output))
+    if options.compare:
+        compare(options.compare, report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memory and latency comparison of Rule and FrozenRule.
+
+Scales the bundled Online_Retail_Rules.json up by duplicating every rule with
+suffixed item names, then measures the peak allocation of building the rule
+list (tracemalloc) and the latency of the common per-rule operations (timeit).
+Equality is measured against separately built equal rules with their antecedent
+and consequent items reversed, so neither class can shortcut on identical tuples.
+
+Usage: python benchmarks/rule_memory.py [scale]
+"""
+
+import json
+import sys
+import timeit
+import tracemalloc
+from os.path import abspath, dirname, join
+
+#Run from a checkout without installing the package
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from PyARMViz.Rule import Rule, FrozenRule
+
+import PyARMViz.datasets
+
+
+def scaled_rule_dicts(scale: int):
+    '''
+        Returns the bundled rule dictionaries repeated scale times, with the item names of each
+        copy suffixed so that every rule stays distinct
+    '''
+    rules_path = join(dirname(PyARMViz.datasets.__file__), 'Online_Retail_Rules.json')
+    with open(rules_path, 'r') as rules_file:
+        rule_dicts = json.load(rules_file)
+
+    scaled = []
+    for copy_index in range(scale):
+        suffix = " #{}".format(copy_index)
+        for rule_dict in rule_dicts:
+            scaled.append(dict(
+                rule_dict,
+                lhs=tuple(item + suffix for item in rule_dict['lhs']),
+                rhs=tuple(item + suffix for item in rule_dict['rhs']),
+            ))
+    return scaled
+
+
+def build(rule_class, rule_dicts):
+    return [
+        rule_class(d['lhs'], d['rhs'], d['count_full'], d['count_lhs'], d['count_rhs'], d['num_transactions'])
+        for d in rule_dicts
+    ]
+
+
+def reversed_rule_dicts(rule_dicts):
+    '''
+        Returns the rule dictionaries with the items of every antecedent and consequent reversed,
+        describing rules equal to the originals
+    '''
+    return [dict(d, lhs=tuple(reversed(d['lhs'])), rhs=tuple(reversed(d['rhs']))) for d in rule_dicts]
+
+
+def measure(rule_class, rule_dicts, repeat: int = 3):
+    tracemalloc.start()
+    rules = build(rule_class, rule_dicts)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    equal_rules = build(rule_class, reversed_rule_dicts(rule_dicts))
+
+    def best(statement):
+        return min(timeit.repeat(statement, number=1, repeat=repeat))
+
+    return dict(
+        retained_bytes_per_rule=current / len(rules),
+        peak_bytes_per_rule=peak / len(rules),
+        build_seconds=best(lambda: build(rule_class, rule_dicts)),
+        hash_seconds=best(lambda: [hash(rule) for rule in rules]),
+        set_seconds=best(lambda: set(rules)),
+        eq_seconds=best(lambda: [a == b for a, b in zip(rules, equal_rules)]),
+        len_seconds=best(lambda: [len(rule) for rule in rules]),
+        metrics_seconds=best(lambda: [(rule.confidence, rule.support, rule.lift) for rule in rules]),
+    )
+
+
+def main(scale: int = 2000):
+    rule_dicts = scaled_rule_dicts(scale)
+    print("{} rules".format(len(rule_dicts)))
+    results = {rule_class.__name__: measure(rule_class, rule_dicts) for rule_class in (Rule, FrozenRule)}
+    names = list(results['Rule'])
+    print("{:<26}{:>14}{:>14}{:>9}".format("", "Rule", "FrozenRule", "ratio"))
+    for name in names:
+        rule_value = results['Rule'][name]
+        frozen_value = results['FrozenRule'][name]
+        print("{:<26}{:>14.4g}{:>14.4g}{:>9.2f}".format(name, rule_value, frozen_value, frozen_value / rule_value))
+    return results
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)